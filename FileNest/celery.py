@@ -0,0 +1,14 @@
+"""Celery application for FileNest background tasks.
+
+Run a worker with ``celery -A FileNest worker``.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "FileNest.settings")
+
+app = Celery("FileNest")
+app.config_from_object("django.conf:settings", namespace="CELERY")
+app.autodiscover_tasks()
@@ -26,7 +26,10 @@ MINIO_NODES = [
         "bucket_name": "bucket",
         "secure": False,
         "region": "us-west-1",
-        "load": 0,
+        "weight": 1,  # Relative share of objects placed on the node
+        # Nodes with the same cluster are one MinIO deployment and share objects;
+        # docker-compose.yml runs the three nodes as one distributed deployment
+        "cluster": "compose",
     },
     {
         "endpoint": "localhost:9001",
@@ -35,7 +38,8 @@ MINIO_NODES = [
         "bucket_name": "bucket",
         "secure": False,
         "region": "us-west-2",
-        "load": 0,
+        "weight": 1,
+        "cluster": "compose",
     },
     {
         "endpoint": "localhost:9002",
@@ -44,7 +48,8 @@ MINIO_NODES = [
         "bucket_name": "bucket",
         "secure": False,
         "region": "eu-west-1",
-        "load": 0,
+        "weight": 1,
+        "cluster": "compose",
     },
 ]
 
@@ -56,6 +61,148 @@ MINIO_BUCKET_NAME = "bucket"
 MINIO_SECURE = False
 MINIO_ACCESS_URL = f"{MINIO_ENDPOINT}/{MINIO_BUCKET_NAME}"
 
+# HTTP transport defaults for every MinIO node. A node can override any of
+# these with a "transport" dict in its MINIO_NODES entry.
+MINIO_TRANSPORT = {
+    "pool_size": 10,  # Keep at or above the worker thread count
+    "pool_block": True,
+    "pool_timeout": 10,
+    "connect_timeout": 3,
+    "read_timeout": 60,
+    "retries": 3,
+    "backoff_factor": 0.2,
+    "keepalive": True,
+}
+
+# Concurrent multipart uploads
+MINIO_MULTIPART = {
+    "part_size": 5 * 1024 * 1024,  # S3 minimum for all parts but the last
+    "max_buffers": 32,  # Pooled part buffers per process (caps upload memory)
+    "workers": 4,  # Threads uploading parts of one file
+    "max_in_flight": 4,  # Parts buffered ahead of the upload workers
+    "part_retries": 3,  # Attempts per part before the whole upload is aborted
+    "retry_backoff": 0.5,
+}
+
+# Whole-file downloads of large objects read byte ranges from every active node
+MINIO_STRIPING = {
+    "min_size": 64 * 1024 * 1024,
+    "stripe_size": 8 * 1024 * 1024,  # Largest range fetched at once; larger parts are split
+    "streams_per_node": 2,
+    "max_buffered": 32 * 1024 * 1024,  # Read-ahead per download
+    "workers": 16,  # Stripe fetch threads shared by all downloads
+}
+
+# Presigned download URLs are cached until `margin` seconds before they expire
+MINIO_PRESIGN = {
+    "expiry": 3600,
+    "margin": 300,
+}
+
+# Per-node file status on the detail page: one shared deadline for all nodes
+MINIO_REPLICA_STATUS = {
+    "deadline": 2.0,
+    "cache_ttl": 30,
+}
+
+# Monitoring dashboard: per-page object lookups on every node, run concurrently and cached
+MINIO_DISTRIBUTION = {
+    "deadline": 5.0,
+    "cache_ttl": 15,
+}
+
+# Object placement: rendezvous hashing of object keys over MINIO_NODES by weight
+MINIO_PLACEMENT = {
+    "replicas": 1,  # Copies besides the primary
+}
+
+# Replication: uploads return once `write_quorum` nodes hold the file, and the
+# rest of its placement nodes are filled by Celery or an in-process pool.
+# One MinIO deployment already keeps its own redundancy, so extra replicas and
+# a quorum above 1 only add I/O there; raise them when the nodes in
+# MINIO_NODES are separate deployments (different "cluster" values).
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "")
+MINIO_REPLICATION = {
+    "write_quorum": 1,
+    "queue": "celery" if CELERY_BROKER_URL else "thread",
+    "workers": 4,
+    "retries": 3,
+    "retry_backoff": 2.0,
+    "part_size": 16 * 1024 * 1024,
+    "stale_after": 600,
+}
+
+# Erasure coding: ?erasure=1 uploads (all uploads when enabled) are stored as
+# data + parity shards on distinct nodes; needs data + parity active nodes
+MINIO_ERASURE = {
+    "enabled": False,
+    "data_shards": 2,
+    "parity_shards": 1,
+    "block_size": 1024 * 1024,
+}
+
+# Chunk store: content-defined chunk sizes for ?chunked=1 and manifest uploads
+CHUNK_STORE_CDC = {
+    "min_size": 256 * 1024,
+    "avg_size": 1024 * 1024,
+    "max_size": 4 * 1024 * 1024,
+}
+
+# Load balancing: each MinIO request feeds its node's latency and error EWMAs,
+# and nodes are picked with power-of-two-choices over the resulting cost
+MINIO_BALANCER = {
+    "decay": 10.0,  # Seconds for the averages to forget ~63% of their history
+    "default_latency": 0.05,  # Seconds assumed for a node with no samples yet
+    "error_penalty": 10.0,  # Cost multiplier per unit of recent error rate
+}
+
+# Host-wide scoreboard: a memory-mapped file where every worker process records
+# node load and health probe results, so balancing sees the whole host
+MINIO_SCOREBOARD = {
+    "enabled": True,
+    "path": None,  # Defaults to filenest-scoreboard-<project hash> in the temp dir
+    "slots": 64,  # Node records in the file
+    "workers": 64,  # Worker processes whose in-flight counts each record holds
+}
+
+# Prometheus metrics at /metrics. Each worker writes its totals to a file in
+# `dir` and a scrape sums them, folding exited workers' files into one archive.
+MINIO_METRICS = {
+    "enabled": True,
+    "dir": os.getenv("FILENEST_METRICS_DIR"),  # Defaults to a directory in the temp dir
+    "flush_interval": 5,  # Seconds between writes of each worker's totals
+    "token": os.getenv("FILENEST_METRICS_TOKEN"),  # Bearer token for scrapers besides staff
+}
+
+# Request tracing: spans for services, MinIO requests, node selection, queries
+# and templates, returned as a Server-Timing header. Disabled, it costs nothing.
+TRACING = {
+    "enabled": os.getenv("FILENEST_TRACING", "0") == "1",
+    "dump_threshold": None,  # Seconds; slower requests are written to dump_dir as JSON
+    "dump_dir": BASE_DIR / "traces",
+    "dump_keep": 200,  # Newest dumps kept
+}
+
+# Request profiling: a `sample_rate` fraction of requests, and all requests over
+# `slow_threshold` seconds, are profiled with their DB queries into `dir`
+# (newest `keep` only) and listed at /monitoring/profiles/ for staff
+PROFILING = {
+    "enabled": os.getenv("FILENEST_PROFILING", "0") == "1",
+    "mode": "sampling",  # Stack sampling; "cprofile" traces every call at a higher cost
+    "sample_rate": float(os.getenv("FILENEST_PROFILING_SAMPLE_RATE", "0.01")),
+    "slow_threshold": 2.0,  # Seconds, or None to keep only sampled requests
+    "dir": BASE_DIR / "profiles",
+    "keep": 100,
+}
+
+# Background node health monitoring
+MINIO_HEALTH_CHECK_INTERVAL = 10  # Seconds between probe rounds
+MINIO_HEALTH_CHECK_TIMEOUT = 3  # Seconds a probe round waits for slow nodes
+MINIO_CIRCUIT_BREAKER = {
+    "failure_threshold": 2,  # Failed probes before a node is taken out
+    "reset_timeout": 30,  # Seconds before an open node is probed again
+}
+
 # Optional: Use MinIO as Django's default file storage
 DEFAULT_FILE_STORAGE = "storages.backends.s3boto3.S3Boto3Storage"
 AWS_S3_ENDPOINT_URL = f"http://{MINIO_ENDPOINT}"
@@ -113,6 +260,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.TracingMiddleware",  # First, so it times the whole stack
+    "core.middleware.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -5,6 +5,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path, re_path
 
+from monitoring.views import metrics
+
 urlpatterns = [
     # Main app URLs
     path("", include("web.urls", namespace="web")),
@@ -14,4 +16,6 @@ urlpatterns = [
     path("api/", include("api.urls", namespace="api")),
     # Monitoring URLs
     path("monitoring/", include("monitoring.urls", namespace="monitoring")),
+    # Prometheus scrape endpoint
+    path("metrics", metrics, name="metrics"),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,7 +1,7 @@
 """API serializers for FileNest."""
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from core.models import FileMetadata
+from core.models import FileMetadata, UploadSession
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for User model."""
@@ -19,5 +19,29 @@ class FileMetadataSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'file_name', 'file_url', 'file_size',
             'content_type', 'uploaded_at', 'uploaded_by',
-            'total_chunks', 'etag', 'location', 'display_name'
+            'total_chunks', 'etag', 'location', 'display_name', 'storage_mode'
+        )
+
+class FileMetadataWithURLSerializer(FileMetadataSerializer):
+    """FileMetadata plus the presigned URL passed in ``context['download_urls']``."""
+    download_url = serializers.SerializerMethodField()
+
+    class Meta(FileMetadataSerializer.Meta):
+        fields = FileMetadataSerializer.Meta.fields + ('download_url',)
+
+    def get_download_url(self, obj):
+        url = self.context.get('download_urls', {}).get(obj.id)
+        request = self.context.get('request')
+        # Chunked files are served by the API, under a relative path
+        return request.build_absolute_uri(url) if url and request else url
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Serializer for resumable upload sessions."""
+    file_id = serializers.UUIDField(source='file_metadata_id', read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = (
+            'id', 'mode', 'file_name', 'file_size', 'content_type', 'chunk_size',
+            'total_chunks', 'status', 'created_at', 'updated_at', 'file_id'
         )
@@ -11,10 +11,25 @@ urlpatterns = [
     
     # File operations endpoints
     path("upload/", views.upload_file, name="upload_file"),
+    path("upload/hash/", views.upload_by_hash, name="upload_by_hash"),
     path("download/<str:file_id>/", views.download_file, name="download_file"),
+    path("stream/<str:file_id>/", views.stream_file, name="stream_file"),
     path("detail/<str:file_id>/", views.detail_file, name="detail_file"),
     path("delete/<str:file_id>/", views.delete_file, name="delete_file"),
     path("list/", views.list_files, name="list_files"),
+    path("batch/", views.batch_files, name="batch_files"),
+
+    # Resumable upload sessions
+    path("uploads/", views.create_upload_session, name="create_upload_session"),
+    path("uploads/direct/", views.create_direct_upload, name="create_direct_upload"),
+    path("uploads/manifest/", views.create_manifest_upload, name="create_manifest_upload"),
+    path("uploads/<str:session_id>/", views.upload_session, name="upload_session"),
+    path("uploads/<str:session_id>/chunks/<int:chunk_index>/",
+         views.upload_session_chunk, name="upload_session_chunk"),
+    path("uploads/<str:session_id>/blobs/<str:sha256>/",
+         views.upload_session_blob, name="upload_session_blob"),
+    path("uploads/<str:session_id>/complete/",
+         views.complete_upload_session, name="complete_upload_session"),
     path('swagger/', schema_view.with_ui('swagger',
                                          cache_timeout=0), name='schema-swagger-ui'),
 
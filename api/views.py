@@ -11,10 +11,22 @@ from rest_framework.response import Response
 from rest_framework.authentication import SessionAuthentication
 
 from core.auth import AuthService
+from core.chunks import ChunkStoreService
+from core.erasure import ErasureService
+from core.downloads import stream_file_response
+from core.minio.erasure import NotEnoughNodes
+from core.replication import QuorumNotReached
 from core.services import FileService
+from core.upload_handlers import stream_uploads_to_minio
+from core.uploads import UploadSessionService
 
 from .auth import CustomTokenAuthentication  # Import custom token auth
-from .serializers import FileMetadataSerializer, UserSerializer
+from .serializers import (
+    FileMetadataSerializer,
+    FileMetadataWithURLSerializer,
+    UploadSessionSerializer,
+    UserSerializer,
+)
 
 # Common authentication and permission classes
 AUTH_CLASSES = [CustomTokenAuthentication, SessionAuthentication]
@@ -86,12 +98,22 @@ def login(request):
         )
 
 
+# Allow for the multipart envelope around the single file
+@stream_uploads_to_minio(max_request_size=FileService.MAX_FILE_SIZE + 64 * 1024)
 @api_view(["POST"])
 @authentication_classes(AUTH_CLASSES)
 @permission_classes(PERM_CLASSES)
 def upload_file(request):
     """Upload a file for authenticated users."""
     try:
+        upload_error = getattr(request, "upload_error", None)
+        if upload_error:
+            return create_response(
+                success=False,
+                message=upload_error,
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+
         if "file-upload" not in request.FILES:
             return create_response(
                 success=False,
@@ -99,9 +121,21 @@ def upload_file(request):
                 status_code=status.HTTP_400_BAD_REQUEST,
             )
 
-        file_metadata, _ = FileService.upload_file(
-            request.FILES["file-upload"], request.user
-        )
+        file_obj = request.FILES["file-upload"]
+        chunked = request.GET.get("chunked") == "1"
+        erasure = not chunked and ErasureService.requested(request)
+        if chunked or erasure:
+            errors = FileService.validate_file(file_obj)
+            if errors:
+                raise ValueError(errors[0])
+        if chunked:
+            # Stored as content-defined chunks, so later versions only add what changed
+            file_metadata = ChunkStoreService.store_file(file_obj, request.user)
+        elif erasure:
+            # k data + m parity shards on distinct nodes instead of whole copies
+            file_metadata = ErasureService.store_file(file_obj, request.user)
+        else:
+            file_metadata, _ = FileService.upload_file(file_obj, request.user)
         return create_response(
             message="File uploaded successfully",
             data=FileMetadataSerializer(file_metadata).data,
@@ -113,6 +147,50 @@ def upload_file(request):
             message=str(e),
             status_code=status.HTTP_400_BAD_REQUEST,
         )
+    except (QuorumNotReached, NotEnoughNodes) as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+
+
+@api_view(["POST"])
+@authentication_classes(AUTH_CLASSES)
+@permission_classes(PERM_CLASSES)
+def upload_by_hash(request):
+    """Store a file by its SHA-256 when the same content is already stored."""
+    try:
+        file_obj = FileService.upload_by_hash(
+            request.user,
+            request.data.get("file_name", ""),
+            int(request.data.get("file_size", 0)),
+            request.data.get("sha256", ""),
+            request.data.get("content_type"),
+        )
+        if file_obj is None:
+            return create_response(
+                message="Content not stored yet, upload the file",
+                data={"exists": False},
+            )
+        serializer = FileMetadataSerializer(file_obj)
+        return create_response(
+            message="File uploaded successfully",
+            data={"exists": True, "file": serializer.data},
+            status_code=status.HTTP_201_CREATED,
+        )
+    except ValueError as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    except Exception as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
 
 
 @api_view(["GET"])
@@ -159,7 +237,15 @@ def list_files(request):
     try:
         page = int(request.GET.get("page", 1))
         files, total = FileService.list_files(request.user, page)
-        serializer = FileMetadataSerializer(files, many=True)
+        if request.GET.get("include_urls") == "1":
+            # Presign the whole page at once instead of one download call per file
+            files = list(files)
+            urls = FileService.presign_files(files)
+            serializer = FileMetadataWithURLSerializer(
+                files, many=True, context={"download_urls": urls, "request": request}
+            )
+        else:
+            serializer = FileMetadataSerializer(files, many=True)
         return create_response(
             message="Files retrieved successfully",
             data={"files": serializer.data, "count": total},
@@ -180,7 +266,303 @@ def download_file(request, file_id):
     try:
         presigned_url = FileService.download_file(file_id, request.user)
         return create_response(
-            message="Presigned URL generated", data={"url": presigned_url}
+            message="Presigned URL generated",
+            data={"url": request.build_absolute_uri(presigned_url)},
+        )
+    except Exception as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@api_view(["POST"])
+@authentication_classes(AUTH_CLASSES)
+@permission_classes(PERM_CLASSES)
+def batch_files(request):
+    """Get metadata and presigned download URLs for many files at once."""
+    try:
+        file_ids = request.data.get("file_ids")
+        if not isinstance(file_ids, list):
+            raise ValueError("file_ids must be a list of file IDs.")
+        include_urls = request.data.get("include_urls", True)
+
+        files, missing, urls = FileService.get_files_batch(
+            file_ids, request.user, include_urls=bool(include_urls)
+        )
+        serializer = FileMetadataWithURLSerializer(
+            files, many=True, context={"download_urls": urls, "request": request}
+        )
+        return create_response(
+            message="Files retrieved successfully",
+            data={"files": serializer.data, "missing": missing},
+        )
+    except ValueError as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    except Exception as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@api_view(["GET", "HEAD"])
+@authentication_classes(AUTH_CLASSES)
+@permission_classes(PERM_CLASSES)
+def stream_file(request, file_id):
+    """Stream a file through the API, honouring Range and conditional headers."""
+    try:
+        file_obj = FileService.get_file_details(file_id, request.user)
+        return stream_file_response(request, file_obj)
+    except Exception as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@api_view(["POST"])
+@authentication_classes(AUTH_CLASSES)
+@permission_classes(PERM_CLASSES)
+def create_upload_session(request):
+    """Start a resumable chunked upload."""
+    try:
+        session = UploadSessionService.create_session(
+            request.user,
+            file_name=request.data["file_name"],
+            file_size=int(request.data["file_size"]),
+            content_type=request.data.get("content_type"),
+            chunk_size=int(request.data.get("chunk_size") or 0) or None,
+        )
+        data = UploadSessionSerializer(session).data
+        data.update(UploadSessionService.get_progress(session))
+        return create_response(
+            message="Upload session created",
+            data=data,
+            status_code=status.HTTP_201_CREATED,
+        )
+    except (KeyError, ValueError) as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    except Exception as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@api_view(["POST"])
+@authentication_classes(AUTH_CLASSES)
+@permission_classes(PERM_CLASSES)
+def create_direct_upload(request):
+    """Start an upload the client sends straight to storage with presigned URLs."""
+    try:
+        session = UploadSessionService.create_direct_session(
+            request.user,
+            file_name=request.data["file_name"],
+            file_size=int(request.data["file_size"]),
+            content_type=request.data.get("content_type"),
+            chunk_size=int(request.data.get("chunk_size") or 0) or None,
+        )
+        data = UploadSessionSerializer(session).data
+        data["upload_urls"] = UploadSessionService.presign_urls(session)
+        return create_response(
+            message="Direct upload created",
+            data=data,
+            status_code=status.HTTP_201_CREATED,
+        )
+    except (KeyError, ValueError) as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    except Exception as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@api_view(["POST"])
+@authentication_classes(AUTH_CLASSES)
+@permission_classes(PERM_CLASSES)
+def create_manifest_upload(request):
+    """Start an upload from the file's chunk manifest.
+
+    ``chunks`` is a list of ``{"sha256", "size"}`` in file order. The
+    response lists ``missing_hashes``, the only chunks that need sending.
+    """
+    try:
+        chunks = request.data.get("chunks")
+        if not isinstance(chunks, list):
+            raise ValueError("chunks must be a list of {sha256, size}.")
+        session = UploadSessionService.create_manifest_session(
+            request.user,
+            file_name=request.data["file_name"],
+            file_size=int(request.data["file_size"]),
+            chunks=chunks,
+            content_type=request.data.get("content_type"),
+        )
+        data = UploadSessionSerializer(session).data
+        data.update(UploadSessionService.get_progress(session))
+        return create_response(
+            message="Manifest upload created",
+            data=data,
+            status_code=status.HTTP_201_CREATED,
+        )
+    except (KeyError, ValueError) as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    except Exception as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@api_view(["GET", "DELETE"])
+@authentication_classes(AUTH_CLASSES)
+@permission_classes(PERM_CLASSES)
+def upload_session(request, session_id):
+    """Show which chunks of an upload have landed, or abort it."""
+    try:
+        session = UploadSessionService.get_session(session_id, request.user)
+        if request.method == "DELETE":
+            UploadSessionService.abort_session(session)
+            return create_response(message="Upload session aborted")
+
+        data = UploadSessionSerializer(session).data
+        data.update(UploadSessionService.get_progress(session))
+        if session.mode == "DIRECT" and session.status == "ACTIVE":
+            data["upload_urls"] = UploadSessionService.presign_urls(session)
+        return create_response(message="Upload session retrieved", data=data)
+    except ValueError as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    except Exception as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@api_view(["PUT"])
+@authentication_classes(AUTH_CLASSES)
+@permission_classes(PERM_CLASSES)
+def upload_session_chunk(request, session_id, chunk_index):
+    """Upload one chunk of a session; the raw request body is the chunk."""
+    try:
+        session = UploadSessionService.get_session(session_id, request.user)
+        # Read one byte past the expected size so oversized chunks are caught
+        data = request.stream.read(session.chunk_size + 1) if request.stream else b""
+        chunk = UploadSessionService.upload_chunk(
+            session,
+            chunk_index,
+            data,
+            content_md5=request.headers.get("Content-MD5"),
+        )
+        return create_response(
+            message="Chunk uploaded",
+            data={"chunk_index": chunk.chunk_index, "etag": chunk.etag},
+        )
+    except ValueError as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    except Exception as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@api_view(["PUT"])
+@authentication_classes(AUTH_CLASSES)
+@permission_classes(PERM_CLASSES)
+def upload_session_blob(request, session_id, sha256):
+    """Upload one chunk of a manifest session; the raw request body is the chunk."""
+    try:
+        session = UploadSessionService.get_session(session_id, request.user)
+        # Read one byte past the largest chunk so oversized bodies are caught
+        data = request.stream.read(session.chunk_size + 1) if request.stream else b""
+        UploadSessionService.upload_blob(session, sha256, data)
+        return create_response(message="Chunk uploaded", data={"sha256": sha256.lower()})
+    except ValueError as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    except QuorumNotReached as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+    except Exception as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+@api_view(["POST"])
+@authentication_classes(AUTH_CLASSES)
+@permission_classes(PERM_CLASSES)
+def complete_upload_session(request, session_id):
+    """Finish an upload once every chunk has landed.
+
+    Direct uploads send ``parts``: a list of ``{"chunk_index", "md5"}`` for
+    every chunk, which the stored parts are checked against.
+    """
+    try:
+        session = UploadSessionService.get_session(session_id, request.user)
+        client_md5s = {
+            int(part["chunk_index"]): part["md5"]
+            for part in request.data.get("parts", [])
+        }
+        file_metadata = UploadSessionService.complete_session(session, client_md5s)
+        return create_response(
+            message="File uploaded successfully",
+            data=FileMetadataSerializer(file_metadata).data,
+            status_code=status.HTTP_201_CREATED,
+        )
+    except ValueError as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    except QuorumNotReached as e:
+        return create_response(
+            success=False,
+            message=str(e),
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
         )
     except Exception as e:
         return create_response(
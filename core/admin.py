@@ -1,6 +1,6 @@
 """Admin interface for core models."""
 from django.contrib import admin
-from .models import FileMetadata, FileChunk
+from .models import ContentBlob, ErasureShard, FileMetadata, FileChunk, ObjectReplica
 
 @admin.register(FileMetadata)
 class FileMetadataAdmin(admin.ModelAdmin):
@@ -16,3 +16,23 @@ class FileChunkAdmin(admin.ModelAdmin):
     list_filter = ('uploaded_at',)
     search_fields = ('file_metadata__file_name',)
     readonly_fields = ('id', 'uploaded_at', 'etag')
+
+@admin.register(ObjectReplica)
+class ObjectReplicaAdmin(admin.ModelAdmin):
+    list_display = ('file_metadata', 'node_endpoint', 'state', 'verified_at')
+    list_filter = ('node_endpoint', 'state')
+    search_fields = ('file_metadata__file_name',)
+    readonly_fields = ('id', 'updated_at', 'etag')
+
+@admin.register(ContentBlob)
+class ContentBlobAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'object_name', 'size', 'created_at')
+    search_fields = ('sha256', 'object_name')
+    readonly_fields = ('id', 'created_at', 'etag', 'checksum')
+
+@admin.register(ErasureShard)
+class ErasureShardAdmin(admin.ModelAdmin):
+    list_display = ('layout', 'shard_index', 'node_endpoint', 'size')
+    list_filter = ('node_endpoint',)
+    search_fields = ('layout__file_metadata__file_name', 'object_name')
+    readonly_fields = ('id', 'etag')
@@ -1,4 +1,6 @@
 """Core app configuration."""
+import os
+
 from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
@@ -7,5 +9,10 @@ class CoreConfig(AppConfig):
     verbose_name = 'Core'
 
     def ready(self):
-        """Perform initialization when Django starts."""
-        pass  # Add any startup initialization here if needed
+        """Start probing MinIO nodes in the background."""
+        from core.minio.node import node_manager
+
+        monitor = node_manager.health_monitor
+        monitor.start()
+        # Threads do not survive a fork, so each forked worker starts its own
+        os.register_at_fork(after_in_child=monitor.start)
@@ -0,0 +1,169 @@
+"""Service layer for content-addressed storage."""
+
+import logging
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from core.minio.storage import minio_remove
+
+from .models import ContentBlob, FileChunk, FileMetadata, ObjectReplica
+from .replicas import ReplicaService
+
+logger = logging.getLogger(__name__)
+
+
+class BlobService:
+    """Share one stored object between every file with the same SHA-256.
+
+    A blob keeps the object of the upload that first stored its content.
+    Upload keys are never reused, so no later upload can overwrite it. The
+    object is removed from storage only when the last file using it is
+    deleted.
+    """
+
+    @staticmethod
+    def find(sha256: str, size: int, user: User) -> Optional[ContentBlob]:
+        """Return the blob for a hash, if ``user`` already stores it with the same size.
+
+        Knowing a hash is not proof of having the content, so only blobs
+        used by the user's own files, whole or chunked, are found.
+        """
+        return (
+            ContentBlob.objects.filter(sha256=sha256.lower(), size=size)
+            .filter(
+                Q(files__uploaded_by=user) | Q(chunk_refs__file_metadata__uploaded_by=user)
+            )
+            .first()
+        )
+
+    @staticmethod
+    def _copy_replicas(source: FileMetadata, target: FileMetadata) -> None:
+        """Give ``target`` the replica rows of another file on the same blob."""
+        existing = set(target.replicas.values_list("node_endpoint", flat=True))
+        ObjectReplica.objects.bulk_create(
+            ObjectReplica(
+                file_metadata=target,
+                node_endpoint=replica.node_endpoint,
+                state=replica.state,
+                etag=replica.etag,
+                verified_at=replica.verified_at,
+            )
+            for replica in source.replicas.all()
+            if replica.node_endpoint not in existing
+        )
+
+    @staticmethod
+    def _copy_chunks(source: FileMetadata, target: FileMetadata) -> None:
+        """Give ``target`` the part layout of another file on the same blob."""
+        FileChunk.objects.bulk_create(
+            FileChunk(
+                file_metadata=target,
+                chunk_index=chunk.chunk_index,
+                chunk_file=chunk.chunk_file,
+                chunk_size=chunk.chunk_size,
+                etag=chunk.etag,
+            )
+            for chunk in source.chunks.all()
+        )
+
+    @classmethod
+    def attach(
+        cls, file_metadata: FileMetadata, sha256: str, node_endpoint: str
+    ) -> Tuple[ContentBlob, bool]:
+        """Point a freshly stored file at the blob for its content.
+
+        When the content is new, the object just written on ``node_endpoint``
+        becomes the blob's object where it is. When the blob already exists,
+        the new object is redundant: it is removed and the file takes the
+        replica rows of the existing copy. Returns ``(blob, duplicate)``.
+        """
+        staged = file_metadata.object_name
+        try:
+            with transaction.atomic():
+                blob = ContentBlob.objects.create(
+                    sha256=sha256,
+                    object_name=staged,
+                    size=file_metadata.file_size,
+                    etag=file_metadata.etag or "",
+                    checksum=file_metadata.checksum,
+                    total_chunks=file_metadata.total_chunks,
+                    node_endpoint=node_endpoint,
+                )
+                file_metadata.blob = blob
+                file_metadata.save(update_fields=["blob"])
+                return blob, False
+        except IntegrityError:
+            pass
+
+        with transaction.atomic():
+            blob = ContentBlob.objects.select_for_update().get(sha256=sha256)
+            file_metadata.blob = blob
+            file_metadata.save(update_fields=["blob"])
+            file_metadata.replicas.all().delete()
+            source = blob.files.exclude(pk=file_metadata.pk).first()
+            if source is not None:
+                cls._copy_replicas(source, file_metadata)
+            elif blob.node_endpoint:
+                # Same bytes as a stored chunk, which no whole file uses yet
+                ReplicaService.record(file_metadata, blob.node_endpoint, blob.etag)
+
+        minio_remove(staged, node_endpoint)
+        return blob, True
+
+    @classmethod
+    def link(
+        cls,
+        blob: ContentBlob,
+        user: User,
+        file_name: str,
+        content_type: Optional[str] = None,
+    ) -> FileMetadata:
+        """Create a file for ``user`` from content that is already stored."""
+        with transaction.atomic():
+            blob = ContentBlob.objects.select_for_update().get(pk=blob.pk)
+            source = blob.files.first()
+            if source is None and not blob.node_endpoint:
+                raise ValueError("Content is no longer stored.")
+
+            file_metadata = FileMetadata.objects.create(
+                file_name=file_name,
+                file_url=source.file_url if source else f"{settings.MINIO_ACCESS_URL}/{blob.object_name}",
+                file_size=blob.size,
+                etag=blob.etag,
+                location=source.location if source else settings.MINIO_BUCKET_NAME,
+                uploaded_by=user,
+                total_chunks=blob.total_chunks,
+                content_type=content_type or (source.content_type if source else None),
+                checksum=blob.checksum,
+                blob=blob,
+            )
+            if source is not None:
+                cls._copy_chunks(source, file_metadata)
+                cls._copy_replicas(source, file_metadata)
+            else:
+                ReplicaService.record(file_metadata, blob.node_endpoint, blob.etag)
+        return file_metadata
+
+    @staticmethod
+    def release(file_metadata: FileMetadata) -> Optional[str]:
+        """Delete a file's row and drop its reference to its blob.
+
+        Returns the object name to remove from storage, or None while other
+        files still use the object.
+        """
+        object_name = file_metadata.object_name
+        blob_id = file_metadata.blob_id
+        with transaction.atomic():
+            file_metadata.delete()
+            if blob_id is None:
+                return object_name
+
+            blob = ContentBlob.objects.select_for_update().get(pk=blob_id)
+            if blob.files.exists() or blob.chunk_refs.exists():
+                return None
+            blob.delete()
+        return object_name
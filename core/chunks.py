@@ -0,0 +1,315 @@
+"""Service layer for the content-defined chunk store."""
+
+import hashlib
+import io
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils.text import get_valid_filename
+
+from core.minio.chunking import iter_chunks
+from core.minio.node import Node, node_manager
+from core.minio.replication import copy_object, get_executor, replication_options
+from core.minio.storage import minio_remove, minio_stream
+
+from .models import ContentBlob, FileChunk, FileMetadata
+from .replication import QuorumNotReached
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkStream:
+    """Stream a byte range of a chunked file, opening one chunk at a time."""
+
+    def __init__(self, pieces: List[Tuple[str, str, int, int]]):
+        self.pieces = pieces
+        self._iterator = self._read()
+
+    @staticmethod
+    def _open(object_name: str, endpoint: str, offset: int, length: int):
+        """Open a chunk on the node it was first written to, else on a replica."""
+        nodes = sorted(
+            node_manager.get_read_order(object_name), key=lambda node: node.endpoint != endpoint
+        )
+        error = None
+        for node in nodes:
+            try:
+                return minio_stream(object_name, offset=offset, length=length, node=node)
+            except Exception as e:
+                error = e
+                logger.warning(f"Could not open {object_name} on {node.endpoint}: {e}")
+        raise error or Exception(f"No healthy node holds {object_name}.")
+
+    def _read(self):
+        for object_name, endpoint, offset, length in self.pieces:
+            stream = self._open(object_name, endpoint, offset, length)
+            try:
+                yield from stream
+            finally:
+                stream.close()
+
+    def __iter__(self):
+        return self._iterator
+
+    def close(self):
+        """Close the chunk being read, if any."""
+        self._iterator.close()
+
+
+class ChunkStoreService:
+    """Store files as ordered manifests of content-defined chunks.
+
+    Each distinct chunk is one ``ContentBlob`` under ``chunks/`` and is
+    stored once however many files contain it, on the nodes its key is
+    placed on. ``node_endpoint`` is the first node written; reads fall back
+    to the other placement nodes. A file's ``FileChunk`` rows
+    are its manifest: hash, offset and size of every chunk in order.
+    """
+
+    @staticmethod
+    def object_name(sha256: str) -> str:
+        """Storage key of a chunk."""
+        return f"chunks/{sha256[:2]}/{sha256}"
+
+    @staticmethod
+    def manifest_digest(hashes: Iterable[str]) -> str:
+        """ETag of a chunked file: the SHA-256 of its chunk hashes in order."""
+        digest = hashlib.sha256()
+        count = 0
+        for sha256 in hashes:
+            digest.update(bytes.fromhex(sha256))
+            count += 1
+        return f"{digest.hexdigest()}-{count}"
+
+    @staticmethod
+    def owned(hashes: Iterable[str], user: User) -> Dict[str, ContentBlob]:
+        """Stored chunks among ``hashes`` that files of ``user`` already use.
+
+        Only these can be referenced without sending their bytes, as knowing
+        a hash is not proof of having the chunk.
+        """
+        blobs = ContentBlob.objects.filter(sha256__in=set(hashes)).filter(
+            Q(chunk_refs__file_metadata__uploaded_by=user) | Q(files__uploaded_by=user)
+        )
+        return {blob.sha256: blob for blob in blobs.distinct()}
+
+    @staticmethod
+    def _put(node: Node, object_name: str, data: bytes, md5: str) -> bool:
+        """Write a chunk to one node; False if the write failed its integrity check."""
+        try:
+            result = node.client.put_object(
+                settings.MINIO_BUCKET_NAME, object_name, io.BytesIO(data), len(data)
+            )
+        except Exception as e:
+            logger.warning(f"Could not store {object_name} on {node.endpoint}: {e}")
+            return False
+        if result.etag.strip('"') != md5:
+            minio_remove(object_name, node.endpoint)
+            return False
+        return True
+
+    @staticmethod
+    def _replicate(object_name: str, source: Node, targets: List[Node]) -> None:
+        """Copy a stored chunk to the rest of its placement nodes in the background."""
+        options = replication_options()
+
+        def copy(target):
+            try:
+                copy_object(source, target, object_name, options)
+            except Exception as e:
+                # Reads fall back to the nodes that have it
+                logger.warning(f"Could not copy {object_name} to {target.endpoint}: {e}")
+
+        for target in targets:
+            get_executor(options["workers"]).submit(copy, target)
+
+    @classmethod
+    def put_chunk(cls, sha256: str, data: bytes) -> ContentBlob:
+        """Store a chunk unless it is already stored, and return its blob.
+
+        The chunk is written to its placement nodes in order until
+        ``write_quorum`` of them hold it; the others are copied in the
+        background. ``sha256`` must be the digest of ``data``; callers
+        verify it.
+        """
+        blob = ContentBlob.objects.filter(sha256=sha256).first()
+        if blob is not None:
+            return blob
+
+        object_name = cls.object_name(sha256)
+        md5 = hashlib.md5(data).hexdigest()
+        nodes = node_manager.get_read_order(object_name)
+        if not nodes:
+            raise Exception("No active MinIO nodes available.")
+        quorum = min(replication_options()["write_quorum"], len(node_manager.get_all_nodes()))
+        stored = []
+        for node in nodes:
+            if len(stored) >= quorum:
+                break
+            if cls._put(node, object_name, data, md5):
+                stored.append(node)
+        if len(stored) < quorum:
+            for node in stored:
+                minio_remove(object_name, node.endpoint)
+            raise QuorumNotReached(
+                f"Only {len(stored)} of {quorum} required copies of {object_name} could be stored."
+            )
+
+        try:
+            with transaction.atomic():
+                blob = ContentBlob.objects.create(
+                    sha256=sha256,
+                    object_name=object_name,
+                    size=len(data),
+                    etag=md5,
+                    checksum=md5,
+                    total_chunks=1,
+                    node_endpoint=stored[0].endpoint,
+                )
+        except IntegrityError:
+            # Stored concurrently under the same key; either copy will do
+            return ContentBlob.objects.get(sha256=sha256)
+
+        present = {node.endpoint for node in stored}
+        cls._replicate(
+            object_name,
+            stored[0],
+            [node for node in node_manager.get_placement(object_name) if node.endpoint not in present],
+        )
+        return blob
+
+    @classmethod
+    def store_file(cls, file_obj, user: User) -> FileMetadata:
+        """Chunk an uploaded file on the server and store only new chunks."""
+        manifest = []
+        file_obj.seek(0)
+        for data in iter_chunks(file_obj):
+            sha256 = hashlib.sha256(data).hexdigest()
+            cls.put_chunk(sha256, data)
+            manifest.append((sha256, len(data)))
+
+        return cls.create_file(
+            user,
+            get_valid_filename(file_obj.name),
+            file_obj.content_type,
+            manifest,
+        )
+
+    @classmethod
+    def create_file(
+        cls,
+        user: User,
+        file_name: str,
+        content_type: Optional[str],
+        manifest: List[Tuple[str, int]],
+        upload_session=None,
+    ) -> FileMetadata:
+        """Create a chunked file from a manifest of ``(sha256, size)`` pairs.
+
+        Every chunk must already be stored. With ``upload_session``, the
+        session's manifest rows are moved to the file instead of created.
+        """
+        hashes = [sha256 for sha256, _ in manifest]
+        etag = cls.manifest_digest(hashes)
+        distinct = set(hashes)
+
+        with transaction.atomic():
+            # Locked so a concurrent delete cannot drop a chunk being referenced
+            blobs = {
+                blob.sha256: blob
+                for blob in ContentBlob.objects.select_for_update()
+                .filter(sha256__in=distinct)
+                .order_by("pk")
+            }
+            missing = [sha256 for sha256 in dict.fromkeys(hashes) if sha256 not in blobs]
+            if missing:
+                raise ValueError(f"Missing chunks: {missing}")
+
+            file_metadata = FileMetadata.objects.create(
+                file_name=file_name,
+                file_url=f"{settings.MINIO_ACCESS_URL}/{file_name}",
+                file_size=sum(size for _, size in manifest),
+                etag=etag,
+                location=settings.MINIO_BUCKET_NAME,
+                uploaded_by=user,
+                total_chunks=len(manifest),
+                content_type=content_type,
+                checksum=etag.split("-")[0],
+                storage_mode="CHUNKED",
+            )
+
+            if upload_session is not None:
+                chunks = list(upload_session.chunks.order_by("chunk_index"))
+                for chunk in chunks:
+                    chunk.file_metadata = file_metadata
+                    chunk.blob = blobs[chunk.content_hash]
+                FileChunk.objects.bulk_update(chunks, ["file_metadata", "blob"])
+            else:
+                offset = 0
+                chunks = []
+                for index, (sha256, size) in enumerate(manifest):
+                    chunks.append(FileChunk(
+                        file_metadata=file_metadata,
+                        chunk_index=index,
+                        chunk_size=size,
+                        etag=blobs[sha256].etag,
+                        content_hash=sha256,
+                        offset=offset,
+                        blob=blobs[sha256],
+                    ))
+                    offset += size
+                FileChunk.objects.bulk_create(chunks)
+        return file_metadata
+
+    @staticmethod
+    def open_range(file_metadata: FileMetadata, offset: int = 0, length: int = 0) -> ChunkStream:
+        """Open ``length`` bytes of a chunked file from ``offset`` (0 for the rest)."""
+        end = offset + length if length else file_metadata.file_size
+        chunks = (
+            file_metadata.chunks.select_related("blob")
+            .filter(offset__lt=end, offset__gt=offset - F("chunk_size"))
+            .order_by("chunk_index")
+        )
+        pieces = []
+        for chunk in chunks:
+            start = max(offset - chunk.offset, 0)
+            stop = min(end - chunk.offset, chunk.chunk_size)
+            pieces.append((chunk.blob.object_name, chunk.blob.node_endpoint, start, stop - start))
+        return ChunkStream(pieces)
+
+    @staticmethod
+    def release(file_metadata: FileMetadata) -> List[Tuple[str, str]]:
+        """Delete a chunked file's row and drop its references to its chunks.
+
+        Returns ``(object_name, endpoint)`` for chunks no longer used by any
+        file, which the caller removes from storage.
+        """
+        blob_ids = set(file_metadata.chunks.values_list("blob_id", flat=True))
+        blob_ids.discard(None)
+        orphaned = []
+        with transaction.atomic():
+            blobs = list(
+                ContentBlob.objects.select_for_update().filter(pk__in=blob_ids).order_by("pk")
+            )
+            file_metadata.delete()
+            for blob in blobs:
+                if not (blob.chunk_refs.exists() or blob.files.exists()):
+                    orphaned.append((blob.object_name, blob.node_endpoint))
+                    blob.delete()
+        return orphaned
+
+    @staticmethod
+    def remove_chunks(chunks: List[Tuple[str, str]]) -> None:
+        """Remove released chunks from every node that may hold them."""
+        for object_name, endpoint in chunks:
+            endpoints = {endpoint} if endpoint else set()
+            endpoints.update(node.endpoint for node in node_manager.get_placement(object_name))
+            for node_endpoint in endpoints:
+                try:
+                    minio_remove(object_name, node_endpoint)
+                except Exception as e:
+                    logger.warning(f"Error removing {object_name} from {node_endpoint}: {e}")
@@ -0,0 +1,220 @@
+"""Streaming downloads with HTTP Range and conditional request support."""
+
+import re
+import uuid
+from typing import List, Optional, Tuple
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import (
+    content_disposition_header,
+    http_date,
+    parse_etags,
+    parse_http_date_safe,
+    quote_etag,
+)
+
+from core.minio.storage import minio_stream
+from core.minio.striping import StripedReader, plan_stripes, striping_options
+
+from .chunks import ChunkStoreService
+from .erasure import ErasureService
+from .models import FileMetadata
+from .replicas import ReplicaService
+
+# Requests asking for more ranges than this get the whole file instead
+MAX_RANGES = 16
+RANGE_SPEC = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+
+class RangeNotSatisfiable(ValueError):
+    """None of the requested byte ranges overlap the file."""
+
+
+def parse_range_header(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a ``Range`` header into sorted, merged ``(start, end)`` pairs.
+
+    Ends are inclusive. Returns None when the header should be ignored and
+    the whole file sent, and raises RangeNotSatisfiable when no range fits.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    ranges = []
+    for item in spec.split(","):
+        match = RANGE_SPEC.match(item)
+        if not match or match.groups() == ("", ""):
+            return None
+        first, last = match.groups()
+        if not first:
+            # Suffix range: the last N bytes
+            if int(last) == 0:
+                continue
+            ranges.append((max(size - int(last), 0), size - 1))
+            continue
+        start = int(first)
+        end = int(last) if last else size - 1
+        if last and end < start:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def _etag_matches(etag: str, header: str) -> bool:
+    """Weak comparison, as If-None-Match requires."""
+    etags = [tag.removeprefix("W/") for tag in parse_etags(header)]
+    return "*" in etags or etag in etags
+
+
+def _if_range_matches(file_metadata: FileMetadata, etag: str, header: str) -> bool:
+    """If-Range takes a strong ETag or the Last-Modified date."""
+    header = header.strip()
+    if header.startswith('"') or header.startswith("W/"):
+        return header == etag
+    if_date = parse_http_date_safe(header)
+    return if_date is not None and if_date == int(file_metadata.uploaded_at.timestamp())
+
+
+def _multipart_ranges(content_type, size, ranges, boundary):
+    """Build the multipart/byteranges body as ``(bytes, range)`` pieces."""
+    pieces = []
+    for start, end in ranges:
+        header = (
+            f"--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode()
+        pieces.append((header, (start, end)))
+    return pieces, f"\r\n--{boundary}--\r\n".encode()
+
+
+def _open_range(file_metadata: FileMetadata, offset: int = 0, length: int = 0):
+    """Open bytes of a file from its single object or from its chunks."""
+    if file_metadata.is_chunked:
+        return ChunkStoreService.open_range(file_metadata, offset, length)
+    if file_metadata.is_erasure_coded:
+        return ErasureService.open_range(file_metadata, offset, length)
+    return minio_stream(
+        file_metadata.object_name,
+        offset=offset,
+        length=length,
+        node=ReplicaService.read_nodes(file_metadata)[0],
+    )
+
+
+def _stream_multipart(file_metadata, pieces, trailer):
+    """Open each range only when the client has read up to it."""
+    for index, (header, (start, end)) in enumerate(pieces):
+        yield (b"\r\n" if index else b"") + header
+        stream = _open_range(file_metadata, start, end - start + 1)
+        try:
+            yield from stream
+        finally:
+            stream.close()
+    yield trailer
+
+
+def _striped_content(request, file_metadata: FileMetadata) -> Optional[StripedReader]:
+    """Read a whole large file from every healthy node holding it at once.
+
+    Files from ``min_size`` up are striped by default; ``?striped=1`` or
+    ``?striped=0`` forces the choice either way.
+    """
+    if not file_metadata.is_single_object:
+        return None
+
+    options = striping_options()
+    striped = request.GET.get("striped")
+    if striped == "0" or (striped != "1" and file_metadata.file_size < options["min_size"]):
+        return None
+
+    nodes = ReplicaService.read_nodes(file_metadata)
+    if len(nodes) < 2:
+        return None
+
+    parts = file_metadata.chunks.order_by("chunk_index").values_list("chunk_size", "etag")
+    stripes = plan_stripes(file_metadata.file_size, options["stripe_size"], parts)
+    return StripedReader(file_metadata.object_name, stripes, nodes, options)
+
+
+def stream_file_response(request, file_metadata: FileMetadata) -> HttpResponse:
+    """Proxy an object to the client in fixed-size chunks.
+
+    Answers ``Range`` requests with 206 (``multipart/byteranges`` for more
+    than one range) and honours ``If-None-Match`` and ``If-Range`` against
+    the stored ETag, so memory per request stays constant and media
+    players can seek. Whole large files are striped across nodes, chunked
+    files are assembled from their chunks in order, and erasure-coded files
+    are decoded from their shards.
+    """
+    size = file_metadata.file_size
+    content_type = file_metadata.content_type or "application/octet-stream"
+    etag = quote_etag(file_metadata.etag.strip('"'))
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": http_date(file_metadata.uploaded_at.timestamp()),
+    }
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and _etag_matches(etag, if_none_match):
+        return HttpResponse(status=304, headers=headers)
+
+    ranges = None
+    range_header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    if range_header and (not if_range or _if_range_matches(file_metadata, etag, if_range)):
+        try:
+            ranges = parse_range_header(range_header, size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{size}"
+            return HttpResponse(status=416, headers=headers)
+
+    headers["Content-Disposition"] = content_disposition_header(
+        request.GET.get("download") == "1", file_metadata.file_name
+    )
+
+    status, content, offset, length = 200, None, 0, 0
+    if not ranges:
+        headers["Content-Length"] = str(size)
+        if request.method != "HEAD":
+            content = _striped_content(request, file_metadata)
+    elif len(ranges) == 1:
+        status = 206
+        offset, end = ranges[0]
+        length = end - offset + 1
+        headers["Content-Length"] = str(length)
+        headers["Content-Range"] = f"bytes {offset}-{end}/{size}"
+    else:
+        status = 206
+        boundary = uuid.uuid4().hex
+        pieces, trailer = _multipart_ranges(content_type, size, ranges, boundary)
+        body_length = sum(len(header) + end - start + 1 for header, (start, end) in pieces)
+        body_length += 2 * (len(pieces) - 1) + len(trailer)
+        headers["Content-Length"] = str(body_length)
+        content_type = f"multipart/byteranges; boundary={boundary}"
+        content = _stream_multipart(file_metadata, pieces, trailer)
+
+    if request.method == "HEAD":
+        return HttpResponse(status=status, content_type=content_type, headers=headers)
+    if content is None:
+        content = _open_range(file_metadata, offset, length)
+    return StreamingHttpResponse(
+        content, status=status, content_type=content_type, headers=headers
+    )
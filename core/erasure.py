@@ -0,0 +1,147 @@
+"""Service layer for erasure-coded storage."""
+
+import logging
+import uuid
+from typing import Dict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils.text import get_valid_filename
+
+from core.minio.erasure import ShardReader, ShardWriter, erasure_options
+from core.minio.node import node_manager
+from core.minio.storage import minio_remove
+
+from .models import ErasureLayout, ErasureShard, FileMetadata
+
+logger = logging.getLogger(__name__)
+
+
+class ErasureService:
+    """Store files as ``data_shards + parity_shards`` shards, one per node.
+
+    Costs ``(k + m) / k`` times the file size instead of a full copy per
+    node, and survives the loss of any ``m`` nodes. The layout rows record
+    where every shard is, so reads go straight to the data shards and only
+    touch parity when one of them is unavailable.
+    """
+
+    @staticmethod
+    def requested(request) -> bool:
+        """Whether an upload asked for erasure coding (``?erasure=1``)."""
+        default = "1" if erasure_options()["enabled"] else "0"
+        return request.GET.get("erasure", default) == "1"
+
+    @staticmethod
+    def shard_name(file_id: uuid.UUID, index: int) -> str:
+        """Storage key of one shard of a file, unique to the file whatever its name."""
+        return f"shards/{file_id}/{index}"
+
+    @classmethod
+    def store_file(cls, file_obj, user: User) -> FileMetadata:
+        """Encode an uploaded file and store its shards on distinct nodes."""
+        options = erasure_options()
+        data_shards, parity_shards = options["data_shards"], options["parity_shards"]
+        file_name = get_valid_filename(file_obj.name)
+        file_id = uuid.uuid4()
+        # Shards follow the file's placement order, one per healthy node
+        nodes = node_manager.get_read_order(f"shards/{file_id}")[: data_shards + parity_shards]
+        names = [cls.shard_name(file_id, index) for index in range(len(nodes))]
+
+        writer = ShardWriter(nodes, names, options)
+        file_obj.seek(0)
+        shards, block_size, md5, _ = writer.write(file_obj, file_obj.size)
+
+        try:
+            with transaction.atomic():
+                file_metadata = FileMetadata.objects.create(
+                    id=file_id,
+                    file_name=file_name,
+                    file_url=None,
+                    file_size=file_obj.size,
+                    etag=md5,
+                    location=nodes[0].bucket_name,
+                    uploaded_by=user,
+                    total_chunks=len(shards),
+                    content_type=file_obj.content_type,
+                    checksum=md5,
+                    storage_mode="ERASURE",
+                )
+                layout = ErasureLayout.objects.create(
+                    file_metadata=file_metadata,
+                    data_shards=data_shards,
+                    parity_shards=parity_shards,
+                    block_size=block_size,
+                )
+                ErasureShard.objects.bulk_create(
+                    ErasureShard(
+                        layout=layout,
+                        shard_index=shard["index"],
+                        node_endpoint=shard["endpoint"],
+                        object_name=shard["object_name"],
+                        size=shard["size"],
+                        etag=shard["etag"],
+                    )
+                    for shard in shards
+                )
+        except Exception:
+            writer.remove_all()
+            raise
+        return file_metadata
+
+    @staticmethod
+    def open_range(file_metadata: FileMetadata, offset: int = 0, length: int = 0) -> ShardReader:
+        """Open ``length`` bytes of an erasure-coded file from ``offset`` (0 for the rest)."""
+        layout = file_metadata.erasure
+        active = {node.endpoint for node in node_manager.get_active_nodes()}
+        # Data shards on healthy nodes first; parity only stands in for missing ones
+        shards = sorted(
+            layout.shards.all(),
+            key=lambda shard: (
+                shard.node_endpoint not in active,
+                shard.shard_index >= layout.data_shards,
+                shard.shard_index,
+            ),
+        )
+        candidates = []
+        for shard in shards:
+            node = node_manager.get_node(shard.node_endpoint)
+            if node is not None:
+                candidates.append((shard.shard_index, node, shard.object_name))
+        return ShardReader(
+            candidates,
+            layout.data_shards,
+            layout.parity_shards,
+            layout.block_size,
+            file_metadata.file_size,
+            offset,
+            length,
+        )
+
+    @staticmethod
+    def delete(file_metadata: FileMetadata) -> None:
+        """Delete an erasure-coded file's rows and remove its shards."""
+        shards = list(
+            ErasureShard.objects.filter(layout__file_metadata=file_metadata).values_list(
+                "object_name", "node_endpoint"
+            )
+        )
+        file_metadata.delete()
+        for object_name, endpoint in shards:
+            try:
+                minio_remove(object_name, endpoint)
+            except Exception as e:
+                logger.warning(f"Error removing {object_name} from {endpoint}: {e}")
+
+    @staticmethod
+    def shard_labels(file_metadata: FileMetadata) -> Dict[str, str]:
+        """``{endpoint: label}`` naming the shard each node holds."""
+        layout = file_metadata.erasure
+        return {
+            shard.node_endpoint: (
+                f"Parity shard {shard.shard_index - layout.data_shards + 1}"
+                if shard.shard_index >= layout.data_shards
+                else f"Data shard {shard.shard_index + 1}"
+            )
+            for shard in layout.shards.all()
+        }
@@ -0,0 +1,115 @@
+"""Middleware for request tracing and profiling."""
+
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import profiling, tracing
+
+logger = logging.getLogger(__name__)
+
+_templates_traced = False
+
+
+def _trace_templates():
+    """Record Django template rendering as spans, once per process."""
+    global _templates_traced
+    if _templates_traced:
+        return
+    from django.template.backends.django import Template
+
+    render = Template.render
+
+    def traced_render(self, context=None, request=None):
+        with tracing.span("template", template=self.origin.template_name):
+            return render(self, context, request)
+
+    Template.render = traced_render
+    _templates_traced = True
+
+
+def _trace_query(execute, sql, params, many, context):
+    """Database execute wrapper recording each query as a span."""
+    with tracing.span("db", sql=sql[:300]):
+        return execute(sql, params, many, context)
+
+
+class TracingMiddleware:
+    """Trace each request and report its spans in a ``Server-Timing`` header.
+
+    Requests slower than ``dump_threshold`` are also written to
+    ``dump_dir`` as JSON. Removed from the stack when tracing is disabled.
+    """
+
+    def __init__(self, get_response):
+        self.options = tracing.tracing_options()
+        if not self.options["enabled"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        _trace_templates()
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        token = tracing.start(f"{request.method} {request.path}", self.options)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(_trace_query))
+                response = self.get_response(request)
+        finally:
+            trace = tracing.finish(token)
+        total = time.perf_counter() - started
+
+        response["Server-Timing"] = trace.server_timing(total, self.options["header_entries"])
+        threshold = self.options["dump_threshold"]
+        if threshold is not None and total >= threshold:
+            try:
+                tracing.dump(trace, total, self.options)
+            except OSError as e:
+                logger.warning(f"Could not write trace of {trace.name}: {e}")
+        return response
+
+
+class ProfilingMiddleware:
+    """Profile sampled and slow requests, with their DB queries.
+
+    A ``sample_rate`` fraction of requests is profiled and kept. With a
+    ``slow_threshold`` every request is profiled and kept when it takes at
+    least that long. Removed from the stack when profiling is disabled.
+    """
+
+    def __init__(self, get_response):
+        self.options = profiling.profiling_options()
+        if not self.options["enabled"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampled = random.random() < self.options["sample_rate"]
+        threshold = self.options["slow_threshold"]
+        if not sampled and threshold is None:
+            return self.get_response(request)
+
+        profile = profiling.RequestProfile(self.options)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(profile.queries))
+            profile.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.stop()
+        duration = time.perf_counter() - started
+
+        slow = threshold is not None and duration >= threshold
+        if sampled or slow:
+            try:
+                profile.save(request, response, duration, "slow" if slow else "sampled")
+            except OSError as e:
+                logger.warning(f"Could not write profile of {request.path}: {e}")
+        return response
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='filechunk',
+            name='file_metadata',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='core.filemetadata'),
+        ),
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file_name', models.CharField(max_length=255)),
+                ('file_size', models.IntegerField()),
+                ('content_type', models.CharField(blank=True, max_length=255, null=True)),
+                ('chunk_size', models.IntegerField()),
+                ('total_chunks', models.IntegerField()),
+                ('upload_id', models.CharField(max_length=255)),
+                ('node_endpoint', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('ACTIVE', 'Active'), ('COMPLETED', 'Completed'), ('ABORTED', 'Aborted')], default='ACTIVE', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+                ('file_metadata', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.filemetadata')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='filechunk',
+            unique_together={('file_metadata', 'chunk_index')},
+        ),
+        migrations.AddField(
+            model_name='filechunk',
+            name='upload_session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='core.uploadsession'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='filechunk',
+            unique_together={('file_metadata', 'chunk_index'), ('upload_session', 'chunk_index')},
+        ),
+        migrations.AddIndex(
+            model_name='uploadsession',
+            index=models.Index(fields=['created_by', 'status'], name='core_upload_created_60f66c_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='mode',
+            field=models.CharField(choices=[('PROXY', 'Chunks through the API'), ('DIRECT', 'Direct to storage')], default='PROXY', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='upload_id',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_upload_session_mode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ObjectReplica',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('node_endpoint', models.CharField(max_length=255)),
+                ('state', models.CharField(choices=[('PRESENT', 'Present'), ('PENDING', 'Pending'), ('MISSING', 'Missing')], default='PRESENT', max_length=10)),
+                ('etag', models.CharField(blank=True, max_length=255)),
+                ('verified_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('file_metadata', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='replicas', to='core.filemetadata')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['node_endpoint', 'state'], name='core_object_node_en_4b006e_idx')],
+                'unique_together': {('file_metadata', 'node_endpoint')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_object_replica'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentBlob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('object_name', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField()),
+                ('etag', models.CharField(blank=True, max_length=255)),
+                ('checksum', models.CharField(blank=True, max_length=64)),
+                ('total_chunks', models.IntegerField(default=1)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='filemetadata',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='files', to='core.contentblob'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_content_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contentblob',
+            name='node_endpoint',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='filechunk',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='chunk_refs', to='core.contentblob'),
+        ),
+        migrations.AddField(
+            model_name='filechunk',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='filechunk',
+            name='offset',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='filemetadata',
+            name='storage_mode',
+            field=models.CharField(choices=[('OBJECT', 'One object'), ('CHUNKED', 'Content-defined chunks')], default='OBJECT', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='mode',
+            field=models.CharField(choices=[('PROXY', 'Chunks through the API'), ('DIRECT', 'Direct to storage'), ('MANIFEST', 'Missing chunks of a manifest')], default='PROXY', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_chunk_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='objectreplica',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
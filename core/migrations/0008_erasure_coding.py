@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_object_replica_queued_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='filemetadata',
+            name='storage_mode',
+            field=models.CharField(choices=[('OBJECT', 'One object'), ('CHUNKED', 'Content-defined chunks'), ('ERASURE', 'Erasure-coded shards')], default='OBJECT', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='ErasureLayout',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('data_shards', models.PositiveSmallIntegerField()),
+                ('parity_shards', models.PositiveSmallIntegerField()),
+                ('block_size', models.IntegerField()),
+                ('file_metadata', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='erasure', to='core.filemetadata')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ErasureShard',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('shard_index', models.PositiveSmallIntegerField()),
+                ('node_endpoint', models.CharField(max_length=255)),
+                ('object_name', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField()),
+                ('etag', models.CharField(blank=True, max_length=255)),
+                ('layout', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='core.erasurelayout')),
+            ],
+            options={
+                'ordering': ['shard_index'],
+                'unique_together': {('layout', 'shard_index')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:16
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def name_existing_sessions(apps, schema_editor):
+    # Sessions opened before this migration wrote to the object named after the file
+    UploadSession = apps.get_model('core', 'UploadSession')
+    UploadSession.objects.filter(object_name='').update(object_name=F('file_name'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_erasure_coding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filemetadata',
+            name='object_key',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='object_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RunPython(name_existing_sessions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:39
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_upload_session_object_name'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='contentblob',
+            name='ref_count',
+        ),
+    ]
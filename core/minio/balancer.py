@@ -0,0 +1,312 @@
+"""
+Latency-aware node selection.
+Every request a node's transport sends is timed, and each node keeps
+decaying averages (EWMAs) of latency, throughput and error rate per
+operation, latency sketches for percentiles and a count of requests in
+flight. Nodes are picked with power-of-two-choices: two healthy nodes are
+drawn at random and the one with the lower expected cost wins, which
+avoids herding every process onto the same "best" node.
+"""
+
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+DEFAULT_BALANCER = {
+    "decay": 10.0,  # Seconds for an EWMA to forget ~63% of its history
+    "default_latency": 0.05,  # Seconds assumed for a node with no samples yet
+    "error_penalty": 10.0,  # Cost multiplier applied per unit of error rate
+}
+
+# Latency sketch buckets grow by 10% from 0.1 ms, so any percentile is
+# within 5% of the true value, up to about 2 minutes
+_SKETCH_MIN = 0.0001
+_SKETCH_GAMMA = 1.1
+_SKETCH_BUCKETS = 150
+_LOG_GAMMA = math.log(_SKETCH_GAMMA)
+
+
+def balancer_options():
+    """Balancer settings merged over the defaults."""
+    options = dict(DEFAULT_BALANCER)
+    options.update(getattr(settings, "MINIO_BALANCER", {}))
+    return options
+
+
+def ewma_step(value, updated_at, sample, now, decay, peak=False):
+    """Fold ``sample`` into an average last updated at ``updated_at``."""
+    if value is None or (peak and sample > value):
+        return sample
+    weight = math.exp(-max(0.0, now - updated_at) / decay)
+    return value * weight + sample * (1 - weight)
+
+
+def decayed(value, updated_at, now, decay):
+    """A count last updated at ``updated_at``, faded out to ``now``."""
+    return value * math.exp(-max(0.0, now - updated_at) / decay)
+
+
+class EWMA:
+    """Exponentially weighted moving average that decays with elapsed time.
+
+    Samples are weighted by how long ago the previous one arrived, so a
+    burst of requests does not wash out the history any faster than a
+    quiet period would. Not thread-safe; ``NodeScore`` holds the lock.
+    """
+
+    def __init__(self, decay, peak=False):
+        self.decay = decay
+        self.peak = peak  # Jump straight to samples above the average
+        self.value = None
+        self.updated_at = 0.0
+
+    def update(self, sample, now):
+        self.value = ewma_step(self.value, self.updated_at, sample, now, self.decay, self.peak)
+        self.updated_at = now
+        return self.value
+
+    def get(self, default=0.0):
+        return default if self.value is None else self.value
+
+
+class DecayingCount:
+    """Event count whose past events fade out with elapsed time."""
+
+    def __init__(self, decay):
+        self.decay = decay
+        self.value = 0.0
+        self.updated_at = 0.0
+
+    def add(self, amount, now):
+        self.value = self.get(now) + amount
+        self.updated_at = now
+
+    def get(self, now):
+        return decayed(self.value, self.updated_at, now, self.decay)
+
+
+class LatencySketch:
+    """Log-bucketed latency histogram for percentiles in constant memory."""
+
+    def __init__(self):
+        self.counts = [0] * _SKETCH_BUCKETS
+        self.total = 0
+
+    @staticmethod
+    def bucket(seconds):
+        if seconds <= _SKETCH_MIN:
+            return 0
+        index = int(math.log(seconds / _SKETCH_MIN) / _LOG_GAMMA) + 1
+        return min(index, _SKETCH_BUCKETS - 1)
+
+    def add(self, seconds):
+        self.counts[self.bucket(seconds)] += 1
+        self.total += 1
+
+    def percentile(self, q):
+        """Latency in seconds below which ``q`` (0-1) of the samples fall."""
+        if not self.total:
+            return None
+        rank = q * (self.total - 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen > rank:
+                # Midpoint of the bucket, in log space
+                return _SKETCH_MIN * _SKETCH_GAMMA ** max(0, index - 0.5)
+        return _SKETCH_MIN * _SKETCH_GAMMA ** (_SKETCH_BUCKETS - 1)
+
+
+class OperationStats:
+    """Counters and averages for one kind of request to a node."""
+
+    def __init__(self, decay):
+        self.latency = EWMA(decay)
+        self.throughput = EWMA(decay)  # Bytes per second
+        self.sketch = LatencySketch()
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "latency_ewma": self.latency.value,
+            "throughput_ewma": self.throughput.value,
+            "p50": self.sketch.percentile(0.5),
+            "p95": self.sketch.percentile(0.95),
+            "p99": self.sketch.percentile(0.99),
+        }
+
+
+class NodeScore:
+    """Live load statistics of one node, safe to update from any thread.
+
+    With a ``shared`` scoreboard record, in-flight counts, latency and error
+    counts are also kept host-wide and the cost is computed from those, so
+    every worker balances on the load of all of them. Per-operation stats
+    stay per process.
+    """
+
+    def __init__(self, options=None, shared=None):
+        self.options = options or balancer_options()
+        self.shared = shared
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        # Peak-sensitive, so a node that suddenly slows down is avoided at once
+        self.latency = EWMA(self.options["decay"], peak=True)
+        self.sketch = LatencySketch()
+        # Recent requests and failures, for an error rate that bursts move at once
+        self.recent_requests = DecayingCount(self.options["decay"])
+        self.recent_errors = DecayingCount(self.options["decay"])
+        self.operations = {}
+
+    def _operation(self, op):
+        stats = self.operations.get(op)
+        if stats is None:
+            stats = self.operations[op] = OperationStats(self.options["decay"])
+        return stats
+
+    def begin(self):
+        """Count a request in flight; returns its start time for ``end``."""
+        with self._lock:
+            self.in_flight += 1
+        if self.shared is not None:
+            self.shared.add_in_flight(1)
+        return time.monotonic()
+
+    def end(self, op, started, nbytes=0, error=False):
+        """Record a finished request started with ``begin``."""
+        now = time.monotonic()
+        elapsed = now - started
+        if self.shared is not None:
+            self.shared.finish(elapsed, error, not nbytes, self.options["decay"])
+        with self._lock:
+            self.in_flight -= 1
+            stats = self._operation(op)
+            stats.count += 1
+            self.recent_requests.add(1, now)
+            if error:
+                self.recent_errors.add(1, now)
+                stats.errors += 1
+                return
+            stats.latency.update(elapsed, now)
+            stats.sketch.add(elapsed)
+            if nbytes:
+                stats.bytes += nbytes
+                stats.throughput.update(nbytes / max(elapsed, 1e-6), now)
+            else:
+                # Requests carrying a body take as long as their size, so only
+                # the others say how quickly the node responds
+                self.sketch.add(elapsed)
+                self.latency.update(elapsed, now)
+
+    def record_transfer(self, op, nbytes, elapsed):
+        """Record bytes moved outside a timed request, e.g. a streamed body."""
+        if not nbytes:
+            return
+        now = time.monotonic()
+        with self._lock:
+            stats = self._operation(op)
+            stats.bytes += nbytes
+            stats.throughput.update(nbytes / max(elapsed, 1e-6), now)
+
+    def _error_rate(self, now):
+        requests = self.recent_requests.get(now)
+        return self.recent_errors.get(now) / requests if requests else 0.0
+
+    @contextmanager
+    def track(self, op, nbytes=0):
+        """Time a block as one request of kind ``op``."""
+        started = self.begin()
+        try:
+            yield
+        except Exception:
+            self.end(op, started, error=True)
+            raise
+        self.end(op, started, nbytes)
+
+    def _host_load(self):
+        """``(latency, error_rate, in_flight)`` across the host's workers, or None."""
+        view = self.shared.read() if self.shared is not None else None
+        if view is None:
+            return None
+        now, decay = time.time(), self.options["decay"]
+        requests = decayed(view["requests"], view["counts_at"], now, decay)
+        errors = decayed(view["errors"], view["counts_at"], now, decay)
+        return view["latency"], errors / requests if requests else 0.0, view["in_flight"]
+
+    def _load(self):
+        """``(latency, error_rate, in_flight)``, host-wide when shared."""
+        host = self._host_load()
+        if host is not None:
+            return host
+        now = time.monotonic()
+        with self._lock:
+            return self.latency.value, self._error_rate(now), self.in_flight
+
+    def cost(self):
+        """Expected time for this node to serve one more request.
+
+        The latency average is scaled by the requests already queued on
+        the node and penalised by its recent error rate.
+        """
+        latency, errors, in_flight = self._load()
+        if latency is None:
+            latency = self.options["default_latency"]
+        return latency * (in_flight + 1) * (1 + self.options["error_penalty"] * errors)
+
+    def snapshot(self):
+        """Current statistics as plain data, e.g. for the dashboard."""
+        latency, errors, in_flight = self._load()
+        with self._lock:
+            return {
+                "in_flight": in_flight,
+                "local_in_flight": self.in_flight,
+                "latency_ewma": latency,
+                "p50": self.sketch.percentile(0.5),
+                "p99": self.sketch.percentile(0.99),
+                "error_rate": errors,
+                "operations": {
+                    op: stats.snapshot() for op, stats in sorted(self.operations.items())
+                },
+            }
+
+
+def operation_name(method, url):
+    """Kind of S3 request a MinIO client call sends, for per-operation stats."""
+    query = urlsplit(url).query
+    if method == "HEAD":
+        return "stat"
+    if method == "DELETE":
+        return "remove"
+    if method == "PUT":
+        return "part" if "partNumber=" in query else "upload"
+    if method == "POST":
+        return "multipart"
+    return "list" if query and "versionId=" not in query else "download"
+
+
+def choose(nodes):
+    """Pick a node with power-of-two-choices over the nodes' costs."""
+    if not nodes:
+        return None
+    if len(nodes) == 1:
+        return nodes[0]
+    first, second = random.sample(nodes, 2)
+    return first if first.score.cost() <= second.score.cost() else second
+
+
+def prefer(nodes):
+    """``nodes`` with a power-of-two-choices pick moved to the front."""
+    chosen = choose(nodes)
+    if chosen is None:
+        return []
+    return [chosen] + [node for node in nodes if node is not chosen]
@@ -0,0 +1,110 @@
+"""
+Reusable part buffers for multipart uploads.
+Buffers are filled in place with ``readinto`` and handed out as memoryview
+slices, so a part's bytes are copied once from the upload source.
+"""
+
+import threading
+
+from .multipart import multipart_options
+
+
+class BufferPool:
+    """Fixed-size buffers shared by every upload in the process."""
+
+    def __init__(self, buffer_size, max_buffers):
+        self.buffer_size = buffer_size
+        self.max_buffers = max_buffers
+        self._free = []
+        self._created = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Return a free buffer, allocating one lazily up to ``max_buffers``."""
+        with self._cond:
+            while not self._free and self._created >= self.max_buffers:
+                self._cond.wait()
+            if self._free:
+                return self._free.pop()
+            self._created += 1
+        return bytearray(self.buffer_size)
+
+    def release(self, buffer):
+        """Return a buffer to the pool."""
+        with self._cond:
+            self._free.append(buffer)
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "buffer_size": self.buffer_size,
+                "allocated": self._created,
+                "free": len(self._free),
+                "max_buffers": self.max_buffers,
+            }
+
+
+def readinto_full(file_obj, view):
+    """Fill ``view`` from ``file_obj`` and return the bytes read (short only at EOF)."""
+    filled = 0
+    while filled < len(view):
+        read = file_obj.readinto(view[filled:])
+        if not read:
+            break
+        filled += read
+    return filled
+
+
+class PartWriter:
+    """Copy written chunks into pooled buffers and submit each full part."""
+
+    def __init__(self, upload, pool):
+        self.upload = upload
+        self.pool = pool
+        self.part_number = 1
+        self.size = 0
+        self._buffer = None
+        self._filled = 0
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            if self._buffer is None:
+                self._buffer = self.pool.acquire()
+                self._filled = 0
+            count = min(len(view), self.pool.buffer_size - self._filled)
+            self._buffer[self._filled : self._filled + count] = view[:count]
+            self._filled += count
+            self.size += count
+            view = view[count:]
+            if self._filled == self.pool.buffer_size:
+                self._submit()
+
+    def _submit(self):
+        buffer = self._buffer
+        self._buffer = None
+        self.upload.submit(
+            self.part_number,
+            memoryview(buffer)[: self._filled],
+            on_done=lambda _: self.pool.release(buffer),
+        )
+        self.part_number += 1
+
+    def close(self):
+        """Submit the last, possibly short, part."""
+        if self._buffer is None and self.part_number == 1:
+            self._buffer = self.pool.acquire()
+            self._filled = 0
+        if self._buffer is not None:
+            self._submit()
+
+    def discard(self):
+        """Give back the partly filled buffer without uploading it."""
+        if self._buffer is not None:
+            self.pool.release(self._buffer)
+            self._buffer = None
+
+
+_options = multipart_options()
+part_buffers = BufferPool(_options["part_size"], _options["max_buffers"])
@@ -0,0 +1,200 @@
+"""
+Content-defined chunking.
+Files are cut where a rolling gear hash of the last bytes matches a mask, so
+an insertion or deletion only changes the chunks around it and the rest of
+a modified file dedupes against what is already stored. The hash is
+computed with NumPy over whole blocks of bytes at a time.
+"""
+
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:  # Falls back to hashing one byte at a time
+    np = None
+
+DEFAULT_CDC = {
+    "min_size": 256 * 1024,
+    "avg_size": 1024 * 1024,
+    "max_size": 4 * 1024 * 1024,
+}
+
+MASK64 = (1 << 64) - 1
+BLOCK_SIZE = 64 * 1024  # Bytes hashed per NumPy pass, small enough to stay in cache
+
+# Every process, and any client that wants to chunk the same way, must use
+# this exact table; changing it moves every cut point
+GEAR = (
+    0xB9A64FDF073209EA, 0xB2B6A6E415570089, 0xB0F5672951897B75, 0xDE7DAB18F38DCA33,
+    0x0EC834C1DB166A0B, 0x83DC99F62C7DF1A1, 0xF63261E09640ECDE, 0x50AFDC2DCF6A7B67,
+    0x0437DD4FD851C7D3, 0xDA2F2F107AA89991, 0x1AE70E6E8917ABF0, 0x4DAD8947022D0A8D,
+    0xD5C133DCDA5A01C3, 0xD5854438A54F1FA7, 0x346BF04EA02915A3, 0xB5E8D59A1E97EBB7,
+    0x1D801F45D7A9F438, 0x9F7166638805BDDF, 0xCF861729D8F9A3D9, 0x58676F01611C30E7,
+    0x9289D915011EE5B2, 0x553CB6A7F116C69B, 0x805468F9ACD0E6FA, 0xE1F5E8AD98BED9AF,
+    0x4D026C9269E3672D, 0xC3157CE150308EB3, 0x8D3320E3E24AC840, 0x1F7239A7B141D64E,
+    0x9183855A2C5539FC, 0xB8DE19DC7D036A54, 0x228F48030F7E77B1, 0xC5CBB51D0661C606,
+    0x1D5A140AD6AA7344, 0x68E47070A5DBA498, 0x29998C5F0F8DDA04, 0xD8D407048319EB57,
+    0x006EA7C4199A3C00, 0x69C1833B436287D9, 0x71B631C29333DA07, 0xC3ADFC774B5DEAAD,
+    0xC72D580078ABD58B, 0x8E01A9F6221B84E1, 0xE63D04E8CDD6CC03, 0xDD999BB6811CC60C,
+    0x95D60490BBE9D8DA, 0xF6FAAB97D85BE4DD, 0x27B25888A4374521, 0xC91C045B8162D579,
+    0xDA175BC7522E9FA1, 0x42ADB0F4AD62CB5C, 0x578E1A50ABC104BC, 0xB2CA639E10D3417D,
+    0x5010550CFA6C756B, 0x93CA92E49A0BF0C7, 0xCEE6A1BE98336650, 0x3C28FBB63209730D,
+    0x0860B5E6AAFA9271, 0x6571CF5C366CD18B, 0xF7C5F1B97FC2D13C, 0x2A32649300BCFE30,
+    0x9E5718BBFEAFFFB8, 0xD44A14A5063FC0D6, 0x3D7FAF8086C19134, 0xF096A236BDE86EC6,
+    0xF2E36781B956114B, 0x49924B56868B0525, 0x7F9ED9B3437E8596, 0x99D6F9785280F277,
+    0x9D5C385DF618DEE2, 0x65BB7DDFC41798E0, 0x73A0C435A11ADA1C, 0xD77F338D954EC35E,
+    0xC8105BE9A3BF6212, 0x6AEB7A4EE2B8D0D0, 0x997366A64F63524F, 0xED24484D22D611AF,
+    0xAAB2ED4FB7D339B4, 0x6781E128054B75FE, 0x04C1807CE4BBEF9C, 0xE25F2A6EC879F177,
+    0x5FDC71F42A0CF13B, 0xC5FD942440ABC5D7, 0xD0D7B4D408C04F42, 0x15DB4B15E7CAC9E1,
+    0x5AD24BE1D5BA6913, 0x7EEA547B236EBFEA, 0x9EA21A2C5F448DAA, 0x0A156E85E044FE40,
+    0xD3D0BC70E38FE8AC, 0xA313EA917318D8D0, 0x26E56D09201DACE6, 0x46DB8FA23DBC929C,
+    0xC3E4F085099B44B3, 0x7308767061B639E4, 0xC54CF21FD1295ECA, 0x7BED891BB2114746,
+    0x168E7ACBBE88B6A1, 0xEFB2257547CCFABA, 0x970BBBD6540CCBFE, 0x4C6C8289116442F3,
+    0x7A77AF1EE655F74E, 0xA97BE30E67F5BD3C, 0xB547E1609A651AE9, 0x0B01CE9298142213,
+    0x7F41DDEEA5EEFC76, 0x2ABF23FCD4992335, 0x0014F0AFF87D8E11, 0xDAA03280659D5172,
+    0xE9293A31297B8C24, 0x0F0077D21797C79E, 0xA37BBF0B032AD8BE, 0xC6551CF6B60AD620,
+    0x8214CFDC0278AF30, 0x9E95A7857115377F, 0x5AEE8B4A9F09C09F, 0xC66B5167A4E89A12,
+    0xEA02EB65BD9C95B6, 0xF715D8FA3CDD1B10, 0xE310BDA9A6A1D9D6, 0x88728DC9D636FB4B,
+    0xC05A2F631484AF85, 0xDB7CFFEA49326DFD, 0xBB8C414A728ADA5A, 0x6DAFD38A9E48B582,
+    0x1B6E7662CFAB705C, 0x23BED913F2094D3E, 0xCDEB41E209101980, 0x2EBD81DE8860AD45,
+    0xF6C37A2E816064A0, 0xE4F2DDA091B56B93, 0x4D94153DDBAD39B2, 0xBCE3B71A00EFE503,
+    0xB3F6788D5100E97D, 0xF7C10F8F6866DEBE, 0x62640CEA30180421, 0x9A32DAACB58FF651,
+    0xE1AC6B0E35E98E69, 0x6321F90803A47C1A, 0x1AE220EFED4A22FB, 0xD0CBE6093A11B7AC,
+    0x604FB7BD447F40A0, 0xF6FD02B11D7E883F, 0x346792F4389CD76A, 0x3002A5344A3BA69D,
+    0x54A73DB9A19DF689, 0x25AAFF7FACF87C10, 0x7CF726735837C336, 0x2DEBD16A3B06F3E0,
+    0x27AA802CDBA076B1, 0x13B1FF05D1F60612, 0x4AB1395D838DCA68, 0x134FACA365444AFC,
+    0xAF3BE1B348A3163E, 0x7965BFD1FD44F46E, 0xC224B4534CE8F790, 0xB85B43AA08B08D9D,
+    0xBDBC0276D9F7D262, 0x9DD8430632F39B5D, 0x0D9C0610D99A0CA1, 0x8F8D504A3DA9D19F,
+    0x1B9838524CC6D7AE, 0xFAFD3332B3E004E7, 0xA5A1E380E6BFF1A1, 0xF58053119F5B3CE1,
+    0x32DDCCD1CDF6E052, 0x460D12364428CD4E, 0xBC4B054D6F605B2B, 0x18479BFB156CE48D,
+    0x1296A60CD118E2B1, 0xCCAC740AABEC0BF5, 0x188D5389E70367BF, 0xEF77D2DC1704896B,
+    0x8E121DEF6C097019, 0x8E56F23C1DD899F7, 0xDD51D82C4F534537, 0xF4389DF536CC5264,
+    0x933CD89DFF3C0251, 0xD63EBE81DFBF8095, 0x18EB76BB07D4CCCF, 0xDDD8AB8E59BB97C9,
+    0x9D849714B56B9DA5, 0x6416A40A23EED5FC, 0x1FF95DC3652D5067, 0xD81AB08C2AD161AA,
+    0x4F24E2F6DD69CBF2, 0xB97387741E54D865, 0x7A136ABD37520F90, 0x2D22E6664C340F6B,
+    0x3DDF8CE04D0BE966, 0x1C3832B8193BFBB3, 0x45E1A68B113D4FEB, 0xDDA9D67D27024752,
+    0x45AE28709D531951, 0xFFDDCCE0A339B2C7, 0x376539C8B5DDB7C4, 0x23D6D343C9E7E07A,
+    0xA34BA69403348AC2, 0xFB09CF2B6F9F5EA8, 0x76C1699C9CC88A90, 0xC64C37179D652B62,
+    0x40AA4D581BE2EC7B, 0x426B5FFB87804E43, 0x539400C7B15B2D75, 0x7B731C3BD275DFB2,
+    0x23DB10FA609048FC, 0xA874B05FDD8D16CC, 0x288D3280B540F0B0, 0xAB5EE4746DD85665,
+    0x6296EC7D0E947943, 0x6773C62DDF7CBEBF, 0x1503EC9F3B1B4770, 0x0B4556600C8BED55,
+    0x6C8BF9B7E344B7A3, 0x1BA80251DBF5FE5D, 0x4A9C30B1A65216A1, 0x778A4012E6B58C88,
+    0x6035CB8E2A1D84E4, 0x80D358890D912FE9, 0x8D621B031F3AE830, 0x11F085E71CB9B7F2,
+    0x6E6363D4B96D2477, 0x392A677D38A5833C, 0xA972A3782DB67575, 0xC3AD8FA4195B6133,
+    0x4C0DE3C3ED1B83C6, 0x0EFB51B6B3EDC41F, 0x6F9AE5F2AD455740, 0xA425FD69C995514D,
+    0x0491ECFFFCC13601, 0xE1D58B8DA497D602, 0x70ED1BFEAEC83772, 0xEC5E9CCBB639CE19,
+    0x0E810F14AE1CDA40, 0x827056458F6E9F49, 0x2629EA6D00FDC20F, 0xBCDD45B0E524ADD6,
+    0xFFF21B985D860B22, 0x1E7E0EF079DA9857, 0x85345A30616F49E2, 0x4A2FEEDE6CBDB68D,
+    0xC2BAF4FCDDD5AE5C, 0x65CF69EA73417578, 0xB0E087A5CCAED7A8, 0x555B19F8B3E9CA56,
+    0xADACC187BA45AAAE, 0xBF295E3814A1AD52, 0x84B5FCD1A09C7AE0, 0xD13A8A16E7E414FC,
+    0x671A15B44E3A81B7, 0xE7E065A5EDB05D02, 0xA11823C2F18C5DF3, 0xC3B18E028ADAFE58,
+    0xF25B174A65741069, 0x084A4CE12FBE343D, 0xFE6AE5126AC4464F, 0x20F8EFAF85BED9E2,
+)
+GEAR_ARRAY = np.array(GEAR, dtype=np.uint64) if np is not None else None
+
+
+def cdc_options():
+    """Chunking settings merged over the defaults."""
+    options = dict(DEFAULT_CDC)
+    options.update(getattr(settings, "CHUNK_STORE_CDC", {}))
+    return options
+
+
+def _high_bits_mask(bits):
+    """A mask over the top ``bits`` bits, which depend on the most bytes."""
+    return ((1 << bits) - 1) << (64 - bits)
+
+
+def _rolling_hashes(data, origin, start, stop):
+    """Gear hash after each byte of ``data[start:stop]``, started at ``origin``.
+
+    The hash after byte ``j`` is the sum of ``GEAR[data[j - k]] << k`` for
+    ``k`` below 64, as later shifts fall off the top. Doubling the window
+    six times builds that sum with six array operations.
+    """
+    lead = min(start - origin, 63)
+    hashes = GEAR_ARRAY[np.frombuffer(data, np.uint8, stop - start + lead, start - lead)]
+    shift = 1
+    while shift < 64:
+        hashes[shift:] += hashes[:-shift] << np.uint64(shift)
+        shift *= 2
+    return hashes[lead:]
+
+
+def _first_match(data, origin, start, stop, mask):
+    """Index after the first byte in ``[start, stop)`` whose hash clears ``mask``."""
+    mask = np.uint64(mask)
+    for block_start in range(start, stop, BLOCK_SIZE):
+        block_stop = min(block_start + BLOCK_SIZE, stop)
+        hits = np.flatnonzero(
+            (_rolling_hashes(data, origin, block_start, block_stop) & mask) == 0
+        )
+        if len(hits):
+            return block_start + int(hits[0]) + 1
+    return None
+
+
+def _cut_point_bytewise(data, min_size, normal, end, mask_strict, mask_loose):
+    gear = GEAR
+    h = 0
+    i = min_size
+    while i < normal:
+        h = ((h << 1) + gear[data[i]]) & MASK64
+        i += 1
+        if not h & mask_strict:
+            return i
+    while i < end:
+        h = ((h << 1) + gear[data[i]]) & MASK64
+        i += 1
+        if not h & mask_loose:
+            return i
+    return end
+
+
+def cut_point(data, min_size, avg_size, max_size):
+    """Return the length of the first chunk of ``data``.
+
+    Uses normalized chunking: a stricter mask before ``avg_size`` and a
+    looser one after it, which keeps chunk sizes close to the average.
+    """
+    length = len(data)
+    if length <= min_size:
+        return length
+    end = min(length, max_size)
+    normal = min(avg_size, end)
+
+    bits = avg_size.bit_length() - 1
+    mask_strict = _high_bits_mask(bits + 1)
+    mask_loose = _high_bits_mask(bits - 1)
+    if np is None:
+        return _cut_point_bytewise(data, min_size, normal, end, mask_strict, mask_loose)
+
+    cut = _first_match(data, min_size, min_size, normal, mask_strict)
+    if cut is None:
+        # The hash carries on across the switch to the looser mask
+        cut = _first_match(data, min_size, normal, end, mask_loose)
+    return end if cut is None else cut
+
+
+def iter_chunks(file_obj, options=None):
+    """Yield the content-defined chunks of a file as bytes."""
+    options = options or cdc_options()
+    min_size, avg_size, max_size = (
+        options["min_size"],
+        options["avg_size"],
+        options["max_size"],
+    )
+    buffer = bytearray()
+    eof = False
+    while True:
+        while not eof and len(buffer) < max_size:
+            data = file_obj.read(max_size)
+            if not data:
+                eof = True
+            else:
+                buffer += data
+        if not buffer:
+            return
+        cut = cut_point(buffer, min_size, avg_size, max_size)
+        yield bytes(buffer[:cut])
+        del buffer[:cut]
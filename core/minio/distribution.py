@@ -0,0 +1,103 @@
+"""
+Object distribution across nodes.
+Each node is asked about a page's objects by name with ``stat_object``, all
+nodes at once, so the cost of a page depends only on the page and not on
+how many other objects (files, chunks, shards) the bucket holds.
+"""
+
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.cache import cache
+from minio.error import S3Error
+
+from core import tracing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DISTRIBUTION = {
+    "deadline": 5.0,  # Seconds to wait for every node's answers
+    "cache_ttl": 15,  # Seconds a node's answers for a page are reused
+}
+
+AVAILABLE = "Available"
+MISSING = "Missing"
+MISMATCH = "ETag mismatch"
+UNREACHABLE = "Unreachable"
+
+
+def distribution_options():
+    """Distribution settings merged over the defaults."""
+    options = dict(DEFAULT_DISTRIBUTION)
+    options.update(getattr(settings, "MINIO_DISTRIBUTION", {}))
+    return options
+
+
+def stat_objects(node, names):
+    """Return ``{name: etag}`` for the ``names`` that exist on ``node``."""
+    found = {}
+    for name in names:
+        try:
+            stat = node.client.stat_object(node.bucket_name, name)
+        except S3Error as e:
+            if e.code not in ("NoSuchKey", "NoSuchObject"):
+                raise
+            continue
+        found[name] = (stat.etag or "").strip('"')
+    return found
+
+
+def _cache_key(node, names):
+    digest = hashlib.sha1("\n".join(names).encode()).hexdigest()
+    return f"distribution:{node.endpoint}:{digest}"
+
+
+def object_distribution(objects, nodes):
+    """Status of each object on each node.
+
+    ``objects`` are ``(name, etag)`` pairs. Returns ``{name: [status, ...]}``
+    with one status per node, in node order.
+    """
+    options = distribution_options()
+    names = sorted({name for name, _ in objects})
+    found = {}
+    futures = {}
+
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, len(nodes)), thread_name_prefix="minio-stat"
+    )
+    try:
+        for node in nodes:
+            cached = cache.get(_cache_key(node, names))
+            if cached is not None:
+                found[node.endpoint] = cached
+            elif node.breaker.allow_request():
+                futures[executor.submit(tracing.bind(stat_objects), node, names)] = node
+
+        done, _ = wait(futures, timeout=options["deadline"])
+        for future, node in futures.items():
+            if future in done and not future.exception():
+                found[node.endpoint] = future.result()
+                cache.set(_cache_key(node, names), found[node.endpoint], options["cache_ttl"])
+            elif future in done:
+                logger.warning(f"Could not stat objects on {node.endpoint}: {future.exception()}")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    distribution = {}
+    for name, etag in objects:
+        statuses = []
+        for node in nodes:
+            etags = found.get(node.endpoint)
+            if etags is None:
+                statuses.append(UNREACHABLE)
+            elif name not in etags:
+                statuses.append(MISSING)
+            elif etag and etags[name] != etag.strip('"'):
+                statuses.append(MISMATCH)
+            else:
+                statuses.append(AVAILABLE)
+        distribution[name] = statuses
+    return distribution
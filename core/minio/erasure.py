@@ -0,0 +1,392 @@
+"""
+Reed-Solomon erasure coding.
+A file is cut into blocks of ``data_shards * block_size`` bytes; each block
+is split into ``data_shards`` pieces and ``parity_shards`` more are computed
+over GF(256). Piece ``i`` of every block is appended to shard ``i``, and
+each shard is stored on a different node. Any ``data_shards`` of the shards
+rebuild the file. The arithmetic is vectorized with NumPy over whole blocks.
+"""
+
+import hashlib
+import logging
+import math
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from core import tracing
+
+try:
+    import numpy as np
+except ImportError:  # Only needed for erasure-coded storage
+    np = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ERASURE = {
+    "enabled": False,  # Erasure-code API uploads without ?erasure=1
+    "data_shards": 2,
+    "parity_shards": 1,
+    "block_size": 1024 * 1024,  # Bytes of each shard per block
+    "queue_depth": 4,  # Blocks buffered ahead of each shard upload
+    "part_size": 16 * 1024 * 1024,
+}
+
+# GF(2^8) with the polynomial x^8 + x^4 + x^3 + x^2 + 1
+GF_EXP = [0] * 512
+GF_LOG = [0] * 256
+_x = 1
+for _i in range(255):
+    GF_EXP[_i] = _x
+    GF_LOG[_x] = _i
+    _x <<= 1
+    if _x & 0x100:
+        _x ^= 0x11D
+for _i in range(255, 512):
+    GF_EXP[_i] = GF_EXP[_i - 255]
+del _x, _i
+
+_mul_table = None
+
+
+class NotEnoughNodes(Exception):
+    """Fewer nodes are available than storing or reading a file needs."""
+
+
+def erasure_options():
+    """Erasure coding settings merged over the defaults."""
+    options = dict(DEFAULT_ERASURE)
+    options.update(getattr(settings, "MINIO_ERASURE", {}))
+    return options
+
+
+def gf_mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return GF_EXP[GF_LOG[a] + GF_LOG[b]]
+
+
+def gf_inv(a):
+    if a == 0:
+        raise ZeroDivisionError("0 has no inverse in GF(256)")
+    return GF_EXP[255 - GF_LOG[a]]
+
+
+def mul_table():
+    """``table[c][x]`` is ``c * x``, so ``table[c][shard]`` multiplies a whole shard."""
+    global _mul_table
+    if np is None:
+        raise ImportError("Erasure-coded storage requires NumPy.")
+    if _mul_table is None:
+        log = np.array(GF_LOG, dtype=np.int32)
+        exp = np.array(GF_EXP, dtype=np.uint8)
+        table = exp[log[:, None] + log[None, :]]
+        table[0, :] = 0
+        table[:, 0] = 0
+        _mul_table = table
+    return _mul_table
+
+
+def coding_matrix(data_shards, parity_shards):
+    """Rows of the systematic generator matrix: identity, then Cauchy rows.
+
+    Every square submatrix of a Cauchy matrix is invertible, so any
+    ``data_shards`` rows of the whole matrix are.
+    """
+    if data_shards + parity_shards > 256:
+        raise ValueError("At most 256 shards are supported.")
+    rows = [[int(i == j) for j in range(data_shards)] for i in range(data_shards)]
+    for i in range(parity_shards):
+        x = data_shards + i
+        rows.append([gf_inv(x ^ j) for j in range(data_shards)])
+    return rows
+
+
+def invert_matrix(matrix):
+    """Invert a square matrix over GF(256) by Gauss-Jordan elimination."""
+    size = len(matrix)
+    rows = [list(row) + [int(i == j) for j in range(size)] for i, row in enumerate(matrix)]
+    for col in range(size):
+        pivot = next((r for r in range(col, size) if rows[r][col]), None)
+        if pivot is None:
+            raise ValueError("Shard matrix is singular.")
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        scale = gf_inv(rows[col][col])
+        rows[col] = [gf_mul(scale, value) for value in rows[col]]
+        for r in range(size):
+            factor = rows[r][col]
+            if r != col and factor:
+                rows[r] = [a ^ gf_mul(factor, b) for a, b in zip(rows[r], rows[col])]
+    return [row[size:] for row in rows]
+
+
+def _combine(coefficients, pieces):
+    """XOR-sum of ``coefficient * piece`` over GF(256), for one output row."""
+    table = mul_table()
+    out = np.zeros(pieces.shape[1], dtype=np.uint8)
+    for coefficient, piece in zip(coefficients, pieces):
+        if coefficient == 1:
+            out ^= piece
+        elif coefficient:
+            out ^= table[coefficient][piece]
+    return out
+
+
+def encode_block(block, data_shards, parity_shards, block_size, matrix=None):
+    """Split one block into ``data_shards + parity_shards`` pieces of ``block_size``.
+
+    A short final block is padded with zeros.
+    """
+    matrix = matrix or coding_matrix(data_shards, parity_shards)
+    data = np.zeros(data_shards * block_size, dtype=np.uint8)
+    data[: len(block)] = np.frombuffer(block, dtype=np.uint8)
+    data = data.reshape(data_shards, block_size)
+    parity = [_combine(row, data) for row in matrix[data_shards:]]
+    return [piece.tobytes() for piece in data] + [piece.tobytes() for piece in parity]
+
+
+def decode_block(pieces, inverse=None):
+    """Rebuild a block's data from pieces of ``data_shards`` distinct shards.
+
+    ``inverse`` is the inverted generator submatrix for the shards the
+    pieces came from, or None when they are the data shards in order.
+    """
+    if inverse is None:
+        return b"".join(pieces)
+    stacked = np.stack([np.frombuffer(piece, dtype=np.uint8) for piece in pieces])
+    return b"".join(_combine(row, stacked).tobytes() for row in inverse)
+
+
+def shard_layout(size, data_shards, block_size):
+    """``(block_size, shard_size)`` for a file, shrinking blocks for small files."""
+    block_size = max(1, min(block_size, math.ceil(size / data_shards)))
+    blocks = math.ceil(size / (data_shards * block_size))
+    return block_size, blocks * block_size
+
+
+class _ShardPipe:
+    """Bounded pipe from the encoder to one shard's ``put_object`` call."""
+
+    def __init__(self, depth):
+        self.queue = queue.Queue(depth)
+        self.buffer = bytearray()
+        self.eof = False
+
+    def write(self, data, upload):
+        """Hand a piece to the shard upload, failing if the upload has died."""
+        while True:
+            try:
+                self.queue.put(data, timeout=1)
+                return
+            except queue.Full:
+                if upload.done():
+                    raise upload.exception() or Exception("Shard upload stopped early.")
+
+    def read(self, size=-1):
+        while not self.eof and (size < 0 or len(self.buffer) < size):
+            item = self.queue.get()
+            if item is None:
+                self.eof = True
+            else:
+                self.buffer += item
+        if size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+
+class ShardWriter:
+    """Encode a file and upload all its shards at once, one per node.
+
+    Blocks are encoded as they are read and queued to a ``put_object`` per
+    shard, so memory stays at a few blocks per shard whatever the file size.
+    """
+
+    def __init__(self, nodes, object_names, options=None):
+        self.options = options or erasure_options()
+        self.nodes = nodes
+        self.object_names = object_names
+        self.data_shards = self.options["data_shards"]
+        self.parity_shards = self.options["parity_shards"]
+        if len(nodes) < self.data_shards + self.parity_shards:
+            raise NotEnoughNodes(
+                f"Erasure coding needs {self.data_shards + self.parity_shards} active nodes."
+            )
+
+    def _put(self, node, object_name, pipe, shard_size):
+        return node.client.put_object(
+            node.bucket_name,
+            object_name,
+            pipe,
+            shard_size,
+            part_size=self.options["part_size"],
+        )
+
+    def write(self, file_obj, size):
+        """Store ``size`` bytes of ``file_obj`` as shards.
+
+        Returns ``(shards, block_size, md5, sha256)`` where ``shards`` holds
+        ``{index, endpoint, object_name, size, etag}`` per shard.
+        """
+        total = self.data_shards + self.parity_shards
+        block_size, shard_size = shard_layout(size, self.data_shards, self.options["block_size"])
+        matrix = coding_matrix(self.data_shards, self.parity_shards)
+        pipes = [_ShardPipe(self.options["queue_depth"]) for _ in range(total)]
+        shard_md5s = [hashlib.md5() for _ in range(total)]
+        md5, sha256 = hashlib.md5(), hashlib.sha256()
+
+        executor = ThreadPoolExecutor(max_workers=total, thread_name_prefix="minio-shard")
+        uploads = [
+            executor.submit(tracing.bind(self._put), node, name, pipe, shard_size)
+            for node, name, pipe in zip(self.nodes, self.object_names, pipes)
+        ]
+        try:
+            remaining = size
+            while remaining > 0:
+                block = file_obj.read(min(self.data_shards * block_size, remaining))
+                if not block:
+                    raise ValueError("File ended before its declared size.")
+                remaining -= len(block)
+                md5.update(block)
+                sha256.update(block)
+                pieces = encode_block(
+                    block, self.data_shards, self.parity_shards, block_size, matrix
+                )
+                for pipe, upload, shard_md5, piece in zip(pipes, uploads, shard_md5s, pieces):
+                    shard_md5.update(piece)
+                    pipe.write(piece, upload)
+            for pipe, upload in zip(pipes, uploads):
+                pipe.write(None, upload)
+            results = [upload.result() for upload in uploads]
+        except Exception:
+            for pipe in pipes:
+                # Unblock uploads still waiting for data; they fail on the short read
+                pipe.eof = True
+                try:
+                    pipe.queue.put_nowait(None)
+                except queue.Full:
+                    pass
+            self.remove_all()
+            raise
+        finally:
+            executor.shutdown(wait=False)
+
+        shards = []
+        for index, (node, name, result, shard_md5) in enumerate(
+            zip(self.nodes, self.object_names, results, shard_md5s)
+        ):
+            etag = result.etag.strip('"')
+            if "-" not in etag and etag != shard_md5.hexdigest():
+                self.remove_all()
+                raise ValueError("Integrity check failed! Please try again.")
+            shards.append({
+                "index": index,
+                "endpoint": node.endpoint,
+                "object_name": name,
+                "size": shard_size,
+                "etag": etag,
+            })
+        return shards, block_size, md5.hexdigest(), sha256.hexdigest()
+
+    def remove_all(self):
+        """Remove every shard written so far."""
+        for node, name in zip(self.nodes, self.object_names):
+            try:
+                node.client.remove_object(node.bucket_name, name)
+            except Exception as e:
+                logger.warning(f"Could not remove shard {name} from {node.endpoint}: {e}")
+
+
+def _read_exactly(response, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = response.read(size - len(data))
+        if not chunk:
+            raise IOError("Shard ended early.")
+        data += chunk
+    return bytes(data)
+
+
+class ShardReader:
+    """Stream a byte range of an erasure-coded file.
+
+    ``shards`` are ``(index, node, object_name)`` in order of preference:
+    data shards on healthy nodes first, so parity is only read, and blocks
+    decoded, when a data shard cannot be opened.
+    """
+
+    def __init__(self, shards, data_shards, parity_shards, block_size, size, offset=0, length=0):
+        self.shards = shards
+        self.data_shards = data_shards
+        self.parity_shards = parity_shards
+        self.block_size = block_size
+        self.size = size
+        self.offset = offset
+        self.end = offset + length if length else size
+        self.responses = []
+        self._iterator = self._read()
+
+    def _open(self, first_block, blocks):
+        """Open ``data_shards`` shards at ``first_block``, skipping ones that fail."""
+        opened = []
+        for index, node, object_name in self.shards:
+            if len(opened) == self.data_shards:
+                break
+            try:
+                response = node.client.get_object(
+                    node.bucket_name,
+                    object_name,
+                    offset=first_block * self.block_size,
+                    length=blocks * self.block_size,
+                )
+            except Exception as e:
+                logger.warning(f"Shard {object_name} unavailable on {node.endpoint}: {e}")
+                continue
+            opened.append((index, response))
+            self.responses.append(response)
+        if len(opened) < self.data_shards:
+            raise NotEnoughNodes(
+                f"Only {len(opened)} of the {self.data_shards} shards needed could be read."
+            )
+        return sorted(opened, key=lambda item: item[0])
+
+    def _read(self):
+        if self.end <= self.offset:
+            return
+        stride = self.data_shards * self.block_size
+        first_block = self.offset // stride
+        last_block = (self.end - 1) // stride
+        opened = self._open(first_block, last_block - first_block + 1)
+        indices = [index for index, _ in opened]
+        inverse = None
+        if indices != list(range(self.data_shards)):
+            matrix = coding_matrix(self.data_shards, self.parity_shards)
+            inverse = invert_matrix([matrix[i] for i in indices])
+
+        position = first_block * stride
+        try:
+            for _ in range(first_block, last_block + 1):
+                pieces = [_read_exactly(response, self.block_size) for _, response in opened]
+                block = decode_block(pieces, inverse)
+                start = max(self.offset - position, 0)
+                stop = min(self.end - position, len(block))
+                yield block[start:stop]
+                position += stride
+        finally:
+            self.close_responses()
+
+    def close_responses(self):
+        for response in self.responses:
+            response.close()
+            response.release_conn()
+        self.responses = []
+
+    def __iter__(self):
+        return self._iterator
+
+    def close(self):
+        """Close the shard responses still open."""
+        self._iterator.close()
+        self.close_responses()
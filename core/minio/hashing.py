@@ -0,0 +1,39 @@
+"""
+Streaming checksums for uploads.
+HashingReader computes digests while the bytes are read by the MinIO
+client, so a file never has to be read twice to be hashed and stored.
+"""
+
+import hashlib
+
+
+class HashingReader:
+    """File-like wrapper that updates one or more digests on every read."""
+
+    def __init__(self, file_obj, algorithms=("md5",)):
+        self._file = file_obj
+        self.hashers = {name: hashlib.new(name) for name in algorithms}
+        self.bytes_read = 0
+
+    def _update(self, data):
+        for hasher in self.hashers.values():
+            hasher.update(data)
+        self.bytes_read += len(data)
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+        self._update(data)
+        return data
+
+    def readinto(self, buffer):
+        read = self._file.readinto(buffer)
+        if read:
+            self._update(memoryview(buffer)[:read])
+        return read
+
+    def hexdigest(self, algorithm="md5"):
+        return self.hashers[algorithm].hexdigest()
+
+    def hexdigests(self):
+        """Return every digest as ``{algorithm: hexdigest}``."""
+        return {name: hasher.hexdigest() for name, hasher in self.hashers.items()}
@@ -0,0 +1,214 @@
+"""
+Background health monitoring for MinIO nodes.
+Nodes are probed in parallel on their own schedule and the healthy set is
+cached, so request paths select nodes without any network round trip.
+Results are shared through the host's scoreboard, so a node another worker
+has just probed is not probed again.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Per-node circuit breaker with closed, open and half-open states."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=2, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current_state(self):
+        """Return the state, moving an expired open breaker to half-open."""
+        if (
+            self._state == self.OPEN
+            and time.monotonic() - self._opened_at >= self.reset_timeout
+        ):
+            self._state = self.HALF_OPEN
+        return self._state
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def allow_request(self):
+        """Return True if the node may be tried (closed or half-open)."""
+        return self.state != self.OPEN
+
+    def record_success(self):
+        """Close the breaker. Returns True if the state changed."""
+        with self._lock:
+            previous = self._current_state()
+            self._state = self.CLOSED
+            self._failures = 0
+            return previous != self.CLOSED
+
+    def record_failure(self):
+        """Count a failure and open the breaker when needed. Returns True if the state changed."""
+        with self._lock:
+            previous = self._current_state()
+            self._failures += 1
+            if (
+                previous == self.HALF_OPEN
+                or self._failures >= self.failure_threshold
+            ):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            return previous != self._state
+
+
+class HealthMonitor:
+    """Probe nodes in the background and publish the cached healthy set."""
+
+    def __init__(self, nodes, interval=10, timeout=3):
+        self.nodes = nodes
+        self.interval = interval
+        self.timeout = timeout
+        self.last_checked = None
+        self._healthy = ()
+        self._pending = {}
+        self._lock = threading.Lock()
+        # One probe round at a time, whether from the thread or a command
+        self._probe_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._executor = None
+
+    @property
+    def healthy_nodes(self):
+        """Nodes whose circuit breaker is closed as of the last probe round."""
+        return self._healthy
+
+    def start(self):
+        """Start the monitor thread for this process if it is not running."""
+        with self._lock:
+            pid = os.getpid()
+            if self._pid == pid and self._thread and self._thread.is_alive():
+                return
+            # Threads do not survive a fork, so each worker runs its own monitor
+            self._pid = pid
+            self._pending = {}
+            # A lock held by a parent thread at fork time would never be released
+            self._probe_lock = threading.Lock()
+            self._ready.clear()
+            self._stop.clear()
+            self._executor = ThreadPoolExecutor(
+                max_workers=max(1, len(self.nodes)),
+                thread_name_prefix="minio-health",
+            )
+            self._thread = threading.Thread(
+                target=self._run, name="minio-health-monitor", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Stop the monitor thread."""
+        self._stop.set()
+
+    def wait_ready(self):
+        """Wait for the first probe round of a started monitor to finish."""
+        if self._thread is not None and not self._ready.is_set():
+            self._ready.wait(self.timeout + 1)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.probe_all()
+            except Exception:
+                logger.exception("Node health check round failed")
+            self._ready.set()
+            self._stop.wait(self.interval)
+
+    def _shared_result(self, node):
+        """A probe result another worker published within half an interval, or None."""
+        shared = getattr(node.score, "shared", None)
+        view = shared.read() if shared is not None else None
+        if (
+            view is None
+            or view["healthy"] is None
+            or view["checked_by"] == os.getpid()
+            or time.time() - view["checked_at"] >= self.interval / 2
+        ):
+            return None
+        return view["healthy"]
+
+    def probe_all(self):
+        """Probe every node in parallel and refresh the healthy set."""
+        if self._executor is None or self._pid != os.getpid():
+            self.start()
+            self._ready.wait(self.timeout + 1)
+            return self._healthy
+
+        with self._probe_lock:
+            return self._probe_round()
+
+    def _probe_round(self):
+        """Run one probe round; callers hold ``_probe_lock``."""
+        probes, adopted = {}, {}
+        for node in self.nodes:
+            shared = self._shared_result(node)
+            if shared is not None:
+                # Another worker on this host probed the node moments ago
+                adopted[node] = shared
+                continue
+            pending = self._pending.get(node.endpoint)
+            if pending is not None and not pending.done():
+                # A probe from an earlier round is still hanging; count it as failed
+                probes[pending] = node
+                continue
+            if node.breaker.allow_request():
+                future = self._executor.submit(node.check_health)
+                self._pending[node.endpoint] = future
+                probes[future] = node
+
+        done, _ = wait(probes, timeout=self.timeout)
+        results = [
+            (node, future in done and not future.exception() and future.result())
+            for future, node in probes.items()
+        ]
+        for node, healthy in results:
+            metrics.registry.inc(
+                "filenest_health_probes_total", (node.endpoint, "up" if healthy else "down")
+            )
+            shared = getattr(node.score, "shared", None)
+            if shared is not None:
+                shared.set_health(healthy)
+        for node, healthy in results + list(adopted.items()):
+            if healthy:
+                changed = node.breaker.record_success()
+            else:
+                changed = node.breaker.record_failure()
+            if changed:
+                node.health_changed_at = time.time()
+                logger.warning(
+                    f"Node {node.endpoint} circuit breaker is now {node.breaker.state}"
+                )
+
+        healthy = []
+        for node in self.nodes:
+            if node.breaker.state == CircuitBreaker.CLOSED:
+                healthy.append(node)
+        self._healthy = tuple(healthy)
+        self.last_checked = time.time()
+
+        logger.info(
+            f"Node health check: {len(healthy)}/{len(self.nodes)} nodes active"
+        )
+        return self._healthy
@@ -0,0 +1,369 @@
+"""
+Storage metrics in the Prometheus text format.
+Counters and histograms are kept in lock stripes: each thread updates the
+stripe it was assigned, so concurrent requests rarely wait on one another,
+and a scrape merges the stripes. Each worker process also writes its totals
+to its own file in a shared directory, so ``/metrics`` on any worker
+reports the whole host. A scrape folds the files of workers that have
+exited into one archive file, keeping their totals without keeping a file
+per worker ever started.
+"""
+
+import bisect
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .scoreboard import pid_alive
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; dead workers' files are kept
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METRICS = {
+    "enabled": True,
+    "dir": None,  # Per-worker files; defaults to filenest-metrics-<project hash> in the temp dir
+    "flush_interval": 5,  # Seconds between writes of a worker's totals to its file
+    "stripes": 16,  # Lock stripes per process
+    "token": None,  # Bearer token for scrapers; staff users can always read /metrics
+}
+
+ARCHIVE = "archive.json"  # Totals of workers that have exited
+_WORKER_FILE = re.compile(r"(\d+)-(\d+)\.json(\.tmp)?")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# name: (type, help, label names)
+METRICS = {
+    "filenest_minio_request_duration_seconds": (
+        "histogram", "Duration of MinIO operations.", ("node", "op"),
+    ),
+    "filenest_minio_bytes_total": (
+        "counter", "Bytes sent to or read from MinIO.", ("node", "op"),
+    ),
+    "filenest_minio_multipart_parts_total": (
+        "counter", "Multipart upload part attempts.", ("node", "result"),
+    ),
+    "filenest_minio_errors_total": (
+        "counter", "Failed MinIO operations by exception type.", ("node", "op", "type"),
+    ),
+    "filenest_health_probes_total": (
+        "counter", "Node health probes by result.", ("node", "result"),
+    ),
+}
+
+
+def metrics_options():
+    """Metrics settings merged over the defaults."""
+    options = dict(DEFAULT_METRICS)
+    options.update(getattr(settings, "MINIO_METRICS", {}))
+    if not options["dir"]:
+        project = hashlib.blake2b(str(settings.BASE_DIR).encode(), digest_size=4).hexdigest()
+        options["dir"] = os.path.join(tempfile.gettempdir(), f"filenest-metrics-{project}")
+    return options
+
+
+class _Stripe:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+
+class MetricsRegistry:
+    """Process-local metric values, striped by thread."""
+
+    def __init__(self, options=None):
+        self.options = options or metrics_options()
+        self._stripes = [_Stripe() for _ in range(self.options["stripes"])]
+        self._next_stripe = itertools.count()
+        self._local = threading.local()
+        self._flusher_pid = None
+        self._flusher_lock = threading.Lock()
+        self._scrape_lock = threading.Lock()
+        self._file = None
+
+    def _stripe(self):
+        stripe = getattr(self._local, "stripe", None)
+        if stripe is None:
+            stripe = self._local.stripe = self._stripes[
+                next(self._next_stripe) % len(self._stripes)
+            ]
+        return stripe
+
+    def inc(self, name, labels, amount=1):
+        """Add ``amount`` to a counter; ``labels`` follow the metric's label names."""
+        if not self.options["enabled"]:
+            return
+        self._ensure_flusher()
+        stripe = self._stripe()
+        key = (name, tuple(labels))
+        with stripe.lock:
+            stripe.counters[key] = stripe.counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        """Record ``value`` in a histogram."""
+        if not self.options["enabled"]:
+            return
+        self._ensure_flusher()
+        stripe = self._stripe()
+        key = (name, tuple(labels))
+        index = bisect.bisect_left(LATENCY_BUCKETS, value)
+        with stripe.lock:
+            buckets = stripe.histograms.get(key)
+            if buckets is None:
+                # One count per bucket plus +Inf, then the sum of observations
+                buckets = stripe.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+            buckets[index] += 1
+            buckets[-1] += value
+
+    def collect(self):
+        """This process's values as ``(counters, histograms)`` dicts."""
+        counters, histograms = {}, {}
+        for stripe in self._stripes:
+            with stripe.lock:
+                for key, value in stripe.counters.items():
+                    counters[key] = counters.get(key, 0) + value
+                for key, buckets in stripe.histograms.items():
+                    _add_buckets(histograms, key, buckets)
+        return counters, histograms
+
+    # Cross-worker aggregation
+
+    def _ensure_flusher(self):
+        """Start this process's flusher thread, again after a fork."""
+        if self._flusher_pid == os.getpid():
+            return
+        with self._flusher_lock:
+            if self._flusher_pid == os.getpid():
+                return
+            if self._flusher_pid is not None:
+                # Forked: the parent's values are already in the parent's file
+                self._stripes = [_Stripe() for _ in range(self.options["stripes"])]
+                self._local = threading.local()
+            self._flusher_pid = os.getpid()
+            try:
+                os.makedirs(self.options["dir"], exist_ok=True)
+            except OSError as e:
+                logger.warning(f"Metrics are per worker, {self.options['dir']} unusable: {e}")
+                return
+            # Start time in the name, so a reused pid never overwrites a dead worker's totals
+            self._file = os.path.join(
+                self.options["dir"], f"{os.getpid()}-{int(time.time() * 1000)}.json"
+            )
+            threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._flusher_pid == pid:
+            time.sleep(self.options["flush_interval"])
+            try:
+                self.flush()
+            except OSError:
+                logger.exception("Could not write metrics")
+
+    def flush(self):
+        """Write this process's totals to its file in the metrics directory."""
+        if self._file is None:
+            return
+        counters, histograms = self.collect()
+        _dump(self._file, counters, histograms)
+
+    def collect_host(self):
+        """Totals of every worker on the host, with this process's live values."""
+        counters, histograms = self.collect()
+        directory = self.options["dir"]
+        with self._directory_lock(directory):
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                names = []
+            own = os.path.basename(self._file) if self._file else None
+            dead = self._dead_files(names, own)
+            if dead and fcntl is not None:
+                self._archive(directory, dead)
+                names = os.listdir(directory)
+            for file_name in names:
+                if not file_name.endswith(".json") or file_name == own:
+                    continue
+                _merge(counters, histograms, _load(os.path.join(directory, file_name)))
+        return counters, histograms
+
+    @contextmanager
+    def _directory_lock(self, directory):
+        """Keep other scrapes out while dead workers' files are archived."""
+        with self._scrape_lock:
+            try:
+                fd = os.open(os.path.join(directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+            except OSError:
+                fd = None
+            if fd is None or fcntl is None:
+                yield
+                return
+            try:
+                fcntl.lockf(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    @staticmethod
+    def _dead_files(names, own):
+        """Files of workers that have exited, including a pid's earlier workers."""
+        workers = []
+        started_last = {}
+        for file_name in names:
+            match = _WORKER_FILE.fullmatch(file_name)
+            if match:
+                pid, started = int(match.group(1)), int(match.group(2))
+                workers.append((file_name, pid, started))
+                started_last[pid] = max(started, started_last.get(pid, 0))
+        return [
+            file_name
+            for file_name, pid, started in workers
+            if file_name != own and (started < started_last[pid] or not pid_alive(pid))
+        ]
+
+    @staticmethod
+    def _archive(directory, dead):
+        """Add the totals in ``dead`` to the archive file, then delete them."""
+        path = os.path.join(directory, ARCHIVE)
+        counters, histograms = {}, {}
+        _merge(counters, histograms, _load(path))
+        for file_name in dead:
+            if file_name.endswith(".json"):
+                _merge(counters, histograms, _load(os.path.join(directory, file_name)))
+        try:
+            _dump(path, counters, histograms)
+            for file_name in dead:
+                os.remove(os.path.join(directory, file_name))
+        except OSError as e:
+            logger.warning(f"Could not archive metrics of exited workers: {e}")
+
+
+def _load(path):
+    """A metrics file's contents, or None if it cannot be read."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None  # Being replaced, or written by an unrelated process
+
+
+def _merge(counters, histograms, data):
+    """Add the totals of a loaded metrics file."""
+    if not data:
+        return
+    for name, labels, value in data.get("counters", []):
+        key = (name, tuple(labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, buckets in data.get("histograms", []):
+        _add_buckets(histograms, (name, tuple(labels)), buckets)
+
+
+def _dump(path, counters, histograms):
+    """Write totals to ``path``, replacing it whole."""
+    data = {
+        "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+        "histograms": [
+            [name, list(labels), buckets] for (name, labels), buckets in histograms.items()
+        ],
+    }
+    temp = f"{path}.tmp"
+    with open(temp, "w") as f:
+        json.dump(data, f)
+    os.replace(temp, path)
+
+
+def _add_buckets(histograms, key, buckets):
+    total = histograms.get(key)
+    if total is None:
+        histograms[key] = list(buckets)
+    else:
+        for index, value in enumerate(buckets):
+            total[index] += value
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def render(counters, histograms, gauges=()):
+    """Prometheus text exposition of the collected values.
+
+    ``gauges`` are ``(name, help, {labels: value})`` computed at scrape time.
+    """
+    lines = []
+    for name, (kind, help_text, label_names) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(label_names, labels)} {value}")
+            continue
+        for (metric, labels), buckets in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+                cumulative += count
+                lines.append(
+                    f"{name}_bucket{_labels(label_names, labels, [('le', bound)])} {cumulative}"
+                )
+            lines.append(f"{name}_sum{_labels(label_names, labels)} {buckets[-1]}")
+            lines.append(f"{name}_count{_labels(label_names, labels)} {cumulative}")
+    for name, help_text, label_names, values in gauges:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in sorted(values.items()):
+            lines.append(f"{name}{_labels(label_names, labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def observe_request(node, op, elapsed, nbytes=0, error=None):
+    """Record one MinIO operation on the node at endpoint ``node``."""
+    registry.observe("filenest_minio_request_duration_seconds", (node, op), elapsed)
+    if nbytes:
+        registry.inc("filenest_minio_bytes_total", (node, op), nbytes)
+    if error is not None:
+        count_error(node, op, error)
+
+
+def count_error(node, op, error):
+    """Count a failed operation; ``error`` is an exception or a type name."""
+    type_name = error if isinstance(error, str) else type(error).__name__
+    registry.inc("filenest_minio_errors_total", (node or "", op, type_name))
+
+
+@contextmanager
+def timed(node, op):
+    """Time a block as one MinIO operation, counting the exception it raises."""
+    started = time.monotonic()
+    try:
+        yield
+    except Exception as e:
+        observe_request(node, op, time.monotonic() - started, error=e)
+        raise
+    observe_request(node, op, time.monotonic() - started)
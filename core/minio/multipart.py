@@ -0,0 +1,155 @@
+"""
+Concurrent multipart uploads.
+Parts are sent by a bounded worker pool while the caller keeps reading the
+source, then completed in part-number order with the usual ETag check.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from minio.api import Part
+
+from core import tracing
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MULTIPART = {
+    "part_size": 5 * 1024 * 1024,  # 5MB is the S3 minimum for all but the last part
+    "max_buffers": 32,  # Part buffers shared by all uploads in a process
+    "workers": 4,  # Threads uploading parts of a single file
+    "max_in_flight": 4,  # Parts read ahead and waiting or uploading
+    "part_retries": 3,  # Attempts per part before the upload is aborted
+    "retry_backoff": 0.5,  # Seconds, doubled after every failed attempt
+}
+
+
+def multipart_options():
+    """Multipart settings merged over the defaults."""
+    options = dict(DEFAULT_MULTIPART)
+    options.update(getattr(settings, "MINIO_MULTIPART", {}))
+    return options
+
+
+class MultipartUpload:
+    """Upload the parts of one MinIO multipart upload concurrently."""
+
+    def __init__(
+        self, client, bucket_name, object_name, upload_id, options=None, node_endpoint=None
+    ):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.object_name = object_name
+        self.upload_id = upload_id
+        self.node_endpoint = node_endpoint  # Node the object is written to
+        self.options = options or multipart_options()
+        self._slots = threading.BoundedSemaphore(self.options["max_in_flight"])
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.options["workers"],
+            thread_name_prefix="minio-part",
+        )
+        self._futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        self.close()
+        return False
+
+    def close(self):
+        """Release the part upload workers."""
+        self._executor.shutdown(wait=True)
+
+    def submit(self, part_number, data, on_done=None):
+        """Queue a part, blocking while max_in_flight parts are outstanding.
+
+        ``on_done(data)`` is called once the part no longer needs ``data``.
+        """
+        self._slots.acquire()
+        future = self._executor.submit(
+            tracing.bind(self._upload_part), part_number, data, on_done
+        )
+        future.add_done_callback(lambda _: self._slots.release())
+        if on_done:
+            # Parts cancelled by abort() never run, so hand their data back here
+            future.add_done_callback(lambda f: f.cancelled() and on_done(data))
+        self._futures.append(future)
+
+    def _upload_part(self, part_number, data, on_done):
+        """Upload a single part, retrying it on failure or ETag mismatch."""
+        try:
+            digest = hashlib.md5(data)
+            retries = self.options["part_retries"]
+            for attempt in range(1, retries + 1):
+                try:
+                    etag = self.client._upload_part(
+                        self.bucket_name,
+                        self.object_name,
+                        data,
+                        {},
+                        self.upload_id,
+                        part_number,
+                    )
+                    if etag.strip('"') != digest.hexdigest():
+                        raise ValueError(f"ETag mismatch for part {part_number}")
+                    metrics.registry.inc(
+                        "filenest_minio_multipart_parts_total", (self.node_endpoint or "", "ok")
+                    )
+                    logger.debug(
+                        f"Part {part_number} of {self.object_name} uploaded, size: {len(data)}"
+                    )
+                    return Part(part_number=part_number, etag=etag, size=len(data)), digest
+                except Exception as e:
+                    result = "failed" if attempt == retries else "retried"
+                    metrics.registry.inc(
+                        "filenest_minio_multipart_parts_total", (self.node_endpoint or "", result)
+                    )
+                    if attempt == retries:
+                        raise
+                    logger.warning(
+                        f"Part {part_number} of {self.object_name} failed "
+                        f"(attempt {attempt}/{retries}): {e}"
+                    )
+                    time.sleep(self.options["retry_backoff"] * 2 ** (attempt - 1))
+        finally:
+            if on_done:
+                on_done(data)
+
+    def complete(self):
+        """Wait for all parts, complete the upload and return its checksum.
+
+        Returns ``(result, parts, multipart_md5)`` where ``multipart_md5``
+        is the S3-style MD5 of the part digests.
+        """
+        uploaded = sorted(
+            (future.result() for future in self._futures),
+            key=lambda item: item[0].part_number,
+        )
+        parts = [part for part, _ in uploaded]
+        result = self.client._complete_multipart_upload(
+            self.bucket_name, self.object_name, self.upload_id, parts
+        )
+
+        digests = b"".join(digest.digest() for _, digest in uploaded)
+        multipart_md5 = "{}-{}".format(hashlib.md5(digests).hexdigest(), len(parts))
+        return result, parts, multipart_md5
+
+    def abort(self):
+        """Cancel queued parts and abort the multipart upload."""
+        for future in self._futures:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        try:
+            self.client._abort_multipart_upload(
+                self.bucket_name, self.object_name, self.upload_id
+            )
+        except Exception as e:
+            logger.warning(f"Could not abort multipart upload {self.upload_id}: {e}")
@@ -1,7 +1,19 @@
+import logging
+
 import requests
 from django.conf import settings
 from minio import Minio
 
+from core import tracing
+
+from .balancer import NodeScore, choose
+from .health import CircuitBreaker, HealthMonitor
+from .placement import place, rank_nodes
+from .scoreboard import shared_record
+from .transport import build_http_client, pool_stats, transport_options
+
+logger = logging.getLogger(__name__)
+
 nodes = []
 
 
@@ -14,38 +26,58 @@ class Node:
         secure,
         bucket_name,
         region,
-        load,
+        transport=None,
+        weight=1.0,
+        cluster=None,
     ):
         self.endpoint = endpoint
         self.access_key = access_key
         self.secret_key = secret_key
         self.secure = secure
         self.bucket_name = bucket_name
-        self.load = load
+        self.weight = float(weight)  # Relative share of objects placed on this node
+        # Nodes of one MinIO deployment can copy objects between them server-side
+        self.cluster = cluster or endpoint
         self.region = region
         self.endpoint = endpoint
         self.access_url = f"{endpoint}/{bucket_name}"
 
-        # Initialize MinIO client with retry and proper pool_size
+        # Initialize MinIO client on a pooled, tuned transport that feeds the load score
+        self.score = NodeScore(shared=shared_record(endpoint))
+        self.transport = transport_options(transport)
+        self.http_client = build_http_client(self.transport, self.score, endpoint)
         self.client = Minio(
             endpoint,
             access_key=access_key,
             secret_key=secret_key,
             secure=secure,
-            http_client=None,  # Use default client with automatic retries
+            http_client=self.http_client,
         )
+        self.breaker = CircuitBreaker(**getattr(settings, "MINIO_CIRCUIT_BREAKER", {}))
+        self.health_changed_at = 0.0  # Wall-clock time of the last breaker transition
         print(f"Minio endpoint for client: {endpoint}")
 
     @property
     def is_healthy(self):
-        return self.check_health()
+        """Cached health as seen by the background health monitor."""
+        return self.breaker.state == CircuitBreaker.CLOSED
+
+    @property
+    def load(self):
+        """Expected seconds to serve one more request, from the load score."""
+        return self.score.cost()
+
+    def pool_stats(self):
+        """Connection pool utilisation for this node's transport."""
+        return pool_stats(self.http_client, self.transport["pool_size"])
 
     def check_health(self):
         try:
             self.client.bucket_exists(self.bucket_name)
             return True
         except Exception as e:
-            print(f"Error: {e}")
+            # The monitor logs the breaker opening; one failed probe is routine
+            logger.debug(f"Health probe of {self.endpoint} failed: {e}")
             return False
 
     def check_file_status(self, file_name):
@@ -67,21 +99,44 @@ class NodeManager:
         for node in settings.MINIO_NODES:
             self.nodes.append(Node(**node))
 
+        self.health_monitor = HealthMonitor(
+            self.nodes,
+            interval=getattr(settings, "MINIO_HEALTH_CHECK_INTERVAL", 10),
+            timeout=getattr(settings, "MINIO_HEALTH_CHECK_TIMEOUT", 3),
+        )
+
     def get_all_nodes(self):
         return [node for node in self.nodes]
 
+    def get_node(self, endpoint):
+        """Return the configured node for an endpoint, or None."""
+        return next((node for node in self.nodes if node.endpoint == endpoint), None)
+
+    @tracing.traced("nodes.active")
     def get_active_nodes(self):
-        return [node for node in self.nodes if node.check_health()]
+        """Return the cached healthy nodes without probing them."""
+        self.health_monitor.wait_ready()
+        return list(self.health_monitor.healthy_nodes)
 
+    @tracing.traced("nodes.least_loaded")
     def get_least_loaded_node(self) -> Node:
-        from core.minio.filestat import monitor_nodes_health  # Import here to avoid circular import
-
-        active_nodes, _ = monitor_nodes_health()  # Update node loads before selecting
-
-        # active_nodes = self.get_active_nodes()
-        if not active_nodes:
-            return None
-        return min(active_nodes, key=lambda node: node.load)
+        """A lightly loaded healthy node, picked with power-of-two-choices."""
+        return choose(self.get_active_nodes())
+
+    def get_placement(self, key, replicas=None):
+        """Primary and replica nodes for an object key, whether healthy or not."""
+        return place(key, self.nodes, replicas)
+
+    @tracing.traced("nodes.read_order")
+    def get_read_order(self, key):
+        """Healthy nodes in the key's placement order."""
+        active = {node.endpoint for node in self.get_active_nodes()}
+        return [node for node in rank_nodes(key, self.nodes) if node.endpoint in active]
+
+    @tracing.traced("nodes.node_for")
+    def get_node_for(self, key):
+        """The node an object key is written to: its highest-ranked healthy node."""
+        return next(iter(self.get_read_order(key)), None)
 
 
 node_manager = NodeManager()
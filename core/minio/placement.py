@@ -0,0 +1,46 @@
+"""
+Object placement.
+Each object key is mapped to an ordered list of nodes with weighted
+rendezvous (highest random weight) hashing over the configured nodes, so
+any process can compute where an object lives, and adding or removing a
+node only moves the keys whose top-ranked nodes changed.
+"""
+
+import hashlib
+import math
+
+from django.conf import settings
+
+DEFAULT_PLACEMENT = {
+    "replicas": 1,  # Copies kept besides the primary
+}
+
+_SCALE = float(1 << 64)
+
+
+def placement_options():
+    """Placement settings merged over the defaults."""
+    options = dict(DEFAULT_PLACEMENT)
+    options.update(getattr(settings, "MINIO_PLACEMENT", {}))
+    return options
+
+
+def _score(endpoint, weight, key):
+    """Weighted rendezvous score of a node for a key; the highest wins."""
+    digest = hashlib.blake2b(f"{endpoint}\0{key}".encode(), digest_size=8).digest()
+    # Uniform in (0, 1), so -ln(u) is exponentially distributed
+    u = (int.from_bytes(digest, "big") + 0.5) / _SCALE
+    return weight / -math.log(u)
+
+
+def rank_nodes(key, nodes):
+    """Every node in ``nodes``, ordered by preference for ``key``."""
+    return sorted(nodes, key=lambda node: _score(node.endpoint, node.weight, key), reverse=True)
+
+
+def place(key, nodes, replicas=None):
+    """The primary node for ``key`` followed by its ``replicas`` replica nodes."""
+    if replicas is None:
+        replicas = placement_options()["replicas"]
+    return rank_nodes(key, nodes)[: replicas + 1]
+
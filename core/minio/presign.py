@@ -0,0 +1,137 @@
+"""
+Presigned download URL cache.
+Each entry records when its URL expires and which node signed it, so a
+cached URL is handed out without contacting MinIO until shortly before it
+expires or its node changes health.
+"""
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import tracing
+
+from . import metrics
+from .balancer import choose
+from .node import node_manager
+
+DEFAULT_PRESIGN = {
+    "expiry": 3600,  # Seconds a presigned download URL stays valid
+    "margin": 300,  # Stop handing out a cached URL this many seconds before expiry
+}
+
+
+def presign_options():
+    """Presign settings merged over the defaults."""
+    options = dict(DEFAULT_PRESIGN)
+    options.update(getattr(settings, "MINIO_PRESIGN", {}))
+    return options
+
+
+class PresignedURLCache:
+    """Cache presigned GET URLs per file in Django's cache."""
+
+    def __init__(self, options=None):
+        self.options = options or presign_options()
+
+    @staticmethod
+    def _key(file_id):
+        return f"presigned_url:{file_id}"
+
+    def _is_usable(self, entry, now, endpoints=None):
+        """An entry is usable while fresh and its node is healthy and unchanged."""
+        if entry["expires_at"] - self.options["margin"] <= now:
+            return False
+        if endpoints and entry["node"] not in endpoints:
+            return False
+        node = node_manager.get_node(entry["node"])
+        return (
+            node is not None
+            and node.is_healthy
+            and entry["signed_at"] >= node.health_changed_at
+        )
+
+    @staticmethod
+    def _pick_node(object_name, endpoints=None):
+        """The less loaded of two healthy nodes in ``endpoints``.
+
+        Without a healthy one, the object's first healthy node in placement
+        order, which is where it was written.
+        """
+        nodes = node_manager.get_read_order(object_name)
+        if not nodes:
+            raise Exception("No active MinIO nodes available.")
+        holders = [node for node in nodes if node.endpoint in endpoints] if endpoints else []
+        return choose(holders) if holders else nodes[0]
+
+    def sign(self, node, object_name, now=None):
+        """Sign a GET URL on ``node`` and return it with its cache entry."""
+        now = now or time.time()
+        with metrics.timed(node.endpoint, "presign"):
+            url = node.client.presigned_get_object(
+                node.bucket_name,
+                object_name,
+                expires=timedelta(seconds=self.options["expiry"]),
+            )
+        entry = {
+            "url": url,
+            "node": node.endpoint,
+            "signed_at": now,
+            "expires_at": now + self.options["expiry"],
+        }
+        return url, entry
+
+    @tracing.traced("presign.get")
+    def get(self, file_id, object_name, endpoints=None):
+        """Return a cached URL, signing a new one on a miss.
+
+        ``endpoints`` are the nodes known to hold the object; the less
+        loaded of two healthy ones signs.
+        """
+        now = time.time()
+        entry = cache.get(self._key(file_id))
+        if entry and self._is_usable(entry, now, endpoints):
+            return entry["url"]
+
+        url, entry = self.sign(self._pick_node(object_name, endpoints), object_name, now)
+        self.set(file_id, entry)
+        return url
+
+    @tracing.traced("presign.get_many")
+    def get_many(self, files):
+        """Return ``{file_id: url}`` for ``(file_id, object_name, endpoints)`` triples.
+
+        The cache is read and written once for the whole batch.
+        """
+        now = time.time()
+        files = list(files)
+        entries = cache.get_many([self._key(file_id) for file_id, _, _ in files])
+
+        urls, fresh = {}, {}
+        for file_id, object_name, endpoints in files:
+            entry = entries.get(self._key(file_id))
+            if entry and self._is_usable(entry, now, endpoints):
+                urls[file_id] = entry["url"]
+                continue
+            urls[file_id], fresh[self._key(file_id)] = self.sign(
+                self._pick_node(object_name, endpoints), object_name, now
+            )
+
+        if fresh:
+            cache.set_many(fresh, self._timeout())
+        return urls
+
+    def _timeout(self):
+        return self.options["expiry"] - self.options["margin"]
+
+    def set(self, file_id, entry):
+        cache.set(self._key(file_id), entry, self._timeout())
+
+    def invalidate(self, file_id):
+        """Forget the cached URL of a file, e.g. after it is deleted."""
+        cache.delete(self._key(file_id))
+
+
+presigned_urls = PresignedURLCache()
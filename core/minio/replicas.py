@@ -0,0 +1,146 @@
+"""
+Per-node object status.
+Every node is asked for an object with ``stat_object`` at the same time,
+under one shared deadline, and definite answers are cached briefly.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.cache import cache
+from minio.error import S3Error
+
+from core import tracing
+
+from . import metrics
+from .node import node_manager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPLICA_STATUS = {
+    "deadline": 2.0,  # Seconds to wait for all nodes together
+    "cache_ttl": 30,  # Seconds to remember whether a node has an object
+    "workers": 8,
+    "max_pending_per_node": 2,  # Unfinished stats after which a node is skipped
+}
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_pending = {}  # endpoint: stat futures still running
+
+
+def replica_status_options():
+    """Replica status settings merged over the defaults."""
+    options = dict(DEFAULT_REPLICA_STATUS)
+    options.update(getattr(settings, "MINIO_REPLICA_STATUS", {}))
+    return options
+
+
+def _get_executor(workers):
+    """Shared stat worker pool, recreated after a fork."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="minio-stat")
+            _executor_pid = os.getpid()
+            _pending.clear()
+        return _executor
+
+
+def _submit_stat(executor, node, object_name, options):
+    """Queue a stat on ``node``, or return None while it has too many unfinished.
+
+    A node that stopped answering would otherwise take every worker of the
+    shared pool and hold up status checks on all the other nodes.
+    """
+    with _executor_lock:
+        pending = _pending.setdefault(node.endpoint, set())
+        if len(pending) >= options["max_pending_per_node"]:
+            return None
+        future = executor.submit(tracing.bind(_stat), node, object_name, options["cache_ttl"])
+        pending.add(future)
+
+    def forget(done):
+        with _executor_lock:
+            pending.discard(done)
+
+    future.add_done_callback(forget)
+    return future
+
+
+def _cache_key(node, object_name):
+    return f"replica_status:{node.endpoint}:{object_name}"
+
+
+def _stat(node, object_name, cache_ttl):
+    """Stat one object on one node and cache the answer."""
+    try:
+        node.client.stat_object(node.bucket_name, object_name)
+        status = 200
+    except S3Error as e:
+        if e.code not in ("NoSuchKey", "NoSuchObject"):
+            raise
+        status = 404
+    cache.set(_cache_key(node, object_name), status, cache_ttl)
+    return status
+
+
+def replica_status(object_name, nodes=None):
+    """Return one entry per node saying whether it holds ``object_name``.
+
+    ``status`` is 200 or 404 when the node answered, 503 when it is down or
+    failed, and 504 when it missed the deadline. Available entries carry a
+    presigned ``preview_url``.
+    """
+    options = replica_status_options()
+    nodes = node_manager.get_all_nodes() if nodes is None else nodes
+    statuses = cache.get_many([_cache_key(node, object_name) for node in nodes])
+
+    results = {}
+    futures = {}
+    executor = _get_executor(options["workers"])
+    for node in nodes:
+        cached = statuses.get(_cache_key(node, object_name))
+        if cached is not None:
+            results[node.endpoint] = cached
+        elif not node.breaker.allow_request():
+            results[node.endpoint] = 503
+        else:
+            future = _submit_stat(executor, node, object_name, options)
+            if future is None:
+                results[node.endpoint] = 504  # Still busy with earlier stats
+            else:
+                futures[future] = node
+
+    done, _ = wait(futures, timeout=options["deadline"])
+    for future, node in futures.items():
+        if future not in done:
+            # Left running; its answer is cached for the next call
+            results[node.endpoint] = 504
+        elif future.exception():
+            logger.warning(f"Could not stat {object_name} on {node.endpoint}: {future.exception()}")
+            results[node.endpoint] = 503
+        else:
+            results[node.endpoint] = future.result()
+
+    replicas = []
+    for node in nodes:
+        status = results[node.endpoint]
+        preview_url = None
+        if status == 200:
+            try:
+                with metrics.timed(node.endpoint, "presign"):
+                    preview_url = node.client.presigned_get_object(node.bucket_name, object_name)
+            except Exception as e:
+                logger.warning(f"Could not presign {object_name} on {node.endpoint}: {e}")
+        replicas.append({
+            "endpoint": node.endpoint,
+            "region": node.region,
+            "status": status,
+            "preview_url": preview_url,
+        })
+    return replicas
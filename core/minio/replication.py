@@ -0,0 +1,90 @@
+"""
+Object replication between nodes.
+Nodes of the same MinIO deployment share their objects, so a copy between
+them is only a check that the object is there. Between deployments objects
+are streamed from one node into the other without being buffered whole. Background copies run on a per-process
+worker pool unless a Celery queue is configured.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .hashing import HashingReader
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPLICATION = {
+    "write_quorum": 1,  # Copies stored before an upload is answered
+    "queue": "thread",  # "thread" for the in-process pool, "celery" for workers
+    "workers": 4,  # Threads copying objects in the in-process pool
+    "retries": 3,  # Attempts per background copy
+    "retry_backoff": 2.0,  # Seconds, doubled after each failed attempt
+    "part_size": 16 * 1024 * 1024,  # Part size when streaming between nodes
+    "stale_after": 600,  # Seconds before a pending copy is queued again
+}
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def replication_options():
+    """Replication settings merged over the defaults."""
+    options = dict(DEFAULT_REPLICATION)
+    options.update(getattr(settings, "MINIO_REPLICATION", {}))
+    return options
+
+
+def get_executor(workers=None):
+    """Shared copy worker pool, recreated after a fork."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=workers or replication_options()["workers"],
+                thread_name_prefix="minio-replicate",
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def copy_object(source, target, object_name, options=None):
+    """Copy ``object_name`` from node ``source`` to node ``target``.
+
+    Returns the ETag of the copy. Within one deployment the target already
+    holds the object, so it is only stat'ed; copying an object onto itself
+    would be rejected. Streamed copies are checked against the source's size
+    and, for single-part objects, its MD5.
+    """
+    options = options or replication_options()
+    if source.cluster == target.cluster:
+        stat = target.client.stat_object(target.bucket_name, object_name)
+        return stat.etag.strip('"')
+
+    stat = source.client.stat_object(source.bucket_name, object_name)
+    response = source.client.get_object(source.bucket_name, object_name)
+    try:
+        reader = HashingReader(response)
+        result = target.client.put_object(
+            target.bucket_name,
+            object_name,
+            reader,
+            stat.size,
+            content_type=stat.content_type or "application/octet-stream",
+            part_size=options["part_size"],
+        )
+    finally:
+        response.close()
+        response.release_conn()
+
+    source_etag = stat.etag.strip('"')
+    if reader.bytes_read != stat.size or (
+        "-" not in source_etag and reader.hexdigest() != source_etag
+    ):
+        target.client.remove_object(target.bucket_name, object_name)
+        raise ValueError(f"Copy of {object_name} to {target.endpoint} failed its integrity check.")
+    return result.etag.strip('"')
@@ -0,0 +1,298 @@
+"""
+Host-wide node scoreboard.
+Every worker process on the host maps the same file and keeps one
+fixed-size record per node in it: the latency average, recent request and
+error counts, the last health probe result, and one in-flight count per
+worker process. Readers never lock; each record carries a sequence number
+that writers make odd while they update it (a seqlock), and readers retry
+when it changed under them. Writers are serialised by a thread lock and an
+fcntl lock on the record, so load balancing sees the load of every worker
+for the cost of a few struct reads. The counts of processes that have
+exited are dropped when a worker claims its own count and after every
+health probe, so a killed worker never leaves a node looking busy.
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import random
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .balancer import decayed, ewma_step
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCOREBOARD = {
+    "enabled": True,
+    "path": None,  # Defaults to a file in the temp directory named after the project
+    "slots": 64,  # Node records in the file
+    "workers": 64,  # Worker processes whose in-flight counts each record holds
+    "read_retries": 100,  # Seqlock read attempts before falling back to local stats
+}
+
+_MAGIC = b"FNSCORE2"
+_HEADER = struct.Struct("<8sII")
+_HEADER_SIZE = 64
+_SEQ = struct.Struct("<Q")
+# key, latency, latency_at, requests, errors, counts_at,
+# healthy, checked_by, checked_at
+_BODY = struct.Struct("<Qdddddqqd")
+_BODY_SIZE = 128
+# pid, token, in_flight; one per worker process, after the body
+_WORKER = struct.Struct("<qqq")
+
+_NO_LATENCY = -1.0
+_UNKNOWN = -1
+
+_scoreboard = None
+_scoreboard_lock = threading.Lock()
+_token = None
+_token_pid = None
+
+
+def scoreboard_options():
+    """Scoreboard settings merged over the defaults."""
+    options = dict(DEFAULT_SCOREBOARD)
+    options.update(getattr(settings, "MINIO_SCOREBOARD", {}))
+    if not options["path"]:
+        project = hashlib.blake2b(str(settings.BASE_DIR).encode(), digest_size=4).hexdigest()
+        options["path"] = os.path.join(tempfile.gettempdir(), f"filenest-scoreboard-{project}")
+    return options
+
+
+def _process_token():
+    """``(pid, token)`` of this process; the token tells a reused pid apart."""
+    global _token, _token_pid
+    pid = os.getpid()
+    if _token_pid != pid:
+        _token = random.getrandbits(63) or 1
+        _token_pid = pid
+    return pid, _token
+
+
+def pid_alive(pid):
+    """Whether a process with ``pid`` is running on this host."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Another user's process
+    return True
+
+
+class SharedNodeRecord:
+    """One node's record in the scoreboard."""
+
+    def __init__(self, board, offset):
+        self.board = board
+        self.offset = offset
+        self._lock = threading.Lock()
+        self._worker = None  # (pid, offset of this process's in-flight count)
+
+    def read(self):
+        """A consistent copy of the record, or None if no writer lets go of it."""
+        mm, offset = self.board.mm, self.offset
+        for _ in range(self.board.options["read_retries"]):
+            seq = _SEQ.unpack_from(mm, offset)[0]
+            if seq & 1:
+                continue
+            fields = _BODY.unpack_from(mm, offset + _SEQ.size)
+            # Every third value is a count, after its pid and token
+            in_flight = sum(self.board.workers.unpack_from(mm, offset + _BODY_SIZE)[2::3])
+            if _SEQ.unpack_from(mm, offset)[0] == seq:
+                return self._view(fields, in_flight)
+        return None
+
+    def _view(self, fields, in_flight):
+        (_, latency, latency_at, requests, errors, counts_at,
+         healthy, checked_by, checked_at) = fields
+        return {
+            "in_flight": max(0, in_flight),
+            "latency": None if latency == _NO_LATENCY else latency,
+            "latency_at": latency_at,
+            "requests": requests,
+            "errors": errors,
+            "counts_at": counts_at,
+            "healthy": None if healthy == _UNKNOWN else bool(healthy),
+            "checked_by": checked_by,
+            "checked_at": checked_at,
+        }
+
+    @contextmanager
+    def _write(self):
+        """Yield the record's fields as a list and store them back, under the seqlock."""
+        mm, offset = self.board.mm, self.offset
+        size = self.board.record_size
+        with self._lock:
+            fcntl.lockf(self.board.fd, fcntl.LOCK_EX, size, offset, os.SEEK_SET)
+            seq = _SEQ.unpack_from(mm, offset)[0]
+            # An odd number means a writer died mid-update; it stays odd until we finish
+            if not seq & 1:
+                seq += 1
+                _SEQ.pack_into(mm, offset, seq)
+            try:
+                fields = list(_BODY.unpack_from(mm, offset + _SEQ.size))
+                yield fields, time.time()
+                _BODY.pack_into(mm, offset + _SEQ.size, *fields)
+            finally:
+                _SEQ.pack_into(mm, offset, seq + 1)
+                fcntl.lockf(self.board.fd, fcntl.LOCK_UN, size, offset, os.SEEK_SET)
+
+    def _workers(self):
+        """Offsets of the record's per-process in-flight counts."""
+        start = self.offset + _BODY_SIZE
+        return range(start, self.offset + self.board.record_size, _WORKER.size)
+
+    def _sweep(self, pid=None):
+        """Drop the counts of exited processes, and of an earlier process with ``pid``.
+
+        Called with the record's write lock held.
+        """
+        mm = self.board.mm
+        for offset in self._workers():
+            owner, _, _ = _WORKER.unpack_from(mm, offset)
+            if owner and (owner == pid or not pid_alive(owner)):
+                _WORKER.pack_into(mm, offset, 0, 0, 0)
+
+    def _worker_offset(self):
+        """This process's in-flight count, claimed on first use; None if all are taken.
+
+        Called with the record's write lock held.
+        """
+        pid, token = _process_token()
+        if self._worker is not None and self._worker[0] == pid:
+            return self._worker[1]
+        mm = self.board.mm
+        for offset in self._workers():
+            if _WORKER.unpack_from(mm, offset)[:2] == (pid, token):
+                break
+        else:
+            self._sweep(pid)
+            offset = next(
+                (offset for offset in self._workers() if not _WORKER.unpack_from(mm, offset)[0]),
+                None,
+            )
+            if offset is None:
+                logger.warning("Scoreboard record is full; in-flight requests are not shared")
+            else:
+                _WORKER.pack_into(mm, offset, pid, token, 0)
+        self._worker = (pid, offset)
+        return offset
+
+    def _add_in_flight(self, delta):
+        offset = self._worker_offset()
+        if offset is not None:
+            pid, token, in_flight = _WORKER.unpack_from(self.board.mm, offset)
+            _WORKER.pack_into(self.board.mm, offset, pid, token, max(0, in_flight + delta))
+
+    def add_in_flight(self, delta):
+        with self._write():
+            self._add_in_flight(delta)
+
+    def finish(self, elapsed, error, timed, decay):
+        """Record a finished request: one fewer in flight, counts and latency."""
+        with self._write() as (fields, now):
+            self._add_in_flight(-1)
+            fields[3] = decayed(fields[3], fields[5], now, decay) + 1
+            fields[4] = decayed(fields[4], fields[5], now, decay) + (1 if error else 0)
+            fields[5] = now
+            if timed and not error:
+                latency = None if fields[1] == _NO_LATENCY else fields[1]
+                fields[1] = ewma_step(latency, fields[2], elapsed, now, decay, peak=True)
+                fields[2] = now
+
+    def set_health(self, healthy):
+        """Publish a health probe result for the other workers."""
+        with self._write() as (fields, now):
+            fields[6] = 1 if healthy else 0
+            fields[7] = os.getpid()
+            fields[8] = now
+            self._sweep()
+
+
+class Scoreboard:
+    """The memory-mapped scoreboard file shared by the host's workers."""
+
+    def __init__(self, options):
+        self.options = options
+        self.workers = struct.Struct("<" + "qqq" * options["workers"])
+        self.record_size = _BODY_SIZE + self.workers.size
+        self.size = _HEADER_SIZE + options["slots"] * self.record_size
+        header = _HEADER.pack(_MAGIC, options["slots"], options["workers"])
+        self.fd = os.open(options["path"], os.O_RDWR | os.O_CREAT, 0o600)
+        self._lock = threading.Lock()
+        with self._header_lock():
+            if (
+                os.fstat(self.fd).st_size != self.size
+                or os.pread(self.fd, _HEADER.size, 0) != header
+            ):
+                # New file, or one laid out for another version or size
+                os.ftruncate(self.fd, 0)
+                os.ftruncate(self.fd, self.size)
+                os.pwrite(self.fd, header, 0)
+        self.mm = mmap.mmap(self.fd, self.size)
+
+    @contextmanager
+    def _header_lock(self):
+        with self._lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, _HEADER_SIZE, 0, os.SEEK_SET)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, _HEADER_SIZE, 0, os.SEEK_SET)
+
+    def record(self, endpoint):
+        """The record for ``endpoint``, claiming a free slot for a new node."""
+        digest = hashlib.blake2b(endpoint.encode(), digest_size=8).digest()
+        key = int.from_bytes(digest, "big") or 1
+        slots = self.options["slots"]
+        with self._header_lock():
+            for probe in range(slots):
+                offset = _HEADER_SIZE + ((key + probe) % slots) * self.record_size
+                owner = _BODY.unpack_from(self.mm, offset + _SEQ.size)[0]
+                if owner == key:
+                    return SharedNodeRecord(self, offset)
+                if owner == 0:
+                    _BODY.pack_into(
+                        self.mm, offset + _SEQ.size,
+                        key, _NO_LATENCY, 0.0, 0.0, 0.0, 0.0, _UNKNOWN, 0, 0.0,
+                    )
+                    return SharedNodeRecord(self, offset)
+        logger.warning(f"Scoreboard is full; {endpoint} is balanced on local stats only")
+        return None
+
+
+def get_scoreboard():
+    """The process's mapping of the scoreboard, or None when it is unavailable."""
+    global _scoreboard
+    with _scoreboard_lock:
+        if _scoreboard is None:
+            options = scoreboard_options()
+            if not options["enabled"] or fcntl is None:
+                _scoreboard = False
+            else:
+                try:
+                    _scoreboard = Scoreboard(options)
+                except OSError as e:
+                    logger.warning(f"Node scoreboard disabled, {options['path']} unusable: {e}")
+                    _scoreboard = False
+        return _scoreboard or None
+
+
+def shared_record(endpoint):
+    """The scoreboard record of a node, or None without a scoreboard."""
+    board = get_scoreboard()
+    return board.record(endpoint) if board else None
@@ -1,33 +1,102 @@
 import hashlib
-from datetime import timedelta
+import io
+import time
+import uuid
 
 import minio
 from django.conf import settings
-from django.utils.text import get_valid_filename
-from minio.api import Part
 
+from core import tracing
+from core.minio import metrics
+from core.minio.buffers import part_buffers, readinto_full
+from core.minio.hashing import HashingReader
+from core.minio.multipart import MultipartUpload
 from core.minio.node import node_manager
 
+# Size of the chunks streamed to clients when proxying downloads
+STREAM_CHUNK_SIZE = 256 * 1024
 
-def minio_storage():
-    """Return MinIO client from the least loaded node."""
-    node = node_manager.get_least_loaded_node()
-    if not node:
-        print("No active MinIO nodes available.")
-        return None  # Or raise an exception if you prefer
 
-    return node.client
+def staging_key():
+    """A new object key for an upload, so no two uploads ever write the same key."""
+    return f"uploads/{uuid.uuid4()}"
 
 
+def minio_node(endpoint=None, key=None):
+    """Return the node for ``endpoint``, else the node object ``key`` is placed on,
+    else the least loaded node.
+    """
+    if endpoint:
+        node = node_manager.get_node(endpoint)
+    elif key:
+        node = node_manager.get_node_for(key)
+    else:
+        node = node_manager.get_least_loaded_node()
+    if not node:
+        raise Exception("No active MinIO nodes available.")
+    return node
+
+
+@tracing.traced("storage.multipart_start")
+def minio_multipart_start(file_name, content_type, node=None):
+    """Start a multipart upload and return a MultipartUpload to feed parts into."""
+    if node is None:
+        node = minio_node(key=file_name)
+        if not node.client.bucket_exists(settings.MINIO_BUCKET_NAME):
+            node.client.make_bucket(settings.MINIO_BUCKET_NAME)
+
+    client = node.client
+    upload_id = client._create_multipart_upload(
+        settings.MINIO_BUCKET_NAME,
+        file_name,
+        {"Content-Type": content_type or "application/octet-stream"},
+    )
+    print(f"Multipart upload started for: {file_name}, upload_id: {upload_id}")
+    return MultipartUpload(
+        client, settings.MINIO_BUCKET_NAME, file_name, upload_id, node_endpoint=node.endpoint
+    )
+
+
+@tracing.traced("storage.multipart_complete")
+def minio_multipart_complete(upload, sha256=None):
+    """Complete a multipart upload, returning the same result tuple as minio_upload.
+
+    ``sha256`` is the content hash, when the caller computed it while reading.
+    """
+    result, parts, multipart_md5 = upload.complete()
+    file_name = upload.object_name
+    file_url = f"{settings.MINIO_ACCESS_URL}/{file_name}"
+    print(f"Multipart upload completed for: {file_name}, total parts: {len(parts)}")
+
+    # Compare calculated checksum with MinIO ETag
+    is_valid = result.etag.strip('"') == multipart_md5
+
+    return (
+        file_name,
+        file_url,
+        result.etag,
+        len(parts),
+        parts,
+        multipart_md5,
+        is_valid,
+        upload.node_endpoint,
+        sha256,
+    )
+
+
+@tracing.traced("storage.upload")
 def minio_upload(file_obj):
-    """Upload a file to MinIO, handling both single and multipart uploads."""
-    client = minio_storage()
-    file_name = get_valid_filename(file_obj.name)
+    """Upload a file to MinIO, handling both single and multipart uploads.
+
+    The object gets a fresh ``staging_key``. Returns ``(object_name,
+    file_url, etag, chunk_count, parts, checksum, is_valid, node_endpoint,
+    sha256)``.
+    """
+    file_name = staging_key()
+    node = minio_node(key=file_name)
+    client = node.client
     file_size = file_obj.size
     content_type = file_obj.content_type
-    # Minimum part size for multipart uploads (5MB as per S3 specs)
-    MIN_PART_SIZE = 5 * 1024 * 1024
-
     if not client.bucket_exists(settings.MINIO_BUCKET_NAME):
         client.make_bucket(settings.MINIO_BUCKET_NAME)
 
@@ -36,92 +105,54 @@ def minio_upload(file_obj):
             # Reset file pointer to beginning
             file_obj.seek(0)
 
-            upload_id = client._create_multipart_upload(
-                settings.MINIO_BUCKET_NAME, file_name, {}
-            )
-            parts = []
-            part_num = 1
-            print(
-                f"Multipart upload started for: {file_name}, upload_id: {upload_id}, file_size: {file_size}"
-            )
-
-            # Buffer to accumulate chunks until minimum part size
-            buffer = bytearray()
-
-            # Process chunks ensuring each part meets minimum size
-            md5_parts = []  # Store MD5 hashes of parts
-            for chunk in file_obj.chunks():
-                buffer.extend(chunk)
-
-                # Upload part when buffer size exceeds minimum part size
-                # or it's the last part and buffer has content
-                if len(buffer) >= MIN_PART_SIZE or (
-                    file_obj.file.tell() == file_size and buffer
-                ):
-                    md5_parts.append(hashlib.md5(buffer))
-
-                    part = client._upload_part(
-                        settings.MINIO_BUCKET_NAME,
-                        file_name,
-                        buffer,
-                        {},
-                        upload_id,
+            # Parts are read into pooled buffers and uploaded concurrently
+            with minio_multipart_start(file_name, content_type, node) as upload:
+                content_hash = hashlib.sha256()
+                part_num = 1
+                while True:
+                    buffer = part_buffers.acquire()
+                    try:
+                        part_size = readinto_full(file_obj, memoryview(buffer))
+                    except Exception:
+                        part_buffers.release(buffer)
+                        raise
+                    if not part_size and part_num > 1:
+                        part_buffers.release(buffer)
+                        break
+                    content_hash.update(memoryview(buffer)[:part_size])
+
+                    upload.submit(
                         part_num,
+                        memoryview(buffer)[:part_size],
+                        on_done=lambda _, buffer=buffer: part_buffers.release(buffer),
                     )
-                    parts.append(
-                        Part(part_number=part_num, etag=part, size=len(buffer))
-                    )
-                    print(f"  Part {part_num} uploaded, part size: {len(buffer)}")
                     part_num += 1
-                    buffer = bytearray()  # Reset buffer
-
-            result = client._complete_multipart_upload(
-                settings.MINIO_BUCKET_NAME, file_name, upload_id, parts
-            )
-            file_url = f"{settings.MINIO_ACCESS_URL}/{file_name}"
-            print(
-                f"Multipart upload completed for: {file_name}, total parts: {len(parts)}"
-            )
-
-            # Compute MD5 for the whole file using ETag-style hashing
-            digests = b"".join(m.digest() for m in md5_parts)
-            digests_md5 = hashlib.md5(digests)
-            multipart_md5 = "{}-{}".format(digests_md5.hexdigest(), len(md5_parts))
+                    if part_size < part_buffers.buffer_size:
+                        break  # Short read, this was the last part
 
-            # Compare calculated checksum with MinIO ETag
-            is_valid = result.etag.strip('"') == multipart_md5
-
-            return (
-                file_name,
-                file_url,
-                result.etag,
-                len(parts),
-                parts,
-                multipart_md5,
-                is_valid,
-            )
+                return minio_multipart_complete(upload, content_hash.hexdigest())
 
         # For very small files, always use single-part upload
         else:
-            # Single part upload for small files
-            file_hash = hashlib.md5()
-            file_hash.update(file_obj.read())
-            calculated_checksum = file_hash.hexdigest()
-
-            # Reset file pointer to beginning
+            # Single part upload for small files, hashed while it streams
             file_obj.seek(0)
+            reader = HashingReader(file_obj, ("md5", "sha256"))
 
             result = client.put_object(
                 settings.MINIO_BUCKET_NAME,
                 file_name,
-                file_obj,
+                reader,
                 length=file_size,
                 content_type=content_type,
             )
             file_url = f"{settings.MINIO_ACCESS_URL}/{file_name}"
+            calculated_checksum = reader.hexdigest("md5")
 
             # Compare calculated checksum with MinIO ETag
-            is_valid = result.etag.strip('"') == calculated_checksum
+            is_valid = (
+                reader.bytes_read == file_size
+                and result.etag.strip('"') == calculated_checksum
+            )
 
             return (
                 file_name,
@@ -131,9 +162,14 @@ def minio_upload(file_obj):
                 [],
                 calculated_checksum,
                 is_valid,
+                node.endpoint,
+                reader.hexdigest("sha256"),
             )
 
-    except minio.error.S3Error as e:
+    except (minio.error.S3Error, ValueError) as e:
+        # A part whose ETag never matched raises ValueError; leaving the
+        # ``with`` block above has already aborted the multipart upload
+        metrics.count_error(node.endpoint, "upload", e)
         error_message = f"-----------------MinIO upload failed: {e}"
         print(error_message)  # Consider using logging instead of print
         return (
@@ -144,56 +180,118 @@ def minio_upload(file_obj):
             None,
             None,
             error_message,
+            None,
+            None,
         )  # Failure, return error
 
 
-def minio_download(file_metadata, use_cache=False):
-    """Downloads file from MinIO."""
-    client = minio_storage()
-
-    try:
-        response = client.get_object(
-            settings.MINIO_BUCKET_NAME,
-            file_metadata.file_name,
-        )
-        file_data = response.read()
-        file_size = response.length
-        content_type = response.headers.get("Content-Type", "application/octet-stream")
-        return file_data, file_size, content_type
-
-    except minio.error.S3Error as e:
-        print(f"Error during the download: {e}")
-        return None, 0, ""
-    finally:
-        if "response" in locals():
-            response.close()
-            response.release_conn()
-
-
-def minio_remove(file_name):
-    """Remove a file from MinIO."""
-    client = minio_storage()
+class ObjectStream:
+    """Iterate over an open MinIO object in fixed-size chunks.
+
+    With a ``node``, the bytes read and the time taken are recorded as the
+    node's download throughput and metrics when the stream is closed.
+    """
+
+    def __init__(self, response, chunk_size, node=None):
+        self.response = response
+        self.chunk_size = chunk_size
+        self.node = node
+        self.bytes_read = 0
+        self.opened_at = time.monotonic()
+
+    def __iter__(self):
+        for data in self.response.stream(self.chunk_size):
+            self.bytes_read += len(data)
+            yield data
+
+    def close(self):
+        """Close the response and hand its connection back to the pool."""
+        self.response.close()
+        self.response.release_conn()
+        if self.node is not None:
+            self.node.score.record_transfer(
+                "download", self.bytes_read, time.monotonic() - self.opened_at
+            )
+            if self.bytes_read:
+                metrics.registry.inc(
+                    "filenest_minio_bytes_total", (self.node.endpoint, "download"), self.bytes_read
+                )
+            self.node = None
+
+
+class ObjectReader(io.RawIOBase):
+    """Seekable, readable file over an object stored on the node at ``endpoint``.
+
+    The object is opened lazily at the current position, and again after a
+    seek, so a file whose bytes already went to MinIO can still be read.
+    """
+
+    def __init__(self, object_name, size, endpoint=None):
+        self.object_name = object_name
+        self.size = size
+        self.endpoint = endpoint
+        self._position = 0
+        self._response = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        offset = max(0, offset)
+        if offset != self._position:
+            self._release()
+        self._position = offset
+        return offset
+
+    def readinto(self, buffer):
+        if self._position >= self.size:
+            return 0
+        if self._response is None:
+            self._response = minio_node(self.endpoint).client.get_object(
+                settings.MINIO_BUCKET_NAME, self.object_name, offset=self._position
+            )
+        data = self._response.read(len(buffer))
+        buffer[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def _release(self):
+        if self._response is not None:
+            self._response.close()
+            self._response.release_conn()
+            self._response = None
+
+    def close(self):
+        self._release()
+        super().close()
+
+
+@tracing.traced("storage.stream_open")
+def minio_stream(file_name, offset=0, length=0, chunk_size=STREAM_CHUNK_SIZE, node=None):
+    """Open an object, or ``length`` bytes of it from ``offset``, for streaming."""
+    node = node or minio_node()
+    response = node.client.get_object(
+        settings.MINIO_BUCKET_NAME, file_name, offset=offset, length=length
+    )
+    return ObjectStream(response, chunk_size, node)
+
+
+@tracing.traced("storage.remove")
+def minio_remove(file_name, endpoint=None):
+    """Remove a file from MinIO, from the node at ``endpoint`` if given."""
+    node = minio_node(endpoint)
     try:
-        client.remove_object(settings.MINIO_BUCKET_NAME, file_name)
+        node.client.remove_object(settings.MINIO_BUCKET_NAME, file_name)
     except minio.error.S3Error as e:
+        metrics.count_error(node.endpoint, "remove", e)
         print(f"Error deleting file: {e}")
-
-
-def get_presigned_url(file_name, expires_in=3600):
-    """Generate a presigned URL for a given file using the least loaded node."""
-    node = node_manager.get_least_loaded_node()
-    if not node:
-        print(
-            "No active MinIO nodes available."
-        )  # Log this instead of raising exception for now
-        return None
-
-    client = node.client  # Use client from the least loaded node
-    try:
-        url = client.presigned_get_object(
-            node.bucket_name, file_name, expires=timedelta(seconds=expires_in)
-        )
-        return url
-    except minio.error.S3Error as e:
-        print(f"Error generating presigned URL: {e} from node: {node.name}")
-        return None
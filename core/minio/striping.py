@@ -0,0 +1,190 @@
+"""
+Striped downloads.
+A large object is split into byte ranges that are fetched concurrently from
+several nodes and handed back in order, so a download is not limited to the
+bandwidth of one node.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STRIPING = {
+    "min_size": 64 * 1024 * 1024,  # Smaller files are streamed from one node
+    "stripe_size": 8 * 1024 * 1024,  # Largest range fetched at once; bigger parts are split
+    "streams_per_node": 2,  # Concurrent range requests sent to each node
+    "max_buffered": 32 * 1024 * 1024,  # Bytes one download fetches ahead of the client
+    "workers": 16,  # Threads fetching stripes, shared by every download in a process
+}
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def striping_options():
+    """Striping settings merged over the defaults."""
+    options = dict(DEFAULT_STRIPING)
+    options.update(getattr(settings, "MINIO_STRIPING", {}))
+    return options
+
+
+def _get_executor(workers):
+    """Shared stripe worker pool, recreated after a fork."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="minio-stripe")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+class Stripe:
+    """A byte range of an object and, when known, the MD5 of its part.
+
+    ``md5`` is set when the stripe is a whole part. A part too large for one
+    stripe is split; each of its stripes carries the part's ``part_md5``,
+    checked once the stripe that ``ends_part`` has been read.
+    """
+
+    __slots__ = ("offset", "length", "md5", "part_md5", "ends_part")
+
+    def __init__(self, offset, length, md5=None, part_md5=None, ends_part=False):
+        self.offset = offset
+        self.length = length
+        self.md5 = md5
+        self.part_md5 = part_md5
+        self.ends_part = ends_part
+
+
+def plan_stripes(size, stripe_size, parts=()):
+    """Split an object into stripes of at most ``stripe_size`` bytes.
+
+    ``parts`` are ``(size, etag)`` pairs of the multipart upload; when they
+    cover the object the stripes follow the part boundaries so each part
+    can be checked against its ETag.
+    """
+    parts = list(parts)
+    if parts and sum(part_size for part_size, _ in parts) == size:
+        stripes, offset = [], 0
+        for part_size, etag in parts:
+            etag = (etag or "").strip('"')
+            md5 = etag if len(etag) == 32 and "-" not in etag else None
+            if part_size <= stripe_size:
+                stripes.append(Stripe(offset, part_size, md5))
+            else:
+                end = offset + part_size
+                for start in range(offset, end, stripe_size):
+                    length = min(stripe_size, end - start)
+                    stripes.append(Stripe(
+                        start, length, part_md5=md5, ends_part=start + length == end
+                    ))
+            offset += part_size
+        return stripes
+
+    return [
+        Stripe(offset, min(stripe_size, size - offset))
+        for offset in range(0, size, stripe_size)
+    ]
+
+
+class StripedReader:
+    """Iterate over an object's stripes, fetched in parallel from ``nodes``.
+
+    Stripe ``i`` is read from node ``i % len(nodes)``; a failed or corrupt
+    stripe is retried on the following nodes. Stripes are fetched ahead
+    only while they add up to ``max_buffered`` bytes, by at most
+    ``streams_per_node`` requests per node, on a worker pool shared by all
+    downloads.
+    """
+
+    def __init__(self, object_name, stripes, nodes, options=None):
+        if not nodes:
+            raise Exception("No active MinIO nodes available.")
+        self.object_name = object_name
+        self.stripes = stripes
+        self.nodes = list(nodes)
+        self.options = options or striping_options()
+        self.streams = len(self.nodes) * self.options["streams_per_node"]
+        self._executor = _get_executor(self.options["workers"])
+        self._pending = deque()
+        self._buffered = 0
+        self._next_index = 0
+
+    def _fetch(self, index):
+        stripe = self.stripes[index]
+        error = None
+        for attempt in range(len(self.nodes)):
+            node = self.nodes[(index + attempt) % len(self.nodes)]
+            response = None
+            try:
+                response = node.client.get_object(
+                    node.bucket_name,
+                    self.object_name,
+                    offset=stripe.offset,
+                    length=stripe.length,
+                )
+                data = response.read()
+                if len(data) != stripe.length:
+                    raise ValueError(f"short read, got {len(data)} of {stripe.length} bytes")
+                if stripe.md5 and hashlib.md5(data).hexdigest() != stripe.md5:
+                    raise ValueError("MD5 mismatch")
+                return data
+            except Exception as e:
+                error = e
+                logger.warning(
+                    f"Stripe {index} of {self.object_name} failed on {node.endpoint}: {e}"
+                )
+            finally:
+                if response is not None:
+                    response.close()
+                    response.release_conn()
+        raise Exception(f"Could not read stripe {index} of {self.object_name}: {error}")
+
+    def _fill(self):
+        """Queue stripes while the streams and the read-ahead budget allow."""
+        while self._next_index < len(self.stripes) and len(self._pending) < self.streams:
+            stripe = self.stripes[self._next_index]
+            if self._pending and self._buffered + stripe.length > self.options["max_buffered"]:
+                break
+            self._pending.append(
+                (stripe, self._executor.submit(self._fetch, self._next_index))
+            )
+            self._buffered += stripe.length
+            self._next_index += 1
+
+    def __iter__(self):
+        part_hash = None  # MD5 of the split part read so far
+        self._fill()
+        while self._pending:
+            stripe, future = self._pending.popleft()
+            data = future.result()
+            self._buffered -= stripe.length
+            self._fill()
+
+            if stripe.part_md5 is not None:
+                part_hash = part_hash or hashlib.md5()
+                part_hash.update(data)
+                if stripe.ends_part:
+                    if part_hash.hexdigest() != stripe.part_md5:
+                        # Partly sent already, so the download can only be cut short
+                        raise Exception(
+                            f"MD5 mismatch in {self.object_name} before byte "
+                            f"{stripe.offset + stripe.length}"
+                        )
+                    part_hash = None
+            yield data
+
+    def close(self):
+        """Drop stripes that were fetched ahead but never read."""
+        for _, future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._buffered = 0
@@ -0,0 +1,149 @@
+"""
+HTTP transport for MinIO clients.
+Each node gets its own urllib3 pool built from the MINIO_TRANSPORT defaults
+and the optional ``transport`` overrides of its MINIO_NODES entry. Every
+request through the pool is timed into the node's load score and metrics.
+"""
+
+import os
+import socket
+import time
+
+import certifi
+import urllib3
+from django.conf import settings
+from urllib3.connection import HTTPConnection
+from urllib3.util import Retry, Timeout
+
+from core import tracing
+
+from .balancer import operation_name
+from .metrics import observe_request
+
+DEFAULT_TRANSPORT = {
+    "pool_size": 10,  # Connections kept per node; match worker threads
+    "pool_block": True,  # Wait for a free connection instead of opening extras
+    "pool_timeout": 10,  # Seconds to wait for a free connection when blocking
+    "connect_timeout": 3,
+    "read_timeout": 60,
+    "retries": 3,
+    "backoff_factor": 0.2,
+    "retry_statuses": (500, 502, 503, 504),
+    "keepalive": True,  # Enable TCP keep-alive probes on idle connections
+    "keepalive_idle": 60,
+    "keepalive_interval": 10,
+    "keepalive_count": 3,
+}
+
+
+class NodePoolManager(urllib3.PoolManager):
+    """PoolManager that bounds how long a request waits for a pooled connection
+    and records each request in the node's load score and metrics.
+    """
+
+    def __init__(self, pool_timeout=None, score=None, endpoint=None, **kwargs):
+        super().__init__(**kwargs)
+        self.pool_timeout = pool_timeout
+        self.score = score
+        self.endpoint = endpoint
+
+    def urlopen(self, method, url, redirect=True, **kw):
+        kw.setdefault("pool_timeout", self.pool_timeout)
+        if self.score is None:
+            return super().urlopen(method, url, redirect=redirect, **kw)
+
+        op = operation_name(method, url)
+        body = kw.get("body")
+        nbytes = len(body) if isinstance(body, (bytes, bytearray, memoryview)) else 0
+        started = self.score.begin()
+        try:
+            with tracing.span(f"minio.{op}", node=self.endpoint):
+                response = super().urlopen(method, url, redirect=redirect, **kw)
+        except Exception as e:
+            self.score.end(op, started, error=True)
+            observe_request(self.endpoint, op, time.monotonic() - started, error=e)
+            raise
+        # Streamed bodies are timed to the first byte; ObjectStream adds their bytes
+        error = response.status >= 500
+        self.score.end(op, started, nbytes, error=error)
+        observe_request(
+            self.endpoint,
+            op,
+            time.monotonic() - started,
+            nbytes,
+            f"HTTP{response.status}" if error else None,
+        )
+        return response
+
+
+def transport_options(overrides=None):
+    """Merge transport defaults, project settings and per-node overrides."""
+    options = dict(DEFAULT_TRANSPORT)
+    options.update(getattr(settings, "MINIO_TRANSPORT", {}))
+    options.update(overrides or {})
+    return options
+
+
+def _socket_options(options):
+    """Socket options for new connections, including TCP keep-alive."""
+    socket_options = list(HTTPConnection.default_socket_options)
+    if not options["keepalive"]:
+        return socket_options
+
+    socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    # The fine-grained keep-alive knobs are not available on every platform
+    for name, key in (
+        ("TCP_KEEPIDLE", "keepalive_idle"),
+        ("TCP_KEEPINTVL", "keepalive_interval"),
+        ("TCP_KEEPCNT", "keepalive_count"),
+    ):
+        if hasattr(socket, name):
+            socket_options.append((socket.IPPROTO_TCP, getattr(socket, name), options[key]))
+    return socket_options
+
+
+def build_http_client(options, score=None, endpoint=None):
+    """Build the pooled HTTP client used by a node's MinIO client."""
+    return NodePoolManager(
+        pool_timeout=options["pool_timeout"],
+        score=score,
+        endpoint=endpoint,
+        num_pools=4,
+        maxsize=options["pool_size"],
+        block=options["pool_block"],
+        timeout=Timeout(
+            connect=options["connect_timeout"],
+            read=options["read_timeout"],
+        ),
+        retries=Retry(
+            total=options["retries"],
+            backoff_factor=options["backoff_factor"],
+            status_forcelist=list(options["retry_statuses"]),
+        ),
+        socket_options=_socket_options(options),
+        cert_reqs="CERT_REQUIRED",
+        ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+    )
+
+
+def pool_stats(http_client, pool_size):
+    """Report connection pool utilisation for a PoolManager."""
+    stats = {
+        "pool_size": pool_size,
+        "in_use": 0,
+        "idle": 0,
+        "connections_opened": 0,
+        "requests": 0,
+    }
+    for key in list(http_client.pools.keys()):
+        pool = http_client.pools.get(key)
+        if pool is None or pool.pool is None:
+            continue
+        # The queue holds idle connections plus None placeholders for free slots
+        queued = list(pool.pool.queue)
+        stats["idle"] += sum(1 for conn in queued if conn is not None)
+        stats["in_use"] += max(0, pool_size - len(queued))
+        stats["connections_opened"] += pool.num_connections
+        stats["requests"] += pool.num_requests
+    stats["utilisation"] = round(stats["in_use"] / pool_size, 2) if pool_size else 0
+    return stats
@@ -4,6 +4,7 @@ import uuid
 
 from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
 
 from core.minio.filestat import convert_size
 
@@ -11,6 +12,12 @@ from core.minio.filestat import convert_size
 class FileMetadata(models.Model):
     """Model for storing file metadata and location information."""
 
+    STORAGE_MODE_CHOICES = [
+        ("OBJECT", "One object"),
+        ("CHUNKED", "Content-defined chunks"),
+        ("ERASURE", "Erasure-coded shards"),
+    ]
+
     id = models.UUIDField(default=uuid.uuid4, primary_key=True, editable=False)
     file_name = models.CharField(max_length=255)
     file_url = models.CharField(max_length=255, null=True, blank=True)
@@ -24,6 +31,11 @@ class FileMetadata(models.Model):
     location = models.CharField(max_length=255, null=True, blank=True)
     total_chunks = models.IntegerField(default=0)
     checksum = models.CharField(max_length=64, blank=True)
+    blob = models.ForeignKey(
+        "ContentBlob", on_delete=models.PROTECT, related_name="files", null=True, blank=True
+    )
+    storage_mode = models.CharField(max_length=10, choices=STORAGE_MODE_CHOICES, default="OBJECT")
+    object_key = models.CharField(max_length=255, blank=True)  # Empty: stored under file_name
 
     class Meta:
         ordering = ["-uploaded_at"]
@@ -41,6 +53,28 @@ class FileMetadata(models.Model):
         image_extensions = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
         return any(self.file_name.lower().endswith(ext) for ext in image_extensions)
 
+    @property
+    def is_chunked(self):
+        """Whether the file is stored as a manifest of shared chunks."""
+        return self.storage_mode == "CHUNKED"
+
+    @property
+    def is_erasure_coded(self):
+        """Whether the file is stored as Reed-Solomon shards across nodes."""
+        return self.storage_mode == "ERASURE"
+
+    @property
+    def is_single_object(self):
+        """Whether the file's bytes are one object, copied whole to each replica."""
+        return self.storage_mode == "OBJECT"
+
+    @property
+    def object_name(self):
+        """Name of the MinIO object holding the file's bytes."""
+        if self.blob_id:
+            return self.blob.object_name
+        return self.object_key or self.file_name
+
     def get_chunks_count(self):
         """Return the number of chunks for this file."""
         return self.chunks.count()
@@ -51,29 +85,186 @@ class FileMetadata(models.Model):
         return short_name
 
 
+class UploadSession(models.Model):
+    """Model for a resumable chunked upload backed by a MinIO multipart upload."""
+
+    STATUS_CHOICES = [
+        ("ACTIVE", "Active"),
+        ("COMPLETED", "Completed"),
+        ("ABORTED", "Aborted"),
+    ]
+    MODE_CHOICES = [
+        ("PROXY", "Chunks through the API"),
+        ("DIRECT", "Direct to storage"),
+        ("MANIFEST", "Missing chunks of a manifest"),
+    ]
+
+    id = models.UUIDField(default=uuid.uuid4, primary_key=True, editable=False)
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES, default="PROXY")
+    file_name = models.CharField(max_length=255)
+    file_size = models.IntegerField()
+    content_type = models.CharField(max_length=255, null=True, blank=True)
+    chunk_size = models.IntegerField()
+    total_chunks = models.IntegerField()
+    upload_id = models.CharField(max_length=255, blank=True)  # Empty for a single PUT
+    object_name = models.CharField(max_length=255, blank=True)  # The session's own key
+    node_endpoint = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="ACTIVE")
+    created_by = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="upload_sessions"
+    )
+    file_metadata = models.ForeignKey(
+        FileMetadata, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["created_by", "status"]),
+        ]
+
+    def __str__(self):
+        return f"Upload of {self.file_name} ({self.status})"
+
+    def get_chunk_size(self, chunk_index):
+        """Return the expected size of a chunk; only the last one may be short."""
+        if chunk_index == self.total_chunks - 1:
+            return self.file_size - self.chunk_size * (self.total_chunks - 1)
+        return self.chunk_size
+
+
 class FileChunk(models.Model):
     """Model for storing individual file chunks for large file uploads."""
 
     id = models.UUIDField(default=uuid.uuid4, primary_key=True, editable=False)
     file_metadata = models.ForeignKey(
-        FileMetadata, on_delete=models.CASCADE, related_name="chunks"
+        FileMetadata, on_delete=models.CASCADE, related_name="chunks", null=True, blank=True
+    )
+    upload_session = models.ForeignKey(
+        UploadSession, on_delete=models.CASCADE, related_name="chunks", null=True, blank=True
     )
     chunk_index = models.IntegerField()
     chunk_file = models.CharField(max_length=255, null=True, blank=True)
     chunk_size = models.IntegerField(null=True, blank=True)
     etag = models.CharField(max_length=255, null=True, blank=True)
+    # Set for chunks of a CHUNKED file, which are stored once per content hash
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    offset = models.BigIntegerField(null=True, blank=True)
+    blob = models.ForeignKey(
+        "ContentBlob", on_delete=models.PROTECT, related_name="chunk_refs", null=True, blank=True
+    )
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["chunk_index"]
-        unique_together = ("file_metadata", "chunk_index")
+        unique_together = (
+            ("file_metadata", "chunk_index"),
+            ("upload_session", "chunk_index"),
+        )
         indexes = [
             models.Index(fields=["file_metadata", "chunk_index"]),
         ]
 
     def __str__(self):
-        return f"Chunk {self.chunk_index} of {self.file_metadata.file_name}"
+        owner = self.file_metadata or self.upload_session
+        return f"Chunk {self.chunk_index} of {owner.file_name}"
 
     def get_size_display(self):
         """Return human-readable size."""
         return convert_size(self.chunk_size)
+
+
+class ObjectReplica(models.Model):
+    """Model recording which node holds a copy of a file's object."""
+
+    STATE_CHOICES = [
+        ("PRESENT", "Present"),
+        ("PENDING", "Pending"),
+        ("MISSING", "Missing"),
+    ]
+
+    id = models.UUIDField(default=uuid.uuid4, primary_key=True, editable=False)
+    file_metadata = models.ForeignKey(
+        FileMetadata, on_delete=models.CASCADE, related_name="replicas"
+    )
+    node_endpoint = models.CharField(max_length=255)
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default="PRESENT")
+    etag = models.CharField(max_length=255, blank=True)
+    verified_at = models.DateTimeField(null=True, blank=True)
+    queued_at = models.DateTimeField(null=True, blank=True)  # When a background copy was requested
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("file_metadata", "node_endpoint")
+        indexes = [
+            models.Index(fields=["node_endpoint", "state"]),
+        ]
+
+    def __str__(self):
+        return f"{self.file_metadata.file_name} on {self.node_endpoint} ({self.state})"
+
+    @property
+    def lag(self):
+        """Seconds a queued copy took, or has been waiting so far, or None."""
+        if self.queued_at is None:
+            return None
+        if self.state == "PENDING" or self.verified_at is None:
+            return (timezone.now() - self.queued_at).total_seconds()
+        return max((self.verified_at - self.queued_at).total_seconds(), 0.0)
+
+
+class ContentBlob(models.Model):
+    """Model for a stored object shared by every file with the same content."""
+
+    id = models.UUIDField(default=uuid.uuid4, primary_key=True, editable=False)
+    sha256 = models.CharField(max_length=64, unique=True)
+    object_name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    etag = models.CharField(max_length=255, blank=True)
+    checksum = models.CharField(max_length=64, blank=True)
+    total_chunks = models.IntegerField(default=1)
+    node_endpoint = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Blob {self.sha256[:12]}"
+
+
+class ErasureLayout(models.Model):
+    """Model for the Reed-Solomon parameters of an erasure-coded file."""
+
+    id = models.UUIDField(default=uuid.uuid4, primary_key=True, editable=False)
+    file_metadata = models.OneToOneField(
+        FileMetadata, on_delete=models.CASCADE, related_name="erasure"
+    )
+    data_shards = models.PositiveSmallIntegerField()
+    parity_shards = models.PositiveSmallIntegerField()
+    block_size = models.IntegerField()  # Bytes of each shard per block
+
+    def __str__(self):
+        return f"{self.file_metadata.file_name} as {self.data_shards}+{self.parity_shards} shards"
+
+
+class ErasureShard(models.Model):
+    """Model for one shard of an erasure-coded file and the node holding it."""
+
+    id = models.UUIDField(default=uuid.uuid4, primary_key=True, editable=False)
+    layout = models.ForeignKey(ErasureLayout, on_delete=models.CASCADE, related_name="shards")
+    shard_index = models.PositiveSmallIntegerField()  # Data shards first, then parity
+    node_endpoint = models.CharField(max_length=255)
+    object_name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    etag = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ["shard_index"]
+        unique_together = ("layout", "shard_index")
+
+    def __str__(self):
+        return f"Shard {self.shard_index} of {self.layout.file_metadata.file_name} on {self.node_endpoint}"
+
+    @property
+    def is_parity(self):
+        return self.shard_index >= self.layout.data_shards
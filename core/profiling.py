@@ -0,0 +1,280 @@
+"""
+Request profiling.
+``ProfilingMiddleware`` profiles a random fraction of requests, and every
+request slower than a threshold, together with its DB queries. Profiles are
+written to a directory that keeps only the newest ones and are listed for
+staff in the monitoring app.
+
+Two profilers are available. ``sampling`` (the default) has a background
+thread record the request thread's stack every few milliseconds, cheap
+enough to run on every request so that slow ones can be kept; the result is
+a folded-stacks file for flame graph tools. ``cprofile`` records every call
+with cProfile into a ``.prof`` file for pstats or snakeviz, at a much higher
+cost, so it is best combined with a low sample rate.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+
+DEFAULT_PROFILING = {
+    "enabled": False,
+    "mode": "sampling",  # "sampling" or "cprofile"
+    "sample_rate": 0.0,  # Fraction of requests profiled and kept
+    "slow_threshold": None,  # Seconds; slower requests are kept (None: only sampled ones)
+    "interval": 0.005,  # Seconds between stack samples in sampling mode
+    "dir": None,  # Defaults to BASE_DIR / "profiles"
+    "keep": 100,  # Newest profiles kept
+    "top_queries": 20,  # Distinct queries listed, by total time
+}
+
+# Start time to the millisecond, so ids sort oldest first, then a random suffix
+PROFILE_ID = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9]{3}-[0-9a-f]{8}$")
+DATA_SUFFIXES = {"sampling": ".folded", "cprofile": ".prof"}
+
+
+def profiling_options():
+    """Profiling settings merged over the defaults."""
+    options = dict(DEFAULT_PROFILING)
+    options.update(getattr(settings, "PROFILING", {}))
+    if not options["dir"]:
+        options["dir"] = os.path.join(settings.BASE_DIR, "profiles")
+    return options
+
+
+class StackSampler:
+    """Background thread sampling the stacks of registered threads."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._samples = {}  # thread ident: Counter of folded stacks
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def start(self, ident):
+        with self._lock:
+            self._samples[ident] = Counter()
+            # Threads do not survive a fork, so each worker runs its own sampler
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name="profile-sampler", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self, ident):
+        """Stop sampling a thread and return its ``{folded stack: count}``."""
+        with self._lock:
+            return self._samples.pop(ident, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._samples:
+                    self._thread = None  # Idle; the next start() runs a new thread
+                    return
+                frames = sys._current_frames()
+                for ident, samples in self._samples.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[_fold(frame)] += 1
+
+
+def _fold(frame):
+    """A stack as ``outer;...;inner`` function names, the folded-stacks format."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        location = f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}"
+        names.append(f"{code.co_name} ({location})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler(interval):
+    """The process's stack sampler."""
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = StackSampler(interval)
+        return _sampler
+
+
+class QueryLog:
+    """DB execute wrapper counting and timing a request's queries."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.by_sql = {}  # sql: [count, seconds]
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            entry = self.by_sql.setdefault(sql, [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def summary(self, top):
+        slowest = sorted(self.by_sql.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            "count": self.count,
+            "duration_ms": round(self.seconds * 1000, 3),
+            "distinct": len(self.by_sql),
+            "top": [
+                {"sql": sql[:1000], "count": count, "duration_ms": round(seconds * 1000, 3)}
+                for sql, (count, seconds) in slowest[:top]
+            ],
+        }
+
+
+class RequestProfile:
+    """Profile of one request, started before the view and stopped after it."""
+
+    def __init__(self, options):
+        self.options = options
+        self.mode = "cprofile" if options["mode"] == "cprofile" else "sampling"
+        self.queries = QueryLog()
+        self._profiler = None
+        self._samples = None
+
+    def start(self):
+        if self.mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            try:
+                self._profiler.enable()
+                return
+            except ValueError:
+                # Python 3.12+ allows one cProfile at a time; sample this request instead
+                self._profiler = None
+                self.mode = "sampling"
+        get_sampler(self.options["interval"]).start(threading.get_ident())
+
+    def stop(self):
+        if self._profiler is not None:
+            self._profiler.disable()
+        else:
+            self._samples = get_sampler(self.options["interval"]).stop(threading.get_ident())
+
+    def _top_functions(self):
+        """Text summary: the costliest functions of the profile."""
+        if self._profiler is not None:
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(30)
+            return out.getvalue()
+        # Leaf functions by number of samples they were running in
+        leaves = Counter()
+        for stack, count in self._samples.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return "\n".join(
+            f"{count:6d} {count * 100 / total:5.1f}%  {name}"
+            for name, count in leaves.most_common(30)
+        )
+
+    def save(self, request, response, duration, reason):
+        """Write the profile data and its metadata; returns the profile id."""
+        directory = self.options["dir"]
+        os.makedirs(directory, exist_ok=True)
+        now = time.time()
+        profile_id = "{}-{:03d}-{}".format(
+            time.strftime("%Y%m%d-%H%M%S", time.localtime(now)),
+            int(now * 1000) % 1000,
+            uuid.uuid4().hex[:8],
+        )
+        data_path = os.path.join(directory, profile_id + DATA_SUFFIXES[self.mode])
+        if self._profiler is not None:
+            self._profiler.dump_stats(data_path)
+        else:
+            with open(data_path, "w") as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in self._samples.items())
+
+        meta = {
+            "id": profile_id,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "method": request.method,
+            "path": request.get_full_path()[:500],
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 3),
+            "reason": reason,
+            "mode": self.mode,
+            "queries": self.queries.summary(self.options["top_queries"]),
+            "top_functions": self._top_functions(),
+        }
+        with open(os.path.join(directory, profile_id + ".json"), "w") as f:
+            json.dump(meta, f, indent=1)
+        rotate_profiles(directory, self.options["keep"])
+        return profile_id
+
+
+def rotate_profiles(directory, keep):
+    """Delete every file of all but the ``keep`` newest profiles."""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    ids = sorted({
+        name.split(".", 1)[0] for name in names if PROFILE_ID.match(name.split(".", 1)[0])
+    })
+    stale = set(ids[:-keep] if keep else ids)
+    for name in names:
+        if name.split(".", 1)[0] in stale:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def list_profiles(options=None):
+    """Metadata of the stored profiles, newest first."""
+    directory = (options or profiling_options())["dir"]
+    try:
+        names = sorted(os.listdir(directory), reverse=True)
+    except OSError:
+        return []
+    profiles = []
+    for name in names:
+        profile_id, _, suffix = name.partition(".")
+        if suffix != "json" or not PROFILE_ID.match(profile_id):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # Rotated away or half written
+    return profiles
+
+
+def profile_file(profile_id, kind, options=None):
+    """Path of a profile's ``"meta"`` or ``"data"`` file, or None if unknown."""
+    if not PROFILE_ID.match(profile_id or "") or kind not in ("meta", "data"):
+        return None
+    directory = (options or profiling_options())["dir"]
+    suffixes = [".json"] if kind == "meta" else list(DATA_SUFFIXES.values())
+    for suffix in suffixes:
+        path = os.path.join(directory, profile_id + suffix)
+        if os.path.isfile(path):
+            return path
+    return None
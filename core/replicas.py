@@ -0,0 +1,159 @@
+"""Service layer for the object replica index."""
+
+import logging
+from typing import Dict, List, Optional
+
+from django.utils import timezone
+
+from core.minio import metrics
+from core.minio.balancer import prefer
+from core.minio.node import Node, node_manager
+from core.minio.replicas import replica_status
+from core.minio.storage import minio_remove
+
+from .models import FileMetadata, ObjectReplica
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaService:
+    """Record which nodes hold each file so reads never have to probe storage.
+
+    Rows are written by the paths that change storage (upload, replication,
+    repair, delete). Reads use ``file_metadata.replicas.all()``, so callers
+    can prefetch the rows for a whole page.
+    """
+
+    @staticmethod
+    def record(
+        file_metadata: FileMetadata, node_endpoint: str, etag: str = "", state: str = "PRESENT"
+    ) -> ObjectReplica:
+        """Create or update the replica row for a file on a node."""
+        replica, _ = ObjectReplica.objects.update_or_create(
+            file_metadata=file_metadata,
+            node_endpoint=node_endpoint,
+            defaults={
+                "state": state,
+                "etag": etag or "",
+                "verified_at": timezone.now() if state == "PRESENT" else None,
+            },
+        )
+        return replica
+
+    @staticmethod
+    def mark_missing(file_metadata: FileMetadata, node_endpoint: str) -> None:
+        """Record that a node was found not to hold the file."""
+        ObjectReplica.objects.update_or_create(
+            file_metadata=file_metadata,
+            node_endpoint=node_endpoint,
+            defaults={"state": "MISSING", "verified_at": timezone.now()},
+        )
+
+    @staticmethod
+    def mark_pending(file_metadata: FileMetadata, node_endpoint: str) -> None:
+        """Record that a copy to a node has been queued."""
+        ObjectReplica.objects.update_or_create(
+            file_metadata=file_metadata,
+            node_endpoint=node_endpoint,
+            defaults={"state": "PENDING", "verified_at": None, "queued_at": timezone.now()},
+        )
+
+    @classmethod
+    def reconcile(cls, file_metadata: FileMetadata, observed: Dict[str, bool]) -> None:
+        """Correct the index from ``{endpoint: present}`` seen on the nodes.
+
+        Rows that already agree are left alone, and pending rows are not
+        marked missing while their copy may still be in flight.
+        """
+        replicas = {replica.node_endpoint: replica for replica in file_metadata.replicas.all()}
+        for endpoint, present in observed.items():
+            replica = replicas.get(endpoint)
+            if present and (replica is None or replica.state != "PRESENT"):
+                cls.record(file_metadata, endpoint, file_metadata.etag)
+            elif not present and replica is not None and replica.state == "PRESENT":
+                cls.mark_missing(file_metadata, endpoint)
+
+    @staticmethod
+    def locations(file_metadata: FileMetadata, include_pending: bool = False) -> List[str]:
+        """Endpoints of the nodes holding the file, and those being copied to."""
+        states = ("PRESENT", "PENDING") if include_pending else ("PRESENT",)
+        return [
+            replica.node_endpoint
+            for replica in file_metadata.replicas.all()
+            if replica.state in states
+        ]
+
+    @staticmethod
+    def lag(file_metadata: FileMetadata) -> Optional[float]:
+        """Longest replication lag of the file's queued copies, in seconds."""
+        lags = [
+            replica.lag for replica in file_metadata.replicas.all() if replica.queued_at
+        ]
+        return max(lags) if lags else None
+
+    @classmethod
+    def read_nodes(cls, file_metadata: FileMetadata) -> List[Node]:
+        """Healthy nodes holding the file, the least loaded of two first.
+
+        The power-of-two-choices pick leads and the others follow in the
+        object's placement order. Falls back to every healthy node in
+        placement order when the index has no healthy replica, e.g. for
+        files stored before the index existed.
+        """
+        ordered = node_manager.get_read_order(file_metadata.object_name)
+        if not ordered:
+            raise Exception("No active MinIO nodes available.")
+        endpoints = set(cls.locations(file_metadata))
+        holders = [node for node in ordered if node.endpoint in endpoints]
+        return prefer(holders) if holders else ordered
+
+    @classmethod
+    def status(cls, file_metadata: FileMetadata) -> List[Dict]:
+        """Per-node status of a file, in the format of ``replica_status``.
+
+        Files without index rows are probed once and the answers recorded.
+        Chunked and erasure-coded files have no single object and report
+        no nodes.
+        """
+        if not file_metadata.is_single_object:
+            return []
+        replicas = {replica.node_endpoint: replica for replica in file_metadata.replicas.all()}
+        if not replicas:
+            statuses = replica_status(file_metadata.object_name)
+            for entry in statuses:
+                if entry["status"] == 200:
+                    cls.record(file_metadata, entry["endpoint"], file_metadata.etag)
+                elif entry["status"] == 404:
+                    cls.mark_missing(file_metadata, entry["endpoint"])
+            return statuses
+
+        statuses = []
+        for node in node_manager.get_all_nodes():
+            replica = replicas.get(node.endpoint)
+            status, preview_url = 404, None
+            if replica is not None and replica.state == "PRESENT":
+                status = 200 if node.is_healthy else 503
+            if status == 200:
+                with metrics.timed(node.endpoint, "presign"):
+                    preview_url = node.client.presigned_get_object(
+                        node.bucket_name, file_metadata.object_name
+                    )
+            statuses.append({
+                "endpoint": node.endpoint,
+                "region": node.region,
+                "status": status,
+                "preview_url": preview_url,
+                "verified_at": replica.verified_at if replica else None,
+            })
+        return statuses
+
+    @staticmethod
+    def remove_objects(object_name: str, endpoints: List[str]) -> None:
+        """Remove an object from every node in ``endpoints``."""
+        if not endpoints:
+            minio_remove(object_name)
+        for endpoint in endpoints:
+            try:
+                minio_remove(object_name, endpoint)
+            except Exception as e:
+                logger.warning(f"Error removing {object_name} from {endpoint}: {e}")
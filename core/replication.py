@@ -0,0 +1,221 @@
+"""Service layer for replicating files across their placement nodes."""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import List, Optional
+
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.minio.node import Node, node_manager
+from core.minio.replication import copy_object, get_executor, replication_options
+
+from . import tracing
+from .models import FileMetadata, ObjectReplica
+from .replicas import ReplicaService
+
+logger = logging.getLogger(__name__)
+
+
+class QuorumNotReached(Exception):
+    """Fewer than ``write_quorum`` copies of a new file could be stored."""
+
+
+class ReplicationService:
+    """Copy each file to every node its key is placed on.
+
+    A new file is copied synchronously until ``write_quorum`` nodes hold it,
+    so upload latency depends on the quorum rather than the replica count.
+    The remaining placement nodes are recorded as PENDING, with the time
+    they were queued, and filled in by the background queue. Copies still
+    pending after ``stale_after`` seconds are queued again by
+    ``requeue_stale``.
+    """
+
+    @staticmethod
+    def _sources(file_metadata: FileMetadata) -> List[Node]:
+        """Healthy nodes holding the file, in placement order."""
+        present = set(ReplicaService.locations(file_metadata))
+        return [
+            node
+            for node in node_manager.get_read_order(file_metadata.object_name)
+            if node.endpoint in present
+        ]
+
+    @staticmethod
+    def _copy(object_name: str, target: Node, sources: List[Node]) -> str:
+        """Copy to ``target`` from the first source that works; returns the ETag."""
+        error = None
+        for source in sources:
+            try:
+                return copy_object(source, target, object_name)
+            except Exception as e:
+                error = e
+                logger.warning(
+                    f"Copy of {object_name} from {source.endpoint} to {target.endpoint} failed: {e}"
+                )
+        raise error or Exception(f"No healthy node holds {object_name}.")
+
+    @staticmethod
+    def _record(file_metadata: FileMetadata, endpoint: str, etag: str) -> None:
+        """Record a copy for every file stored in the same object."""
+        files = (
+            FileMetadata.objects.filter(blob_id=file_metadata.blob_id)
+            if file_metadata.blob_id
+            else [file_metadata]
+        )
+        for file_obj in files:
+            ReplicaService.record(file_obj, endpoint, etag)
+
+    @classmethod
+    def replicate_on_write(cls, file_metadata: FileMetadata) -> int:
+        """Copy a newly stored file until the write quorum holds it.
+
+        Copies for the quorum run in parallel, moving down the key's node
+        order past failures. Other placement nodes are queued. Returns the
+        number of nodes holding the file and raises QuorumNotReached when
+        that is below ``write_quorum``.
+        """
+        options = replication_options()
+        object_name = file_metadata.object_name
+        quorum = min(options["write_quorum"], len(node_manager.get_all_nodes()))
+        sources = cls._sources(file_metadata)
+        stored = len(sources)
+
+        present = {node.endpoint for node in sources}
+        candidates = [
+            node
+            for node in node_manager.get_read_order(object_name)
+            if node.endpoint not in present
+        ]
+        while stored < quorum and candidates and sources:
+            batch, candidates = candidates[: quorum - stored], candidates[quorum - stored :]
+            # Own threads, so queued background copies never hold up an upload
+            with ThreadPoolExecutor(
+                max_workers=len(batch), thread_name_prefix="minio-quorum"
+            ) as executor:
+                futures = {
+                    node: executor.submit(
+                        tracing.bind(cls._copy), object_name, node, sources
+                    )
+                    for node in batch
+                }
+            for node, future in futures.items():
+                try:
+                    etag = future.result()
+                except Exception:
+                    continue
+                cls._record(file_metadata, node.endpoint, etag)
+                present.add(node.endpoint)
+                stored += 1
+
+        if stored < quorum:
+            raise QuorumNotReached(
+                f"Only {stored} of {quorum} required copies of {object_name} could be stored."
+            )
+
+        cls.enqueue(
+            file_metadata,
+            [
+                node.endpoint
+                for node in node_manager.get_placement(object_name)
+                if node.endpoint not in present
+            ],
+        )
+        return stored
+
+    @classmethod
+    def enqueue(cls, file_metadata: FileMetadata, endpoints: List[str]) -> None:
+        """Queue background copies of a file to ``endpoints``."""
+        if not endpoints:
+            return
+        for endpoint in endpoints:
+            ReplicaService.mark_pending(file_metadata, endpoint)
+
+        options = replication_options()
+        file_id = str(file_metadata.id)
+
+        def dispatch():
+            for endpoint in endpoints:
+                if options["queue"] == "celery":
+                    from .tasks import replicate_file
+
+                    replicate_file.delay(file_id, endpoint)
+                else:
+                    get_executor(options["workers"]).submit(cls.run_copy, file_id, endpoint)
+
+        # Workers must see the file's rows, so nothing is sent before commit
+        transaction.on_commit(dispatch)
+
+    @classmethod
+    def requeue_stale(cls, stale_after: Optional[float] = None) -> int:
+        """Queue again every copy pending for longer than ``stale_after`` seconds.
+
+        Queued copies are lost when a worker restarts, and a copy that used
+        up its retries stays pending. Returns the number of copies queued.
+        """
+        if stale_after is None:
+            stale_after = replication_options()["stale_after"]
+        cutoff = timezone.now() - timedelta(seconds=stale_after)
+        stale = ObjectReplica.objects.filter(state="PENDING").filter(
+            Q(queued_at__lt=cutoff) | Q(queued_at__isnull=True)
+        )
+        endpoints = {}
+        for file_id, endpoint in stale.values_list("file_metadata_id", "node_endpoint"):
+            endpoints.setdefault(file_id, []).append(endpoint)
+
+        for file_metadata in FileMetadata.objects.filter(id__in=endpoints):
+            cls.enqueue(file_metadata, endpoints[file_metadata.id])
+        return sum(len(queued) for queued in endpoints.values())
+
+    @classmethod
+    def replicate(cls, file_id: str, endpoint: str) -> bool:
+        """Copy a file to one node unless it already holds it.
+
+        Returns False when the copy should be retried later.
+        """
+        file_metadata = (
+            FileMetadata.objects.select_related("blob")
+            .prefetch_related("replicas")
+            .filter(id=file_id)
+            .first()
+        )
+        if file_metadata is None:
+            return True  # Deleted while queued
+
+        if endpoint in ReplicaService.locations(file_metadata):
+            return True
+        target = node_manager.get_node(endpoint)
+        if target is None:
+            return True
+        if not target.is_healthy:
+            return False
+
+        try:
+            etag = cls._copy(file_metadata.object_name, target, cls._sources(file_metadata))
+        except Exception:
+            return False
+        cls._record(file_metadata, endpoint, etag)
+        return True
+
+    @classmethod
+    def run_copy(cls, file_id: str, endpoint: str) -> None:
+        """Background copy for the in-process queue, retried with backoff."""
+        options = replication_options()
+        delay = options["retry_backoff"]
+        close_old_connections()
+        try:
+            for attempt in range(options["retries"]):
+                if cls.replicate(file_id, endpoint):
+                    return
+                if attempt + 1 < options["retries"]:
+                    time.sleep(delay)
+                    delay *= 2
+            logger.warning(f"Giving up on copying {file_id} to {endpoint}; it stays pending.")
+        except Exception:
+            logger.exception(f"Copy of {file_id} to {endpoint} failed")
+        finally:
+            close_old_connections()
@@ -1,59 +1,92 @@
 """Service layer for file operations."""
 
+import re
+import uuid
 from typing import Dict, List, Optional, Tuple, Union
 
-import requests
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 from django.core.paginator import Paginator
 from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.text import get_valid_filename
 
-from core.minio.node import node_manager
+from core.minio.presign import presigned_urls
 from core.minio.storage import minio_remove, minio_upload
 
+from . import tracing
+from .blobs import BlobService
+from .chunks import ChunkStoreService
+from .erasure import ErasureService
 from .models import FileChunk, FileMetadata
+from .replicas import ReplicaService
+from .replication import QuorumNotReached, ReplicationService
 
 
 class FileService:
     """Service for handling file operations."""
 
-    @staticmethod
-    def validate_file(file_obj) -> List[str]:
+    MAX_FILE_SIZE = 500 * 1024 * 1024  # 500MB
+    MAX_FILENAME_LENGTH = 128
+    MAX_BATCH_FILES = 100
+
+    @classmethod
+    def validate_file(cls, file_obj) -> List[str]:
         """Validate file size and name length."""
-        MAX_FILE_SIZE = 500 * 1024 * 1024  # 500MB
-        MAX_FILENAME_LENGTH = 128
+        return cls.validate(file_obj.name, file_obj.size)
+
+    @classmethod
+    def validate(cls, name: str, size: int) -> List[str]:
+        """Validate a file name and size before anything is stored."""
         errors = []
 
-        if len(file_obj.name) > MAX_FILENAME_LENGTH:
-            errors.append(f"File name exceeds {MAX_FILENAME_LENGTH} characters.")
+        if len(name) > cls.MAX_FILENAME_LENGTH:
+            errors.append(f"File name exceeds {cls.MAX_FILENAME_LENGTH} characters.")
 
-        if file_obj.size > MAX_FILE_SIZE:
-            errors.append(f"File size exceeds {MAX_FILE_SIZE / (1024 * 1024)}MB limit.")
+        if size > cls.MAX_FILE_SIZE:
+            errors.append(f"File size exceeds {cls.MAX_FILE_SIZE / (1024 * 1024)}MB limit.")
 
         return errors
 
     @classmethod
+    @tracing.traced("file_service.upload_file")
     def upload_file(cls, file_obj, user: User) -> Tuple[FileMetadata, List[FileChunk]]:
         """Handle file upload and create metadata records."""
+        # Files streamed by MinioUploadHandler are already stored in MinIO
+        upload_result = getattr(file_obj, "upload_result", None)
+        if upload_result:
+            file_obj.claimed = True  # Its object is kept or removed from here on
+
         # Validate file
         errors = cls.validate_file(file_obj)
         if errors:
+            if upload_result:
+                minio_remove(upload_result[0], upload_result[7])
             raise ValueError(errors[0])
 
         # Upload to MinIO
-        file_name, file_url, etag, chunk_count, chunk_parts, checksum, is_valid = (
-            minio_upload(file_obj)
-        )
+        (
+            object_name,
+            file_url,
+            etag,
+            chunk_count,
+            chunk_parts,
+            checksum,
+            is_valid,
+            node_endpoint,
+            sha256,
+        ) = upload_result or minio_upload(file_obj)
 
         if not is_valid:
-            minio_remove(file_name)
+            if object_name:
+                minio_remove(object_name, node_endpoint)
             raise ValueError("Integrity check failed! Please try again.")
         else:
             # Create metadata record
             file_metadata = FileMetadata.objects.create(
-                file_name=file_name,
+                file_name=get_valid_filename(file_obj.name),
+                object_key=object_name,
                 file_url=file_url,
                 file_size=file_obj.size,
                 etag=etag,
@@ -63,6 +96,11 @@ class FileService:
                 content_type=file_obj.content_type,
                 checksum=checksum,
             )
+            ReplicaService.record(file_metadata, node_endpoint, etag)
+            if sha256:
+                # Identical content already stored is shared instead of kept twice
+                BlobService.attach(file_metadata, sha256, node_endpoint)
+            cls.replicate(file_metadata)
 
             chunks = []
             if chunk_count > 1:
@@ -78,7 +116,45 @@ class FileService:
 
             return file_metadata, chunks
 
+    @classmethod
+    @tracing.traced("file_service.replicate")
+    def replicate(cls, file_metadata: FileMetadata) -> None:
+        """Copy a new file to its write quorum, deleting it if that fails."""
+        try:
+            ReplicationService.replicate_on_write(file_metadata)
+        except QuorumNotReached:
+            cls.delete_file(file_metadata.id, file_metadata.uploaded_by)
+            raise
+
+    @classmethod
+    @tracing.traced("file_service.upload_by_hash")
+    def upload_by_hash(
+        cls,
+        user: User,
+        file_name: str,
+        file_size: int,
+        sha256: str,
+        content_type: Optional[str] = None,
+    ) -> Optional[FileMetadata]:
+        """Create a file from content that is already stored, without its bytes.
+
+        Only content the user already stores can be linked this way. Returns
+        None when none matches ``sha256`` and ``file_size``, in which case the
+        client uploads the file as usual.
+        """
+        errors = cls.validate(file_name, file_size)
+        if errors:
+            raise ValueError(errors[0])
+        if not re.fullmatch(r"[0-9a-fA-F]{64}", sha256 or ""):
+            raise ValueError("sha256 must be a hex-encoded SHA-256 digest.")
+
+        blob = BlobService.find(sha256, file_size, user)
+        if blob is None:
+            return None
+        return BlobService.link(blob, user, get_valid_filename(file_name), content_type)
+
     @staticmethod
+    @tracing.traced("file_service.delete_file")
     def delete_file(file_id: str, user: User) -> None:
         """Delete file and related chunks."""
         file_obj = FileMetadata.objects.get(id=file_id)
@@ -86,16 +162,25 @@ class FileService:
         if file_obj.uploaded_by != user and not user.is_staff:
             raise PermissionDenied("Unauthorized access")
 
-        chunks = FileChunk.objects.filter(file_metadata=file_obj)
-        for chunk in chunks:
-            minio_remove(chunk.chunk_file)
-            chunk.delete()
+        if file_obj.is_chunked:
+            presigned_urls.invalidate(file_obj.id)
+            ChunkStoreService.remove_chunks(ChunkStoreService.release(file_obj))
+            return
+        if file_obj.is_erasure_coded:
+            ErasureService.delete(file_obj)
+            return
 
+        # Chunks are parts of the one object, so they go with the file's row
         if file_obj.file_name:
-            minio_remove(file_obj.file_name)
-            file_obj.delete()
+            presigned_urls.invalidate(file_obj.id)
+            # Copies still queued may land, so their nodes are cleaned too
+            endpoints = ReplicaService.locations(file_obj, include_pending=True)
+            object_name = BlobService.release(file_obj)
+            if object_name:
+                ReplicaService.remove_objects(object_name, endpoints)
 
     @staticmethod
+    @tracing.traced("file_service.get_file_details")
     def get_file_details(file_id: str, user: User) -> FileMetadata:
         """Get file details with permission check."""
         file_obj = FileMetadata.objects.get(id=file_id)
@@ -104,6 +189,7 @@ class FileService:
         return file_obj
 
     @staticmethod
+    @tracing.traced("file_service.list_files")
     def list_files(
         user: User, page: int = 1, per_page: int = 20
     ) -> Tuple[List[FileMetadata], int]:
@@ -114,7 +200,7 @@ class FileService:
             else FileMetadata.objects.select_related("uploaded_by").filter(
                 uploaded_by=user
             )
-        )
+        ).prefetch_related("replicas")
 
         paginator = Paginator(uploads_list, per_page)
         page_obj = paginator.get_page(page)
@@ -122,65 +208,83 @@ class FileService:
 
         return page_obj, total
 
+    @classmethod
+    @tracing.traced("file_service.get_files_batch")
+    def get_files_batch(
+        cls, file_ids: List[str], user: User, include_urls: bool = True
+    ) -> Tuple[List[FileMetadata], List[str], Dict]:
+        """Get many files in one query, with their presigned download URLs.
+
+        Returns the files in request order, the IDs that were not found or
+        not accessible, and ``{file_id: url}``.
+        """
+        if len(file_ids) > cls.MAX_BATCH_FILES:
+            raise ValueError(f"At most {cls.MAX_BATCH_FILES} files can be requested at once.")
+
+        ids = []
+        for file_id in file_ids:
+            try:
+                ids.append(uuid.UUID(str(file_id)))
+            except ValueError:
+                raise ValueError(f"Invalid file ID: {file_id}")
+
+        files = (
+            FileMetadata.objects.select_related("uploaded_by")
+            .prefetch_related("replicas")
+            .filter(id__in=ids)
+        )
+        if not user.is_staff:
+            files = files.filter(uploaded_by=user)
+        found = {file_obj.id: file_obj for file_obj in files}
+
+        ordered = [found[file_id] for file_id in dict.fromkeys(ids) if file_id in found]
+        missing = [str(file_id) for file_id in dict.fromkeys(ids) if file_id not in found]
+        urls = cls.presign_files(ordered) if include_urls else {}
+        return ordered, missing, urls
+
+    @staticmethod
+    @tracing.traced("file_service.presign_files")
+    def presign_files(files: List[FileMetadata]) -> Dict:
+        """Presigned download URLs for files already loaded, as ``{file_id: url}``.
+
+        Prefetch ``replicas`` on the files to sign on a node holding each one
+        without extra queries.
+        """
+        if not files:
+            return {}
+        urls = presigned_urls.get_many(
+            (file_obj.id, file_obj.object_name, ReplicaService.locations(file_obj))
+            for file_obj in files
+            if file_obj.is_single_object
+        )
+        for file_obj in files:
+            if not file_obj.is_single_object:
+                # No single object to sign; the API assembles it
+                urls[file_obj.id] = reverse("api:stream_file", args=[file_obj.id])
+        return urls
+
     @staticmethod
+    @tracing.traced("file_service.download_file")
     def download_file(file_id: str, user: User) -> Union[HttpResponse, str]:
-        """Download file from the least loaded node, returning a presigned URL."""
+        """Download file from the first healthy node holding it, returning a presigned URL."""
         file_obj = FileMetadata.objects.get(id=file_id)
         if file_obj.uploaded_by != user and not user.is_staff:
             raise PermissionDenied("Unauthorized access")
 
-        cache_key = f"presigned_url_{file_id}"
-        presigned_url = cache.get(cache_key)
-
-        if presigned_url:
-            response = requests.get(presigned_url, stream=True)
-            status_code = response.status_code
-            response.close()  # Close stream to prevent full download
-            if status_code == 200:
-                return presigned_url
-
-        # Get the least loaded node
-        node = node_manager.get_least_loaded_node()
-        if not node:
-            raise Exception("No active MinIO nodes available.")
+        if not file_obj.is_single_object:
+            return reverse("api:stream_file", args=[file_obj.id])
 
-        # Generate presigned URL from the least loaded node's client
-        presigned_url = node.client.presigned_get_object(
-            node.bucket_name, file_obj.file_name
+        # Served from the cache without any network call until shortly before expiry
+        return presigned_urls.get(
+            file_obj.id, file_obj.object_name, ReplicaService.locations(file_obj)
         )
-        cache.set(cache_key, presigned_url, 3600)  # Cache for 1 hour
-
-        return presigned_url
 
     @staticmethod
-    def preview_urls(file_id: str, user: User) -> Union[HttpResponse, List]:
-        """Download file from the least loaded node, returning a presigned URL."""
+    @tracing.traced("file_service.preview_urls")
+    def preview_urls(file_id: str, user: User) -> List[Dict]:
+        """Per-node status of the file from the replica index, with preview URLs."""
         file_obj = FileMetadata.objects.get(id=file_id)
         if file_obj.uploaded_by != user and not user.is_staff:
             raise PermissionDenied("Unauthorized access")
 
-        presigned_urls = []
-
-        for node in node_manager.get_all_nodes():
-            try:
-                # Generate presigned URL from the least loaded node's client
-                presigned_url = node.client.presigned_get_object(
-                    node.bucket_name, file_obj.file_name
-                )
-                # Check if the file exists by making a HEAD request
-                response = requests.head(presigned_url, timeout=5)
-                file_status = response.status_code  # 200 if exists, 404 if not found
-
-                presigned_urls.append({
-                        "preview_url": presigned_url,
-                        "status": file_status,
-                        "region": node.region,
-                })
-            except:
-                presigned_urls.append({
-                    "preview_url": None,
-                    "status": 404,  # Assume 404 if there's an error
-                    "region": node.region,
-                })
-
-        return presigned_urls
+        return ReplicaService.status(file_obj)
@@ -0,0 +1,15 @@
+"""Celery tasks for the core app, used when MINIO_REPLICATION["queue"] is "celery"."""
+
+from celery import shared_task
+
+from core.minio.replication import replication_options
+
+
+@shared_task(bind=True, ignore_result=True)
+def replicate_file(self, file_id, endpoint):
+    """Copy a file to one of its placement nodes, retrying while it fails."""
+    from .replication import ReplicationService
+
+    if not ReplicationService.replicate(file_id, endpoint):
+        options = replication_options()
+        raise self.retry(countdown=options["retry_backoff"], max_retries=options["retries"])
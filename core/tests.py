@@ -1,3 +1,989 @@
-from django.test import TestCase
+import hashlib
+import io
+import itertools
+import math
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+
+from core.downloads import (
+    MAX_RANGES,
+    RangeNotSatisfiable,
+    parse_range_header,
+    stream_file_response,
+)
+from core.minio import chunking
+from core.minio.balancer import (
+    EWMA,
+    LatencySketch,
+    NodeScore,
+    choose,
+    operation_name,
+    prefer,
+)
+from core.minio.erasure import (
+    coding_matrix,
+    decode_block,
+    encode_block,
+    gf_mul,
+    invert_matrix,
+    shard_layout,
+)
+from core.minio.placement import place, rank_nodes
+from core.minio.presign import PresignedURLCache
+from core.minio.scoreboard import _BODY_SIZE, _WORKER, Scoreboard, fcntl, pid_alive
+from core.minio.replication import copy_object
+from core.minio.striping import StripedReader, plan_stripes, striping_options
+from core.blobs import BlobService
+from core.models import ContentBlob, FileMetadata, ObjectReplica, UploadSession
+from core.replicas import ReplicaService
+from core.replication import QuorumNotReached, ReplicationService
+from core.uploads import UploadSessionService
+
+
+class ParseRangeHeaderTests(SimpleTestCase):
+    def test_single_range(self):
+        self.assertEqual(parse_range_header("bytes=0-99", 1000), [(0, 99)])
+
+    def test_end_is_clamped_to_the_size(self):
+        self.assertEqual(parse_range_header("bytes=900-2000", 1000), [(900, 999)])
+
+    def test_open_ended_range(self):
+        self.assertEqual(parse_range_header("bytes=500-", 1000), [(500, 999)])
+
+    def test_suffix_range(self):
+        self.assertEqual(parse_range_header("bytes=-100", 1000), [(900, 999)])
+
+    def test_suffix_longer_than_the_file(self):
+        self.assertEqual(parse_range_header("bytes=-5000", 1000), [(0, 999)])
+
+    def test_multiple_ranges_are_sorted_and_merged(self):
+        self.assertEqual(
+            parse_range_header("bytes=500-599, 0-9, 10-19, 550-700", 1000),
+            [(0, 19), (500, 700)],
+        )
+
+    def test_unsatisfiable(self):
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range_header("bytes=1000-", 1000)
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range_header("bytes=-0", 1000)
+
+    def test_unsatisfiable_ranges_are_dropped_from_a_list(self):
+        self.assertEqual(parse_range_header("bytes=0-9, 5000-6000", 1000), [(0, 9)])
+
+    def test_ignored_headers(self):
+        for header in ("items=0-9", "bytes=", "bytes=-", "bytes=9-0", "bytes=a-b"):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range_header(header, 1000))
+
+    def test_too_many_ranges_are_ignored(self):
+        spec = ",".join(f"{i * 10}-{i * 10 + 1}" for i in range(MAX_RANGES + 1))
+        self.assertIsNone(parse_range_header(f"bytes={spec}", 10000))
+
+
+class FakeStream:
+    def __init__(self, data):
+        self.data = data
+        self.closed = False
+
+    def __iter__(self):
+        yield self.data
+
+    def close(self):
+        self.closed = True
+
+
+class StreamFileResponseTests(SimpleTestCase):
+    data = bytes(range(256)) * 4
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.file = FileMetadata(
+            file_name="data.bin",
+            file_size=len(self.data),
+            content_type="application/octet-stream",
+            etag='"abc123"',
+            uploaded_at=timezone.now(),
+        )
+        patcher = mock.patch(
+            "core.downloads._open_range",
+            side_effect=lambda file_metadata, offset=0, length=0: FakeStream(
+                self.data[offset:offset + length] if length else self.data[offset:]
+            ),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("core.downloads._striped_content", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, **headers):
+        request = self.factory.get("/api/stream/x/", headers=headers)
+        response = stream_file_response(request, self.file)
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_whole_file(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+        self.assertEqual(response["Content-Length"], str(len(self.data)))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["ETag"], '"abc123"')
+
+    def test_single_range(self):
+        response, body = self.get(Range="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.data[10:20])
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.data)}")
+        self.assertEqual(response["Content-Length"], "10")
+
+    def test_suffix_range(self):
+        response, body = self.get(Range="bytes=-24")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.data[-24:])
+
+    def test_multiple_ranges(self):
+        response, body = self.get(Range="bytes=0-3, 100-103")
+        self.assertEqual(response.status_code, 206)
+        content_type = response["Content-Type"]
+        self.assertTrue(content_type.startswith("multipart/byteranges; boundary="))
+        boundary = content_type.split("boundary=")[1]
+        self.assertEqual(int(response["Content-Length"]), len(body))
+        self.assertEqual(
+            body,
+            (
+                f"--{boundary}\r\nContent-Type: application/octet-stream\r\n"
+                f"Content-Range: bytes 0-3/{len(self.data)}\r\n\r\n"
+            ).encode()
+            + self.data[0:4]
+            + (
+                f"\r\n--{boundary}\r\nContent-Type: application/octet-stream\r\n"
+                f"Content-Range: bytes 100-103/{len(self.data)}\r\n\r\n"
+            ).encode()
+            + self.data[100:104]
+            + f"\r\n--{boundary}--\r\n".encode(),
+        )
+
+    def test_unsatisfiable_range(self):
+        response, _ = self.get(Range=f"bytes={len(self.data)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.data)}")
+
+    def test_if_none_match(self):
+        response, body = self.get(**{"If-None-Match": '"abc123"'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(body, b"")
+        response, _ = self.get(**{"If-None-Match": 'W/"abc123"'})
+        self.assertEqual(response.status_code, 304)
+        response, _ = self.get(**{"If-None-Match": '"other"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_range_with_matching_etag(self):
+        response, body = self.get(Range="bytes=0-9", **{"If-Range": '"abc123"'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.data[:10])
+
+    def test_if_range_with_changed_etag_sends_the_whole_file(self):
+        response, body = self.get(Range="bytes=0-9", **{"If-Range": '"other"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+
+    def test_if_range_with_date(self):
+        last_modified = http_date(self.file.uploaded_at.timestamp())
+        response, _ = self.get(Range="bytes=0-9", **{"If-Range": last_modified})
+        self.assertEqual(response.status_code, 206)
+        response, _ = self.get(
+            Range="bytes=0-9", **{"If-Range": "Thu, 01 Jan 1970 00:00:00 GMT"}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_head(self):
+        request = self.factory.head("/api/stream/x/", headers={"Range": "bytes=0-9"})
+        response = stream_file_response(request, self.file)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(response.content, b"")
+
+
+class FakeObjectNode:
+    """A node whose client serves byte ranges of ``data``."""
+
+    def __init__(self, endpoint, data):
+        self.endpoint = endpoint
+        self.bucket_name = "bucket"
+        self.data = data
+        self.client = self
+
+    def get_object(self, bucket_name, object_name, offset=0, length=0):
+        response = mock.Mock()
+        response.read.return_value = self.data[offset:offset + length]
+        return response
+
+
+class StripingTests(SimpleTestCase):
+    def test_large_parts_are_split(self):
+        mb = 1024 * 1024
+        stripes = plan_stripes(20 * mb, 8 * mb, [(16 * mb, "a" * 32), (4 * mb, "b" * 32)])
+        self.assertEqual(
+            [(stripe.offset, stripe.length) for stripe in stripes],
+            [(0, 8 * mb), (8 * mb, 8 * mb), (16 * mb, 4 * mb)],
+        )
+        self.assertEqual([stripe.md5 for stripe in stripes], [None, None, "b" * 32])
+        self.assertEqual([stripe.ends_part for stripe in stripes], [False, True, False])
+
+    def test_reads_split_parts_in_order_and_checks_them(self):
+        data = bytes(range(256)) * 64
+        parts = [(12288, hashlib.md5(data[:12288]).hexdigest()), (4096, None)]
+        nodes = [FakeObjectNode("n1", data), FakeObjectNode("n2", data)]
+        options = dict(striping_options(), max_buffered=8192)
+        reader = StripedReader("obj", plan_stripes(len(data), 4096, parts), nodes, options)
+        self.assertEqual(b"".join(reader), data)
+
+        corrupt = data[:100] + b"x" + data[101:]
+        nodes = [FakeObjectNode("n1", corrupt), FakeObjectNode("n2", corrupt)]
+        reader = StripedReader("obj", plan_stripes(len(data), 4096, parts), nodes, options)
+        with self.assertRaises(Exception):
+            b"".join(reader)
+
+    def test_read_ahead_is_bounded_by_bytes(self):
+        data = bytes(64 * 1024)
+        nodes = [FakeObjectNode("n1", data), FakeObjectNode("n2", data)]
+        options = dict(striping_options(), max_buffered=16 * 1024, streams_per_node=8)
+        reader = StripedReader("obj", plan_stripes(len(data), 4096), nodes, options)
+        reader._fill()
+        self.assertEqual(reader._buffered, 16 * 1024)
+        self.assertEqual(len(reader._pending), 4)
+        reader.close()
+
+
+class ChunkingTests(SimpleTestCase):
+    options = {"min_size": 256, "avg_size": 1024, "max_size": 4096}
+
+    def setUp(self):
+        self.data = random.Random(1).randbytes(64 * 1024)
+
+    def chunks(self, data):
+        return list(chunking.iter_chunks(io.BytesIO(data), self.options))
+
+    def test_chunks_rebuild_the_file_within_the_size_bounds(self):
+        chunks = self.chunks(self.data)
+        self.assertEqual(b"".join(chunks), self.data)
+        self.assertTrue(all(len(chunk) <= 4096 for chunk in chunks))
+        self.assertTrue(all(len(chunk) >= 256 for chunk in chunks[:-1]))
+
+    def test_vectorized_hash_matches_bytewise_hash(self):
+        with mock.patch.object(chunking, "BLOCK_SIZE", 100):
+            vectorized = self.chunks(self.data)
+        with mock.patch.object(chunking, "np", None):
+            bytewise = self.chunks(self.data)
+        self.assertEqual(vectorized, bytewise)
+
+    def test_insertion_only_changes_nearby_chunks(self):
+        before = self.chunks(self.data)
+        after = self.chunks(self.data[:1000] + b"inserted" + self.data[1000:])
+        shared = set(before) & set(after)
+        self.assertGreaterEqual(len(shared), len(before) - 2)
+        self.assertEqual(after[-1], before[-1])
+
+    def test_deletion_only_changes_nearby_chunks(self):
+        before = self.chunks(self.data)
+        after = self.chunks(self.data[:30000] + self.data[30100:])
+        self.assertGreaterEqual(len(set(before) & set(after)), len(before) - 2)
+
+
+class PlacementNode:
+    def __init__(self, endpoint, weight=1.0):
+        self.endpoint = endpoint
+        self.weight = weight
+
+
+class PlacementTests(SimpleTestCase):
+    keys = [f"uploads/{i}" for i in range(2000)]
+
+    def setUp(self):
+        self.nodes = [PlacementNode(f"node{i}:9000") for i in range(4)]
+
+    def primaries(self, nodes):
+        return {key: rank_nodes(key, nodes)[0].endpoint for key in self.keys}
+
+    def test_placement_is_deterministic_and_ignores_node_order(self):
+        for key in self.keys[:50]:
+            self.assertEqual(
+                [node.endpoint for node in rank_nodes(key, self.nodes)],
+                [node.endpoint for node in rank_nodes(key, self.nodes[::-1])],
+            )
+
+    @override_settings(MINIO_PLACEMENT={"replicas": 2})
+    def test_place_returns_distinct_primary_and_replicas(self):
+        placement = place("uploads/x", self.nodes)
+        self.assertEqual(len(placement), 3)
+        self.assertEqual(len({node.endpoint for node in placement}), 3)
+        self.assertEqual(placement, rank_nodes("uploads/x", self.nodes)[:3])
+        self.assertEqual(len(place("uploads/x", self.nodes, replicas=0)), 1)
+
+    def test_adding_a_node_only_moves_keys_to_it(self):
+        before = self.primaries(self.nodes)
+        after = self.primaries(self.nodes + [PlacementNode("node4:9000")])
+        moved = [key for key in self.keys if before[key] != after[key]]
+        self.assertTrue(all(after[key] == "node4:9000" for key in moved))
+        # About a fifth of the keys, as the new node's share
+        self.assertAlmostEqual(len(moved) / len(self.keys), 0.2, delta=0.05)
+
+    def test_removing_a_node_only_moves_its_keys(self):
+        before = self.primaries(self.nodes)
+        after = self.primaries(self.nodes[1:])
+        for key in self.keys:
+            if before[key] != "node0:9000":
+                self.assertEqual(after[key], before[key])
+
+    def test_weights_set_each_node_share(self):
+        self.nodes[0].weight = 3.0
+        counts = {}
+        for endpoint in self.primaries(self.nodes).values():
+            counts[endpoint] = counts.get(endpoint, 0) + 1
+        # Weight 3 of a total of 6
+        self.assertAlmostEqual(counts["node0:9000"] / len(self.keys), 0.5, delta=0.05)
+
+
+def matrix_product(a, b):
+    """Product of two matrices over GF(256)."""
+    product = []
+    for row in a:
+        out = []
+        for column in zip(*b):
+            value = 0
+            for x, y in zip(row, column):
+                value ^= gf_mul(x, y)
+            out.append(value)
+        product.append(out)
+    return product
+
+
+class ErasureCodingTests(SimpleTestCase):
+    def test_coding_matrix_is_systematic(self):
+        matrix = coding_matrix(4, 2)
+        self.assertEqual(len(matrix), 6)
+        self.assertEqual(matrix[:4], [[int(i == j) for j in range(4)] for i in range(4)])
+        self.assertTrue(all(all(row) for row in matrix[4:]))
+        with self.assertRaises(ValueError):
+            coding_matrix(200, 57)
+
+    def test_any_data_rows_of_the_coding_matrix_invert(self):
+        matrix = coding_matrix(3, 3)
+        identity = [[int(i == j) for j in range(3)] for i in range(3)]
+        for rows in itertools.combinations(range(6), 3):
+            submatrix = [matrix[i] for i in rows]
+            with self.subTest(rows=rows):
+                self.assertEqual(matrix_product(submatrix, invert_matrix(submatrix)), identity)
+
+    def test_singular_matrix(self):
+        with self.assertRaises(ValueError):
+            invert_matrix([[1, 2], [1, 2]])
+
+    def test_encode_splits_and_pads_the_block(self):
+        pieces = encode_block(b"abcdefg", 2, 1, 4)
+        self.assertEqual(pieces[:2], [b"abcd", b"efg\0"])
+        self.assertEqual(len(pieces[2]), 4)
+
+    def test_any_data_shards_rebuild_the_block(self):
+        data_shards, parity_shards, block_size = 3, 2, 64
+        block = random.Random(2).randbytes(data_shards * block_size)
+        matrix = coding_matrix(data_shards, parity_shards)
+        pieces = encode_block(block, data_shards, parity_shards, block_size, matrix)
+        self.assertEqual(decode_block(pieces[:data_shards]), block)
+        for indices in itertools.combinations(range(data_shards + parity_shards), data_shards):
+            inverse = invert_matrix([matrix[i] for i in indices])
+            with self.subTest(indices=indices):
+                self.assertEqual(decode_block([pieces[i] for i in indices], inverse), block)
+
+    def test_shard_layout(self):
+        mb = 1024 * 1024
+        self.assertEqual(shard_layout(10 * mb, 2, mb), (mb, 5 * mb))
+        # Small files get one block, split evenly across the data shards
+        self.assertEqual(shard_layout(1001, 2, mb), (501, 501))
+        self.assertEqual(shard_layout(0, 2, 1024), (1, 0))
+
+
+class FakeMultipartClient:
+    """Enough of a MinIO client for multipart uploads and single PUTs."""
+
+    def __init__(self):
+        self.parts = {}  # part number -> bytes
+        self.objects = {}  # object name -> bytes
+        self.aborted = []
+
+    def _upload_part(self, bucket_name, object_name, data, headers, upload_id, part_number):
+        self.parts[part_number] = data
+        return f'"{hashlib.md5(data).hexdigest()}"'
+
+    def _list_parts(self, bucket_name, object_name, upload_id, part_number_marker=None):
+        parts = [
+            mock.Mock(part_number=number, size=len(data), etag=hashlib.md5(data).hexdigest())
+            for number, data in sorted(self.parts.items())
+        ]
+        return mock.Mock(parts=parts, is_truncated=False)
+
+    def _complete_multipart_upload(self, bucket_name, object_name, upload_id, parts):
+        self.objects[object_name] = b"".join(self.parts[part.part_number] for part in parts)
+        digests = b"".join(hashlib.md5(self.parts[part.part_number]).digest() for part in parts)
+        return mock.Mock(etag=f'"{hashlib.md5(digests).hexdigest()}-{len(parts)}"')
+
+    def _abort_multipart_upload(self, bucket_name, object_name, upload_id):
+        self.aborted.append(upload_id)
+
+    def stat_object(self, bucket_name, object_name):
+        data = self.objects[object_name]
+        return mock.Mock(size=len(data), etag=f'"{hashlib.md5(data).hexdigest()}"')
+
+    def remove_object(self, bucket_name, object_name):
+        self.objects.pop(object_name, None)
+
+
+class UploadSessionTests(TestCase):
+    data = b"0123456789"
+
+    def setUp(self):
+        self.user = User.objects.create(username="uploader")
+        self.storage = FakeMultipartClient()
+        self.node = mock.Mock(endpoint="node0:9000", bucket_name="bucket", client=self.storage)
+        self.node.breaker.allow_request.return_value = True
+        patcher = mock.patch("core.uploads.node_manager.get_node", return_value=self.node)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("core.uploads.FileService.replicate")
+        self.replicate = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def session(self, mode="PROXY", upload_id="upload-1"):
+        return UploadSession.objects.create(
+            mode=mode,
+            file_name="data.bin",
+            object_name="uploads/session",
+            file_size=len(self.data),
+            chunk_size=4,
+            total_chunks=3,
+            upload_id=upload_id,
+            node_endpoint=self.node.endpoint,
+            created_by=self.user,
+        )
+
+    def upload_all(self, session):
+        for index in range(3):
+            UploadSessionService.upload_chunk(session, index, self.data[index * 4:index * 4 + 4])
+
+    def test_proxy_upload_completes_once(self):
+        session = self.session()
+        self.upload_all(session)
+        file_metadata = UploadSessionService.complete_session(session)
+        self.assertEqual(self.storage.objects["uploads/session"], self.data)
+        self.assertEqual(file_metadata.total_chunks, 3)
+        self.assertTrue(file_metadata.checksum.endswith("-3"))
+        self.assertEqual(file_metadata.replicas.get().node_endpoint, "node0:9000")
+        self.replicate.assert_called_once_with(file_metadata)
+        session.refresh_from_db()
+        self.assertEqual(session.status, "COMPLETED")
+        with self.assertRaisesMessage(ValueError, "completed"):
+            UploadSessionService.complete_session(session)
+
+    def test_stale_session_objects_are_checked_against_the_row(self):
+        session = self.session()
+        self.upload_all(session)
+        stale = UploadSession.objects.get(pk=session.pk)
+        UploadSessionService.complete_session(session)
+        with self.assertRaisesMessage(ValueError, "completed"):
+            UploadSessionService.complete_session(stale)
+        with self.assertRaisesMessage(ValueError, "completed"):
+            UploadSessionService.abort_session(stale)
+        self.assertEqual(FileMetadata.objects.count(), 1)
+
+    def test_aborted_session_cannot_complete(self):
+        session = self.session()
+        self.upload_all(session)
+        stale = UploadSession.objects.get(pk=session.pk)
+        UploadSessionService.abort_session(session)
+        self.assertEqual(self.storage.aborted, ["upload-1"])
+        self.assertFalse(session.chunks.exists())
+        with self.assertRaisesMessage(ValueError, "aborted"):
+            UploadSessionService.complete_session(stale)
+        self.assertFalse(FileMetadata.objects.exists())
+
+    def test_missing_chunks(self):
+        session = self.session()
+        UploadSessionService.upload_chunk(session, 1, self.data[4:8])
+        with self.assertRaisesMessage(ValueError, "Missing chunks: [0, 2]"):
+            UploadSessionService.complete_session(session)
+        self.assertEqual(UploadSessionService.get_progress(session)["received_chunks"], [1])
+
+    def test_chunk_size_is_checked(self):
+        session = self.session()
+        with self.assertRaises(ValueError):
+            UploadSessionService.upload_chunk(session, 0, b"abc")
+        with self.assertRaises(ValueError):
+            UploadSessionService.upload_chunk(session, 3, b"ab")
+
+    def direct_parts(self):
+        for index in range(3):
+            self.storage.parts[index + 1] = self.data[index * 4:index * 4 + 4]
+        return {
+            index: hashlib.md5(self.data[index * 4:index * 4 + 4]).hexdigest()
+            for index in range(3)
+        }
+
+    def test_direct_upload_needs_every_part_md5(self):
+        session = self.session(mode="DIRECT")
+        md5s = self.direct_parts()
+        del md5s[2]
+        with self.assertRaisesMessage(ValueError, "MD5 of chunk 2 is required"):
+            UploadSessionService.complete_session(session, md5s)
+        session.refresh_from_db()
+        self.assertEqual(session.status, "ACTIVE")
+
+    def test_direct_upload_parts_are_checked_against_the_client(self):
+        session = self.session(mode="DIRECT")
+        md5s = self.direct_parts()
+        md5s[1] = hashlib.md5(b"else").hexdigest()
+        with self.assertRaisesMessage(ValueError, "Integrity check failed for chunk 1"):
+            UploadSessionService.complete_session(session, md5s)
+
+        md5s = self.direct_parts()
+        file_metadata = UploadSessionService.complete_session(session, md5s)
+        self.assertEqual(file_metadata.file_size, len(self.data))
+
+    def test_single_put_mismatch_aborts_the_session(self):
+        session = self.session(mode="DIRECT", upload_id="")
+        self.storage.objects["uploads/session"] = self.data
+        with self.assertRaisesMessage(ValueError, "MD5 of chunk 0 is required"):
+            UploadSessionService.complete_session(session, {})
+        with self.assertRaisesMessage(ValueError, "Integrity check failed"):
+            UploadSessionService.complete_session(session, {0: hashlib.md5(b"x").hexdigest()})
+        session.refresh_from_db()
+        self.assertEqual(session.status, "ABORTED")
+        self.assertNotIn("uploads/session", self.storage.objects)
+        self.replicate.assert_not_called()
+
+
+class StorageNode(PlacementNode):
+    """A configured node with a mock client; nodes of one cluster share objects."""
+
+    def __init__(self, endpoint, cluster=None):
+        super().__init__(endpoint)
+        self.cluster = cluster or endpoint
+        self.bucket_name = "bucket"
+        self.client = mock.Mock()
+        self.is_healthy = True
+        self.health_changed_at = 0.0
+
+
+class FakeNodesMixin:
+    """Put ``self.nodes`` in place of the configured nodes, all of them healthy."""
+
+    def use_nodes(self, nodes):
+        self.nodes = nodes
+        patcher = mock.patch("core.minio.node.node_manager.nodes", nodes)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch(
+            "core.minio.node.node_manager.get_active_nodes", side_effect=lambda: list(self.nodes)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class CopyObjectTests(SimpleTestCase):
+    def test_nodes_of_one_cluster_are_only_checked(self):
+        source, target = StorageNode("a:9000", "compose"), StorageNode("b:9000", "compose")
+        target.client.stat_object.return_value = mock.Mock(etag='"abc"')
+        self.assertEqual(copy_object(source, target, "uploads/x"), "abc")
+        target.client.put_object.assert_not_called()
+        source.client.get_object.assert_not_called()
+
+    def streamed_copy(self, stored):
+        data = b"payload"
+        source, target = StorageNode("a:9000"), StorageNode("b:9000")
+        source.client.stat_object.return_value = mock.Mock(
+            size=len(data), etag=hashlib.md5(data).hexdigest(), content_type="text/plain"
+        )
+        source.client.get_object.return_value = io.BytesIO(stored)
+        source.client.get_object.return_value.release_conn = mock.Mock()
+        target.client.put_object.side_effect = lambda bucket, name, reader, size, **kwargs: (
+            mock.Mock(etag=f'"{hashlib.md5(reader.read(size)).hexdigest()}"')
+        )
+        return source, target, hashlib.md5(data).hexdigest()
+
+    def test_other_clusters_get_a_streamed_copy(self):
+        source, target, md5 = self.streamed_copy(b"payload")
+        self.assertEqual(copy_object(source, target, "uploads/x"), md5)
+        target.client.remove_object.assert_not_called()
+
+    def test_corrupted_copies_are_removed(self):
+        source, target, _ = self.streamed_copy(b"paylaod")
+        with self.assertRaises(ValueError):
+            copy_object(source, target, "uploads/x")
+        target.client.remove_object.assert_called_once_with("bucket", "uploads/x")
+
+
+@override_settings(MINIO_PLACEMENT={"replicas": 2}, MINIO_REPLICATION={"write_quorum": 2})
+class QuorumReplicationTests(FakeNodesMixin, TestCase):
+    def setUp(self):
+        self.use_nodes([StorageNode(f"node{i}:9000") for i in range(4)])
+        self.file = FileMetadata.objects.create(
+            file_name="data.bin",
+            object_key="uploads/x",
+            uploaded_by=User.objects.create(username="owner"),
+        )
+        self.order = rank_nodes("uploads/x", self.nodes)
+        ObjectReplica.objects.create(
+            file_metadata=self.file, node_endpoint=self.order[0].endpoint, state="PRESENT"
+        )
+
+    def states(self):
+        return dict(self.file.replicas.values_list("node_endpoint", "state"))
+
+    def test_copies_to_the_quorum_and_queues_the_other_replicas(self):
+        with mock.patch("core.replication.copy_object", return_value="etag") as copy:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.assertEqual(ReplicationService.replicate_on_write(self.file), 2)
+        copy.assert_called_once_with(self.order[0], self.order[1], "uploads/x")
+        self.assertEqual(
+            self.states(),
+            {
+                self.order[0].endpoint: "PRESENT",
+                self.order[1].endpoint: "PRESENT",
+                self.order[2].endpoint: "PENDING",
+            },
+        )
+        self.assertEqual(len(callbacks), 1)
+
+    def test_failed_copies_move_down_the_node_order(self):
+        def copy(source, target, object_name):
+            if target is self.order[1]:
+                raise Exception("unreachable")
+            return "etag"
+
+        with mock.patch("core.replication.copy_object", side_effect=copy):
+            with self.assertLogs("core.replication", "WARNING"):
+                self.assertEqual(ReplicationService.replicate_on_write(self.file), 2)
+        # The placement node that failed is left to the background queue
+        self.assertEqual(
+            self.states(),
+            {
+                self.order[0].endpoint: "PRESENT",
+                self.order[1].endpoint: "PENDING",
+                self.order[2].endpoint: "PRESENT",
+            },
+        )
+
+    def test_quorum_not_reached(self):
+        with mock.patch("core.replication.copy_object", side_effect=Exception("down")):
+            with self.assertLogs("core.replication", "WARNING"), self.assertRaises(QuorumNotReached):
+                ReplicationService.replicate_on_write(self.file)
+        self.assertEqual(self.states(), {self.order[0].endpoint: "PRESENT"})
+
+
+class BlobServiceTests(TestCase):
+    sha256 = hashlib.sha256(b"content").hexdigest()
+
+    def setUp(self):
+        self.user = User.objects.create(username="owner")
+        patcher = mock.patch("core.blobs.minio_remove")
+        self.minio_remove = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, key, endpoint="node0:9000", user=None):
+        file_metadata = FileMetadata.objects.create(
+            file_name="data.bin",
+            object_key=key,
+            file_size=7,
+            etag="etag",
+            uploaded_by=user or self.user,
+            total_chunks=1,
+        )
+        ObjectReplica.objects.create(
+            file_metadata=file_metadata, node_endpoint=endpoint, state="PRESENT", etag="etag"
+        )
+        return file_metadata
+
+    def test_new_content_keeps_its_uploaded_object(self):
+        file_metadata = self.upload("uploads/first")
+        blob, duplicate = BlobService.attach(file_metadata, self.sha256, "node0:9000")
+        self.assertFalse(duplicate)
+        self.assertEqual(blob.object_name, "uploads/first")
+        self.assertEqual(file_metadata.object_name, "uploads/first")
+        self.minio_remove.assert_not_called()
+
+    def test_duplicate_content_shares_the_first_object(self):
+        first = self.upload("uploads/first")
+        BlobService.attach(first, self.sha256, "node0:9000")
+        second = self.upload("uploads/second", endpoint="node1:9000")
+        blob, duplicate = BlobService.attach(second, self.sha256, "node1:9000")
+
+        self.assertTrue(duplicate)
+        self.assertEqual(ContentBlob.objects.count(), 1)
+        self.assertEqual(second.object_name, "uploads/first")
+        self.minio_remove.assert_called_once_with("uploads/second", "node1:9000")
+        self.assertEqual(
+            list(second.replicas.values_list("node_endpoint", flat=True)), ["node0:9000"]
+        )
+
+    def test_object_is_released_with_its_last_file(self):
+        first = self.upload("uploads/first")
+        BlobService.attach(first, self.sha256, "node0:9000")
+        second = BlobService.link(first.blob, self.user, "copy.bin")
+        self.assertEqual(second.object_name, "uploads/first")
+
+        self.assertIsNone(BlobService.release(first))
+        self.assertTrue(ContentBlob.objects.exists())
+        self.assertEqual(BlobService.release(second), "uploads/first")
+        self.assertFalse(ContentBlob.objects.exists())
+
+    def test_only_the_users_own_content_is_found(self):
+        first = self.upload("uploads/first")
+        BlobService.attach(first, self.sha256, "node0:9000")
+        other = User.objects.create(username="other")
+        self.assertEqual(BlobService.find(self.sha256, 7, self.user), first.blob)
+        self.assertIsNone(BlobService.find(self.sha256, 7, other))
+        self.assertIsNone(BlobService.find(self.sha256, 8, self.user))
+
+
+class ReplicaIndexTests(FakeNodesMixin, TestCase):
+    def setUp(self):
+        self.use_nodes([StorageNode(f"node{i}:9000") for i in range(3)])
+        self.file = FileMetadata.objects.create(
+            file_name="data.bin",
+            object_key="uploads/x",
+            etag="etag",
+            uploaded_by=User.objects.create(username="owner"),
+        )
+        self.order = rank_nodes("uploads/x", self.nodes)
+        patcher = mock.patch("core.replicas.prefer", side_effect=lambda nodes: nodes)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def states(self):
+        return dict(self.file.replicas.values_list("node_endpoint", "state"))
+
+    def test_locations_and_pending_copies(self):
+        ReplicaService.record(self.file, "node0:9000", "etag")
+        ReplicaService.mark_pending(self.file, "node1:9000")
+        ReplicaService.mark_missing(self.file, "node2:9000")
+        self.assertEqual(ReplicaService.locations(self.file), ["node0:9000"])
+        self.assertEqual(
+            sorted(ReplicaService.locations(self.file, include_pending=True)),
+            ["node0:9000", "node1:9000"],
+        )
+        self.assertGreaterEqual(ReplicaService.lag(self.file), 0.0)
+
+    def test_reconcile_leaves_pending_copies_alone(self):
+        ReplicaService.record(self.file, "node0:9000", "etag")
+        ReplicaService.mark_pending(self.file, "node1:9000")
+        ReplicaService.reconcile(
+            self.file, {"node0:9000": False, "node1:9000": False, "node2:9000": True}
+        )
+        self.assertEqual(
+            self.states(),
+            {"node0:9000": "MISSING", "node1:9000": "PENDING", "node2:9000": "PRESENT"},
+        )
+
+    def test_reads_go_to_healthy_holders(self):
+        holder = self.order[2]
+        ReplicaService.record(self.file, holder.endpoint, "etag")
+        self.assertEqual(ReplicaService.read_nodes(self.file), [holder])
+
+        self.nodes = [node for node in self.nodes if node is not holder]
+        # No healthy holder: every healthy node, in placement order
+        self.assertEqual(ReplicaService.read_nodes(self.file), self.order[:2])
+
+        self.nodes = []
+        with self.assertRaises(Exception):
+            ReplicaService.read_nodes(self.file)
+
+    def test_files_without_rows_are_probed_once(self):
+        probed = [
+            {"endpoint": "node0:9000", "status": 200},
+            {"endpoint": "node1:9000", "status": 404},
+            {"endpoint": "node2:9000", "status": 503},
+        ]
+        with mock.patch("core.replicas.replica_status", return_value=probed) as replica_status:
+            self.assertEqual(ReplicaService.status(self.file), probed)
+        replica_status.assert_called_once_with("uploads/x")
+        self.assertEqual(self.states(), {"node0:9000": "PRESENT", "node1:9000": "MISSING"})
+
+
+class PresignedURLCacheTests(FakeNodesMixin, SimpleTestCase):
+    def setUp(self):
+        self.use_nodes([StorageNode(f"node{i}:9000") for i in range(3)])
+        for node in self.nodes:
+            node.client.presigned_get_object.side_effect = (
+                lambda bucket, name, expires, endpoint=node.endpoint: f"https://{endpoint}/{name}"
+            )
+        self.urls = PresignedURLCache({"expiry": 3600, "margin": 300})
+        self.now = 1000.0
+        patcher = mock.patch("core.minio.presign.time.time", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def signed(self):
+        return sum(node.client.presigned_get_object.call_count for node in self.nodes)
+
+    def test_urls_are_served_from_the_cache_until_shortly_before_expiry(self):
+        url = self.urls.get("f1", "uploads/x", ["node1:9000"])
+        self.assertEqual(url, "https://node1:9000/uploads/x")
+        self.now += 3000
+        self.assertEqual(self.urls.get("f1", "uploads/x", ["node1:9000"]), url)
+        self.assertEqual(self.signed(), 1)
+        # Within the margin of the expiry
+        self.now += 400
+        self.urls.get("f1", "uploads/x", ["node1:9000"])
+        self.assertEqual(self.signed(), 2)
+
+    def test_urls_are_signed_again_when_their_node_changes(self):
+        self.urls.get("f1", "uploads/x", ["node1:9000"])
+        self.nodes[1].health_changed_at = self.now + 1
+        self.now += 10
+        self.urls.get("f1", "uploads/x", ["node1:9000"])
+        self.assertEqual(self.signed(), 2)
+
+        # The signing node no longer holds the object
+        url = self.urls.get("f1", "uploads/x", ["node2:9000"])
+        self.assertEqual(url, "https://node2:9000/uploads/x")
+
+    def test_without_a_known_holder_the_placement_node_signs(self):
+        url = self.urls.get("f1", "uploads/x", [])
+        primary = rank_nodes("uploads/x", self.nodes)[0]
+        self.assertEqual(url, f"https://{primary.endpoint}/uploads/x")
+
+    def test_batches_only_sign_misses(self):
+        self.urls.get("f1", "uploads/x", ["node0:9000"])
+        urls = self.urls.get_many([
+            ("f1", "uploads/x", ["node0:9000"]),
+            ("f2", "uploads/y", ["node2:9000"]),
+        ])
+        self.assertEqual(
+            urls, {"f1": "https://node0:9000/uploads/x", "f2": "https://node2:9000/uploads/y"}
+        )
+        self.assertEqual(self.signed(), 2)
+        self.urls.invalidate("f2")
+        self.urls.get("f2", "uploads/y", ["node2:9000"])
+        self.assertEqual(self.signed(), 3)
+
+
+class BalancerTests(SimpleTestCase):
+    options = {"decay": 10.0, "default_latency": 0.05, "error_penalty": 10.0}
+
+    def test_ewma_forgets_with_elapsed_time(self):
+        average = EWMA(10.0)
+        average.update(1.0, 0.0)
+        self.assertAlmostEqual(average.update(0.0, 10.0), math.exp(-1))
+        # A burst of samples at one instant does not wash out the history
+        self.assertAlmostEqual(average.update(0.0, 10.0), math.exp(-1))
+
+    def test_peak_ewma_jumps_to_slower_samples(self):
+        average = EWMA(10.0, peak=True)
+        average.update(0.01, 0.0)
+        self.assertEqual(average.update(0.5, 0.1), 0.5)
+        self.assertLess(average.update(0.01, 1.0), 0.5)
+
+    def test_sketch_percentiles_are_within_five_percent(self):
+        sketch = LatencySketch()
+        samples = [i / 1000 for i in range(1, 1001)]
+        for sample in samples:
+            sketch.add(sample)
+        for q in (0.5, 0.95, 0.99):
+            exact = samples[int(q * (len(samples) - 1))]
+            self.assertAlmostEqual(sketch.percentile(q), exact, delta=exact * 0.05)
+        self.assertIsNone(LatencySketch().percentile(0.5))
+
+    def test_cost_grows_with_queued_requests_and_errors(self):
+        score = NodeScore(self.options)
+        self.assertAlmostEqual(score.cost(), 0.05)
+        started = score.begin()
+        self.assertAlmostEqual(score.cost(), 0.1)
+        score.end("stat", started, error=True)
+        self.assertAlmostEqual(score.cost(), 0.05 * (1 + 10.0))
+
+    def test_two_choices_prefer_the_cheaper_node(self):
+        idle, busy = mock.Mock(), mock.Mock()
+        idle.score.cost.return_value, busy.score.cost.return_value = 0.01, 1.0
+        for _ in range(10):
+            self.assertIs(choose([idle, busy]), idle)
+        self.assertIsNone(choose([]))
+        self.assertEqual(prefer([busy, idle]), [idle, busy])
+
+    def test_operation_names(self):
+        self.assertEqual(operation_name("HEAD", "http://n/b/o"), "stat")
+        self.assertEqual(operation_name("PUT", "http://n/b/o?partNumber=1&uploadId=x"), "part")
+        self.assertEqual(operation_name("PUT", "http://n/b/o"), "upload")
+        self.assertEqual(operation_name("GET", "http://n/b/o"), "download")
+        self.assertEqual(operation_name("GET", "http://n/b?list-type=2"), "list")
+
+
+@unittest.skipIf(fcntl is None, "the scoreboard needs fcntl")
+class ScoreboardTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.options = {
+            "path": os.path.join(directory.name, "scoreboard"),
+            "slots": 4,
+            "workers": 4,
+            "read_retries": 100,
+        }
+
+    def board(self):
+        board = Scoreboard(self.options)
+        self.addCleanup(os.close, board.fd)
+        self.addCleanup(board.mm.close)
+        return board
+
+    def test_workers_see_each_others_load(self):
+        writer = self.board().record("node0:9000")
+        reader = self.board().record("node0:9000")
+        writer.add_in_flight(1)
+        self.assertEqual(reader.read()["in_flight"], 1)
+        writer.finish(0.2, False, True, 10.0)
+        view = reader.read()
+        self.assertEqual(view["in_flight"], 0)
+        self.assertAlmostEqual(view["latency"], 0.2)
+        self.assertAlmostEqual(view["requests"], 1.0)
+
+    def test_health_results_are_published(self):
+        record = self.board().record("node0:9000")
+        self.assertIsNone(record.read()["healthy"])
+        record.set_health(False)
+        view = self.board().record("node0:9000").read()
+        self.assertIs(view["healthy"], False)
+        self.assertEqual(view["checked_by"], os.getpid())
+
+    def test_counts_of_exited_workers_are_dropped(self):
+        record = self.board().record("node0:9000")
+        dead = next(pid for pid in range(4_000_000, 4_100_000) if not pid_alive(pid))
+        _WORKER.pack_into(record.board.mm, record.offset + _BODY_SIZE, dead, 1, 5)
+        self.assertEqual(record.read()["in_flight"], 5)
+        record.set_health(True)
+        self.assertEqual(record.read()["in_flight"], 0)
+
+    def test_nodes_get_their_own_records_until_the_board_is_full(self):
+        board = self.board()
+        records = [board.record(f"node{i}:9000") for i in range(4)]
+        self.assertEqual(len({record.offset for record in records}), 4)
+        with self.assertLogs("core.minio.scoreboard", "WARNING"):
+            self.assertIsNone(board.record("node4:9000"))
+
+    def test_costs_use_the_host_wide_load(self):
+        board = self.board()
+        other = board.record("node0:9000")
+        other.add_in_flight(3)
+        score = NodeScore(BalancerTests.options, shared=board.record("node0:9000"))
+        self.assertAlmostEqual(score.cost(), 0.05 * 4)
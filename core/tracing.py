@@ -0,0 +1,229 @@
+"""
+Request-scoped tracing.
+``TracingMiddleware`` starts a trace per request and the code it calls
+records spans into it: service calls, MinIO requests, node selection, DB
+queries and template rendering. The spans are summed into a
+``Server-Timing`` header and, for slow requests, dumped as JSON. Without
+an active trace ``span`` returns a shared no-op, so instrumented code costs
+one context variable lookup.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULT_TRACING = {
+    "enabled": False,
+    "dump_threshold": None,  # Seconds; slower requests are dumped as JSON (None: never)
+    "dump_dir": None,  # Defaults to BASE_DIR / "traces"
+    "dump_keep": 200,  # Newest dumps kept in dump_dir
+    "max_spans": 1000,  # Spans kept per request; later ones are only counted
+    "header_entries": 15,  # Span names listed in Server-Timing, slowest first
+}
+
+_trace = contextvars.ContextVar("filenest_trace", default=None)
+_parent = contextvars.ContextVar("filenest_span", default=None)
+
+
+def tracing_options():
+    """Tracing settings merged over the defaults."""
+    options = dict(DEFAULT_TRACING)
+    options.update(getattr(settings, "TRACING", {}))
+    if not options["dump_dir"]:
+        options["dump_dir"] = os.path.join(settings.BASE_DIR, "traces")
+    return options
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """A timed section of a request."""
+
+    __slots__ = ("trace", "name", "attrs", "parent", "index", "start", "duration", "_token")
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.parent = None
+        self.index = None
+        self.start = 0.0
+        self.duration = None
+
+    def __enter__(self):
+        self.parent = _parent.get()
+        self.start = time.perf_counter()
+        self._token = _parent.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        _parent.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.trace.add(self)
+        return False
+
+    def set(self, **attrs):
+        """Attach attributes shown in the JSON dump."""
+        self.attrs.update(attrs)
+
+
+class Trace:
+    """Spans recorded while one request is handled, from any of its threads."""
+
+    def __init__(self, name, max_spans):
+        self.name = name
+        self.max_spans = max_spans
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.spans = []
+        self.totals = {}  # name: [count, seconds]
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            total = self.totals.setdefault(span.name, [0, 0.0])
+            total[0] += 1
+            total[1] += span.duration
+            if len(self.spans) < self.max_spans:
+                span.index = len(self.spans)
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+    def server_timing(self, total, entries):
+        """``Server-Timing`` value: the slowest span names, then the total."""
+        with self._lock:
+            slowest = sorted(self.totals.items(), key=lambda item: item[1][1], reverse=True)
+        parts = [
+            f'{_token(name)};dur={seconds * 1000:.1f};desc="{count}x"'
+            for name, (count, seconds) in slowest[:entries]
+        ]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+    def as_dict(self, total):
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(total * 1000, 3),
+            "dropped_spans": self.dropped,
+            "spans": [
+                {
+                    "id": span.index,
+                    "parent": span.parent.index if span.parent is not None else None,
+                    "name": span.name,
+                    "start_ms": round((span.start - self.started) * 1000, 3),
+                    "duration_ms": round(span.duration * 1000, 3),
+                    **({"attrs": span.attrs} if span.attrs else {}),
+                }
+                for span in spans
+            ],
+        }
+
+
+def _token(name):
+    """A span name as a Server-Timing metric name."""
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+def active():
+    """Whether the current request is being traced."""
+    return _trace.get() is not None
+
+
+def span(name, **attrs):
+    """Context manager timing a section of the current request, if traced."""
+    trace = _trace.get()
+    if trace is None:
+        return _NOOP
+    return Span(trace, name, attrs)
+
+
+def traced(name=None):
+    """Decorator recording each call of a function as a span."""
+
+    def decorator(func):
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = _trace.get()
+            if trace is None:
+                return func(*args, **kwargs)
+            with Span(trace, span_name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def bind(func):
+    """``func`` bound to the current trace, for running on another thread."""
+    if _trace.get() is None:
+        return func
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+def start(name, options=None):
+    """Begin tracing the current context; returns the token for ``finish``."""
+    options = options or tracing_options()
+    return _trace.set(Trace(name, options["max_spans"]))
+
+
+def finish(token):
+    """Stop tracing the context and return its trace."""
+    trace = _trace.get()
+    _trace.reset(token)
+    return trace
+
+
+def rotate(directory, keep):
+    """Delete all but the ``keep`` newest files in ``directory``."""
+    try:
+        entries = [entry for entry in os.scandir(directory) if entry.is_file()]
+    except OSError:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in entries[keep:]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def dump(trace, total, options):
+    """Write a trace as JSON to the dump directory and return its path."""
+    directory = options["dump_dir"]
+    os.makedirs(directory, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", trace.name).strip("-")[:80]
+    path = os.path.join(
+        directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{int(total * 1000)}ms-{slug}.json"
+    )
+    with open(path, "w") as f:
+        json.dump(trace.as_dict(total), f, indent=1, default=str)
+    rotate(directory, options["dump_keep"])
+    return path
@@ -0,0 +1,175 @@
+"""Upload handlers that stream request bodies straight into MinIO."""
+
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (
+    FileUploadHandler,
+    SkipFile,
+    StopFutureHandlers,
+    StopUpload,
+)
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+from core.minio.buffers import PartWriter, part_buffers
+from core.minio.storage import (
+    ObjectReader,
+    minio_multipart_complete,
+    minio_multipart_start,
+    minio_remove,
+    staging_key,
+)
+from core.erasure import ErasureService
+from core.services import FileService
+
+
+class MinioUploadedFile(UploadedFile):
+    """An uploaded file whose bytes were already stored in MinIO.
+
+    ``upload_result`` holds the same tuple ``minio_upload`` returns, so
+    ``FileService.upload_file`` can skip the upload step. Reading the file
+    reads the stored object back. Whoever takes over the object sets
+    ``claimed``; objects left unclaimed when the view returns are removed.
+    """
+
+    def __init__(self, name, content_type, size, charset, content_type_extra, upload_result):
+        file = ObjectReader(upload_result[0], size, upload_result[7])
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.upload_result = upload_result
+        self.claimed = False
+
+    def multiple_chunks(self, chunk_size=None):
+        return False
+
+
+class MinioUploadHandler(FileUploadHandler):
+    """Start a MinIO multipart upload per file and send parts as they fill.
+
+    Small request bodies are left to Django's memory handler. Size limits
+    are checked up front from Content-Length and then against the running
+    byte count, so oversized uploads are stopped before they are stored.
+    Rejections are reported on ``request.upload_error``.
+    """
+
+    def __init__(self, request=None, max_request_size=None):
+        super().__init__(request)
+        self.max_request_size = max_request_size
+        self.max_file_size = FileService.MAX_FILE_SIZE
+        self.activated = False
+        self.upload = None
+        self.writer = None
+        self.content_hash = None
+        self.files = []  # MinioUploadedFiles produced for this request
+
+    def _reject(self, message):
+        if self.request is not None:
+            self.request.upload_error = message
+
+    def _reject_size(self):
+        self._reject(f"File size exceeds {self.max_file_size / (1024 * 1024)}MB limit.")
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if self.max_request_size and content_length > self.max_request_size:
+            # Answer without reading the body at all
+            self._reject_size()
+            return QueryDict(encoding=encoding), MultiValueDict()
+        # Chunked and erasure-coded uploads are split up by the view instead
+        split = self.request is not None and (
+            self.request.GET.get("chunked") == "1" or ErasureService.requested(self.request)
+        )
+        self.activated = not split and content_length > settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        if not self.activated:
+            return
+
+        if len(file_name) > FileService.MAX_FILENAME_LENGTH:
+            self._reject(f"File name exceeds {FileService.MAX_FILENAME_LENGTH} characters.")
+            raise SkipFile()
+        if content_length and content_length > self.max_file_size:
+            self._reject_size()
+            raise SkipFile()
+
+        self.upload = minio_multipart_start(staging_key(), content_type)
+        self.writer = PartWriter(self.upload, part_buffers)
+        self.content_hash = hashlib.sha256()
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.activated or self.writer is None:
+            return raw_data
+
+        if start + len(raw_data) > self.max_file_size:
+            self._reject_size()
+            self.upload_interrupted()
+            raise StopUpload(connection_reset=True)
+
+        self.content_hash.update(raw_data)
+        self.writer.write(raw_data)
+
+    def file_complete(self, file_size):
+        if not self.activated or self.writer is None:
+            return None
+
+        upload, writer = self.upload, self.writer
+        self.upload = self.writer = None
+        try:
+            writer.close()
+            upload_result = minio_multipart_complete(upload, self.content_hash.hexdigest())
+        except Exception:
+            writer.discard()
+            upload.abort()
+            raise
+        finally:
+            upload.close()
+
+        uploaded = MinioUploadedFile(
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+            upload_result=upload_result,
+        )
+        self.files.append(uploaded)
+        return uploaded
+
+    def upload_interrupted(self):
+        if self.writer is not None:
+            self.writer.discard()
+            self.upload.abort()
+        self.upload = self.writer = None
+
+    def remove_unclaimed(self):
+        """Remove the objects of files no view took over, e.g. after a CSRF failure."""
+        for uploaded in self.files:
+            if not uploaded.claimed:
+                minio_remove(uploaded.upload_result[0], uploaded.upload_result[7])
+        self.files = []
+
+
+def stream_uploads_to_minio(max_request_size=None):
+    """Install MinioUploadHandler before the view reads the request body.
+
+    Files are stored while the body is parsed, which may be before the view
+    rejects the request (CSRF, authentication, validation), so any object
+    the view did not claim is removed once it returns.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            handler = MinioUploadHandler(request, max_request_size=max_request_size)
+            request.upload_handlers.insert(0, handler)
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                handler.remove_unclaimed()
+
+        return wrapped
+
+    return decorator
@@ -0,0 +1,524 @@
+"""Service layer for resumable chunked uploads."""
+
+import hashlib
+import math
+import re
+import uuid
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.utils.text import get_valid_filename
+from minio.api import Part
+from minio.error import S3Error
+
+from core.minio import metrics
+from core.minio.chunking import cdc_options
+from core.minio.multipart import multipart_options
+from core.minio.node import Node, node_manager
+
+from .chunks import ChunkStoreService
+from .models import FileChunk, FileMetadata, UploadSession
+from .replicas import ReplicaService
+from .services import FileService
+
+# S3 requires every part except the last to be at least 5MB
+MIN_CHUNK_SIZE = 5 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+PRESIGNED_UPLOAD_EXPIRY = timedelta(hours=1)
+
+
+class UploadSessionService:
+    """Service for resumable uploads built on MinIO multipart upload IDs.
+
+    Chunks map one-to-one onto multipart parts and are recorded as
+    ``FileChunk`` rows, so a session can be resumed from any process.
+    """
+
+    @classmethod
+    def create_session(
+        cls,
+        user: User,
+        file_name: str,
+        file_size: int,
+        content_type: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+    ) -> UploadSession:
+        """Start a multipart upload on the file's placement node and open a session."""
+        return cls._open_session(user, file_name, file_size, content_type, chunk_size, "PROXY")
+
+    @classmethod
+    def create_direct_session(
+        cls,
+        user: User,
+        file_name: str,
+        file_size: int,
+        content_type: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+    ) -> UploadSession:
+        """Open a session whose bytes the client sends straight to MinIO.
+
+        Files that fit in one chunk get a single presigned PUT; larger ones
+        get a multipart upload with one presigned URL per part.
+        """
+        return cls._open_session(user, file_name, file_size, content_type, chunk_size, "DIRECT")
+
+    @staticmethod
+    def create_manifest_session(
+        user: User,
+        file_name: str,
+        file_size: int,
+        chunks: List[Dict],
+        content_type: Optional[str] = None,
+    ) -> UploadSession:
+        """Open a session from the file's chunk manifest.
+
+        ``chunks`` lists ``{"sha256", "size"}`` for every content-defined
+        chunk in order. Only chunks that the user's own files do not already
+        use need to be sent; ``get_progress`` lists them.
+        """
+        errors = FileService.validate(file_name, file_size)
+        if errors:
+            raise ValueError(errors[0])
+        if not chunks:
+            raise ValueError("The manifest must list at least one chunk.")
+
+        max_size = cdc_options()["max_size"]
+        manifest = []
+        for chunk in chunks:
+            sha256 = str(chunk.get("sha256", "")).lower()
+            size = int(chunk.get("size", 0))
+            if not re.fullmatch(r"[0-9a-f]{64}", sha256):
+                raise ValueError("Chunk sha256 must be a hex-encoded SHA-256 digest.")
+            if not 0 < size <= max_size:
+                raise ValueError(f"Chunk size must be between 1 and {max_size} bytes.")
+            manifest.append((sha256, size))
+        if sum(size for _, size in manifest) != file_size:
+            raise ValueError("Chunk sizes do not add up to the file size.")
+
+        object_name = get_valid_filename(file_name)
+        node = node_manager.get_node_for(object_name)
+        if not node:
+            raise Exception("No active MinIO nodes available.")
+        owned = ChunkStoreService.owned((sha256 for sha256, _ in manifest), user)
+
+        with transaction.atomic():
+            session = UploadSession.objects.create(
+                mode="MANIFEST",
+                file_name=object_name,
+                file_size=file_size,
+                content_type=content_type or "application/octet-stream",
+                chunk_size=max_size,
+                total_chunks=len(manifest),
+                node_endpoint=node.endpoint,
+                created_by=user,
+            )
+            offset = 0
+            rows = []
+            for index, (sha256, size) in enumerate(manifest):
+                rows.append(FileChunk(
+                    upload_session=session,
+                    chunk_index=index,
+                    chunk_size=size,
+                    content_hash=sha256,
+                    offset=offset,
+                    blob=owned.get(sha256),
+                ))
+                offset += size
+            FileChunk.objects.bulk_create(rows)
+        return session
+
+    @staticmethod
+    def _open_session(user, file_name, file_size, content_type, chunk_size, mode):
+        errors = FileService.validate(file_name, file_size)
+        if errors:
+            raise ValueError(errors[0])
+        if file_size <= 0:
+            raise ValueError("File size must be greater than zero.")
+
+        chunk_size = chunk_size or multipart_options()["part_size"]
+        if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError(
+                f"Chunk size must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE} bytes."
+            )
+
+        # Each session writes to its own key, so aborting or failing it never
+        # touches an object another upload stored under the same file name
+        session_id = uuid.uuid4()
+        object_name = f"uploads/{session_id}"
+        node = node_manager.get_node_for(object_name)
+        if not node:
+            raise Exception("No active MinIO nodes available.")
+
+        content_type = content_type or "application/octet-stream"
+        upload_id = ""
+        if mode == "PROXY" or file_size > chunk_size:
+            upload_id = node.client._create_multipart_upload(
+                node.bucket_name, object_name, {"Content-Type": content_type}
+            )
+
+        return UploadSession.objects.create(
+            id=session_id,
+            mode=mode,
+            file_name=get_valid_filename(file_name),
+            object_name=object_name,
+            file_size=file_size,
+            content_type=content_type,
+            chunk_size=chunk_size,
+            total_chunks=math.ceil(file_size / chunk_size),
+            upload_id=upload_id,
+            node_endpoint=node.endpoint,
+            created_by=user,
+        )
+
+    @staticmethod
+    def get_session(session_id: str, user: User) -> UploadSession:
+        """Get an upload session with permission check."""
+        session = UploadSession.objects.get(id=session_id)
+        if session.created_by != user and not user.is_staff:
+            raise PermissionDenied("Unauthorized access")
+        return session
+
+    @staticmethod
+    def _session_node(session: UploadSession) -> Node:
+        node = node_manager.get_node(session.node_endpoint)
+        if not node or not node.breaker.allow_request():
+            raise Exception(
+                f"Storage node {session.node_endpoint} is unavailable, retry later."
+            )
+        return node
+
+    @staticmethod
+    def _lock(session: UploadSession) -> None:
+        """Lock the session's row until the transaction ends and reload its status."""
+        locked = UploadSession.objects.select_for_update().get(pk=session.pk)
+        session.status = locked.status
+
+    @staticmethod
+    def _check_active(session: UploadSession) -> None:
+        if session.status != "ACTIVE":
+            raise ValueError(f"Upload session is {session.get_status_display().lower()}.")
+
+    @classmethod
+    def upload_chunk(
+        cls,
+        session: UploadSession,
+        chunk_index: int,
+        data: bytes,
+        content_md5: Optional[str] = None,
+    ) -> FileChunk:
+        """Upload one chunk as a multipart part; re-sending a chunk replaces it."""
+        cls._check_active(session)
+        if session.mode == "MANIFEST":
+            raise ValueError("This session uploads chunks by their hash.")
+        if not session.upload_id:
+            raise ValueError("This session uploads with a single presigned PUT.")
+        if not 0 <= chunk_index < session.total_chunks:
+            raise ValueError(
+                f"Chunk index must be between 0 and {session.total_chunks - 1}."
+            )
+        expected_size = session.get_chunk_size(chunk_index)
+        if len(data) != expected_size:
+            raise ValueError(
+                f"Chunk {chunk_index} must be {expected_size} bytes, got {len(data)}."
+            )
+
+        node = cls._session_node(session)
+        headers = {"Content-MD5": content_md5} if content_md5 else {}
+        etag = node.client._upload_part(
+            node.bucket_name,
+            session.object_name,
+            data,
+            headers,
+            session.upload_id,
+            chunk_index + 1,
+        )
+        if etag.strip('"') != hashlib.md5(data).hexdigest():
+            raise ValueError(f"Integrity check failed for chunk {chunk_index}.")
+
+        chunk, _ = FileChunk.objects.update_or_create(
+            upload_session=session,
+            chunk_index=chunk_index,
+            defaults={
+                "chunk_file": chunk_index + 1,
+                "chunk_size": len(data),
+                "etag": etag,
+            },
+        )
+        session.save(update_fields=["updated_at"])
+        return chunk
+
+    @classmethod
+    def upload_blob(cls, session: UploadSession, sha256: str, data: bytes) -> None:
+        """Store one chunk of a manifest session, identified by its hash."""
+        cls._check_active(session)
+        if session.mode != "MANIFEST":
+            raise ValueError("Only manifest sessions upload chunks by hash.")
+        sha256 = sha256.lower()
+        chunk = session.chunks.filter(content_hash=sha256).first()
+        if chunk is None:
+            raise ValueError(f"Chunk {sha256} is not in the manifest.")
+        if len(data) != chunk.chunk_size:
+            raise ValueError(
+                f"Chunk {sha256} must be {chunk.chunk_size} bytes, got {len(data)}."
+            )
+        if hashlib.sha256(data).hexdigest() != sha256:
+            raise ValueError(f"Integrity check failed for chunk {sha256}.")
+
+        # Each chunk goes to the nodes its own key is placed on
+        blob = ChunkStoreService.put_chunk(sha256, data)
+        session.chunks.filter(content_hash=sha256).update(blob=blob)
+        session.save(update_fields=["updated_at"])
+
+    @staticmethod
+    def get_progress(session: UploadSession) -> Dict[str, List]:
+        """Return which chunks have landed and which are still missing."""
+        if session.mode == "MANIFEST":
+            # A chunk counts once it was sent in this session or is the user's
+            chunks = list(
+                session.chunks.order_by("chunk_index").values_list(
+                    "chunk_index", "content_hash", "blob_id"
+                )
+            )
+            return {
+                "received_chunks": [i for i, _, blob_id in chunks if blob_id is not None],
+                "missing_chunks": [i for i, _, blob_id in chunks if blob_id is None],
+                "missing_hashes": list(
+                    dict.fromkeys(sha256 for _, sha256, blob_id in chunks if blob_id is None)
+                ),
+            }
+
+        received = list(
+            session.chunks.order_by("chunk_index").values_list("chunk_index", flat=True)
+        )
+        received_set = set(received)
+        missing = [i for i in range(session.total_chunks) if i not in received_set]
+        return {"received_chunks": received, "missing_chunks": missing}
+
+    @classmethod
+    def presign_urls(
+        cls, session: UploadSession, chunk_indices: Optional[List[int]] = None
+    ) -> List[Dict]:
+        """Presigned PUT URLs for a direct session's missing (or given) chunks."""
+        cls._check_active(session)
+        if session.mode != "DIRECT":
+            raise ValueError("Only direct upload sessions have presigned URLs.")
+
+        node = cls._session_node(session)
+        if chunk_indices is None:
+            chunk_indices = cls.get_progress(session)["missing_chunks"]
+
+        urls = []
+        for chunk_index in chunk_indices:
+            if not 0 <= chunk_index < session.total_chunks:
+                raise ValueError(
+                    f"Chunk index must be between 0 and {session.total_chunks - 1}."
+                )
+            extra_query_params = None
+            if session.upload_id:
+                extra_query_params = {
+                    "partNumber": str(chunk_index + 1),
+                    "uploadId": session.upload_id,
+                }
+            with metrics.timed(node.endpoint, "presign"):
+                url = node.client.get_presigned_url(
+                    "PUT",
+                    node.bucket_name,
+                    session.object_name,
+                    expires=PRESIGNED_UPLOAD_EXPIRY,
+                    extra_query_params=extra_query_params,
+                )
+            urls.append({
+                "chunk_index": chunk_index,
+                "size": session.get_chunk_size(chunk_index),
+                "url": url,
+            })
+        return urls
+
+    @staticmethod
+    def _record_direct_parts(
+        session: UploadSession, node: Node, client_md5s: Dict[int, str]
+    ) -> None:
+        """Record the parts a client uploaded directly, as listed by MinIO.
+
+        MinIO's ETag for a part is the MD5 of the bytes it received, so each
+        one must match the MD5 the client computed before sending it.
+        """
+        marker = None
+        while True:
+            listing = node.client._list_parts(
+                node.bucket_name,
+                session.object_name,
+                session.upload_id,
+                part_number_marker=marker,
+            )
+            for part in listing.parts:
+                chunk_index = part.part_number - 1
+                if part.size != session.get_chunk_size(chunk_index):
+                    raise ValueError(f"Chunk {chunk_index} has the wrong size.")
+                expected = client_md5s.get(chunk_index)
+                if not expected:
+                    raise ValueError(f"The MD5 of chunk {chunk_index} is required.")
+                if expected.lower() != part.etag.strip('"'):
+                    raise ValueError(f"Integrity check failed for chunk {chunk_index}.")
+                FileChunk.objects.update_or_create(
+                    upload_session=session,
+                    chunk_index=chunk_index,
+                    defaults={
+                        "chunk_file": part.part_number,
+                        "chunk_size": part.size,
+                        "etag": part.etag,
+                    },
+                )
+            if not listing.is_truncated:
+                break
+            marker = listing.next_part_number_marker
+
+    @classmethod
+    def complete_session(
+        cls, session: UploadSession, client_md5s: Optional[Dict[int, str]] = None
+    ) -> FileMetadata:
+        """Complete the upload and create the file's metadata.
+
+        ``client_md5s`` maps chunk index to the hex MD5 the client computed;
+        direct uploads must send one for every chunk, and each stored part is
+        checked against it. The session's
+        row stays locked while it completes, so a concurrent completion or
+        abort waits and then finds the session closed.
+        """
+        with transaction.atomic():
+            cls._lock(session)
+            cls._check_active(session)
+            if session.mode == "MANIFEST":
+                return cls._complete_manifest(session)
+            file_metadata = cls._complete_stored(session, client_md5s or {})
+
+        if file_metadata is None:
+            cls.abort_session(session)  # Also removes the stored object
+            raise ValueError("Integrity check failed! Please try again.")
+        FileService.replicate(file_metadata)
+        return file_metadata
+
+    @classmethod
+    def _complete_stored(
+        cls, session: UploadSession, client_md5s: Dict[int, str]
+    ) -> Optional[FileMetadata]:
+        """Complete the stored object; None when it fails the integrity check."""
+        node = cls._session_node(session)
+
+        if session.mode == "DIRECT" and not session.upload_id:
+            if not client_md5s.get(0):
+                raise ValueError("The MD5 of chunk 0 is required.")
+            return cls._complete_single_put(session, node, client_md5s[0])
+        if session.mode == "DIRECT":
+            cls._record_direct_parts(session, node, client_md5s)
+
+        chunks = list(session.chunks.order_by("chunk_index"))
+        if len(chunks) != session.total_chunks:
+            missing = cls.get_progress(session)["missing_chunks"]
+            raise ValueError(f"Missing chunks: {missing}")
+
+        parts = [
+            Part(part_number=chunk.chunk_index + 1, etag=chunk.etag) for chunk in chunks
+        ]
+        result = node.client._complete_multipart_upload(
+            node.bucket_name, session.object_name, session.upload_id, parts
+        )
+
+        # S3-style multipart checksum from the verified part MD5s
+        digests = b"".join(bytes.fromhex(chunk.etag.strip('"')) for chunk in chunks)
+        checksum = "{}-{}".format(hashlib.md5(digests).hexdigest(), len(chunks))
+        if result.etag.strip('"') != checksum:
+            node.client.remove_object(node.bucket_name, session.object_name)
+            return None
+
+        return cls._finish_session(session, node, result.etag, checksum, len(chunks))
+
+    @classmethod
+    def _complete_manifest(cls, session: UploadSession) -> FileMetadata:
+        """Create a chunked file once every chunk of the manifest is stored."""
+        missing = cls.get_progress(session)["missing_hashes"]
+        if missing:
+            raise ValueError(f"Missing chunks: {missing}")
+        manifest = list(
+            session.chunks.order_by("chunk_index").values_list("content_hash", "chunk_size")
+        )
+        with transaction.atomic():
+            file_metadata = ChunkStoreService.create_file(
+                session.created_by,
+                session.file_name,
+                session.content_type,
+                manifest,
+                upload_session=session,
+            )
+            session.status = "COMPLETED"
+            session.file_metadata = file_metadata
+            session.save(update_fields=["status", "file_metadata", "updated_at"])
+        return file_metadata
+
+    @classmethod
+    def _complete_single_put(
+        cls, session: UploadSession, node: Node, client_md5: str
+    ) -> Optional[FileMetadata]:
+        """Verify an object uploaded with a single presigned PUT."""
+        try:
+            stat = node.client.stat_object(node.bucket_name, session.object_name)
+        except S3Error:
+            raise ValueError("Missing chunks: [0]")
+
+        etag = stat.etag.strip('"')
+        if stat.size != session.file_size or client_md5.lower() != etag:
+            return None
+
+        return cls._finish_session(session, node, etag, etag, 1)
+
+    @staticmethod
+    def _finish_session(
+        session: UploadSession, node: Node, etag: str, checksum: str, chunk_count: int
+    ) -> FileMetadata:
+        """Create the metadata rows and close the session; replicating is up to the caller."""
+        with transaction.atomic():
+            file_metadata = FileMetadata.objects.create(
+                file_name=session.file_name,
+                object_key=session.object_name,
+                file_url=f"{settings.MINIO_ACCESS_URL}/{session.object_name}",
+                file_size=session.file_size,
+                etag=etag,
+                location=node.bucket_name,
+                uploaded_by=session.created_by,
+                total_chunks=chunk_count,
+                content_type=session.content_type,
+                checksum=checksum,
+            )
+            session.chunks.update(file_metadata=file_metadata)
+            ReplicaService.record(file_metadata, node.endpoint, etag)
+            session.status = "COMPLETED"
+            session.file_metadata = file_metadata
+            session.save(update_fields=["status", "file_metadata", "updated_at"])
+        return file_metadata
+
+    @classmethod
+    def abort_session(cls, session: UploadSession) -> None:
+        """Abort the upload and drop its chunk records."""
+        with transaction.atomic():
+            cls._lock(session)
+            cls._check_active(session)
+            # Chunks of a manifest session are shared and stay in the store
+            node = node_manager.get_node(session.node_endpoint)
+            if node and session.mode != "MANIFEST":
+                try:
+                    if session.upload_id:
+                        node.client._abort_multipart_upload(
+                            node.bucket_name, session.object_name, session.upload_id
+                        )
+                    else:
+                        node.client.remove_object(node.bucket_name, session.object_name)
+                except Exception as e:
+                    print(f"Error aborting upload: {e}")
+
+            session.chunks.all().delete()
+            session.status = "ABORTED"
+            session.save(update_fields=["status", "updated_at"])
@@ -0,0 +1,46 @@
+# monitoring/management/commands/reconcile_replicas.py
+from django.core.management.base import BaseCommand
+
+from core.minio.distribution import AVAILABLE, MISSING, object_distribution
+from core.minio.node import node_manager
+from core.models import FileMetadata
+from core.replicas import ReplicaService
+
+
+class Command(BaseCommand):
+    help = 'Corrects the replica index from what each MinIO node actually holds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        nodes = node_manager.get_all_nodes()
+        files = (
+            FileMetadata.objects.filter(storage_mode='OBJECT')
+            .select_related('blob')
+            .prefetch_related('replicas')
+            .order_by('id')
+        )
+        batch_size = options['batch_size']
+        checked = 0
+        last_id = None
+        while True:
+            batch = files.filter(id__gt=last_id) if last_id else files
+            batch = list(batch[:batch_size])
+            if not batch:
+                break
+            distribution = object_distribution(
+                [(file_metadata.object_name, file_metadata.etag) for file_metadata in batch],
+                nodes,
+            )
+            for file_metadata in batch:
+                # Unreachable nodes and ETag mismatches say nothing either way
+                ReplicaService.reconcile(file_metadata, {
+                    node.endpoint: status == AVAILABLE
+                    for node, status in zip(nodes, distribution[file_metadata.object_name])
+                    if status in (AVAILABLE, MISSING)
+                })
+            checked += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS(f'Reconciled the replica index of {checked} files'))
@@ -0,0 +1,18 @@
+# monitoring/management/commands/requeue_replicas.py
+from django.core.management.base import BaseCommand
+
+from core.replication import ReplicationService
+
+
+class Command(BaseCommand):
+    help = 'Queues again the replica copies that have been pending for too long'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-after', type=float, default=None,
+            help='Seconds a copy must have been pending (default: MINIO_REPLICATION["stale_after"])',
+        )
+
+    def handle(self, *args, **options):
+        queued = ReplicationService.requeue_stale(options['stale_after'])
+        self.stdout.write(self.style.SUCCESS(f'Queued {queued} pending replica copies again'))
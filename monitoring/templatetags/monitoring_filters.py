@@ -12,3 +12,11 @@ def get_item(obj, key):
         except IndexError:
             return None
     return None
+
+
+@register.filter
+def milliseconds(seconds):
+    """Format a duration in seconds as milliseconds, or '-' when unknown."""
+    if seconds is None:
+        return '-'
+    return f'{seconds * 1000:.1f} ms'
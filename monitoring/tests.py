@@ -1,3 +1,240 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import profiling, tracing
+from core.middleware import ProfilingMiddleware, TracingMiddleware
+from core.minio import metrics as storage_metrics
+from core.minio.metrics import ARCHIVE, MetricsRegistry, _dump, render
+from core.minio.scoreboard import pid_alive
+
+
+def temp_dir(test):
+    """A directory removed when ``test`` ends."""
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    return directory.name
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = temp_dir(self)
+        self.registry = MetricsRegistry({
+            'enabled': True,
+            'dir': self.dir,
+            'flush_interval': 3600,
+            'stripes': 2,
+            'token': None,
+        })
+
+    def test_values_are_rendered_for_prometheus(self):
+        self.registry.inc('filenest_minio_bytes_total', ('node0:9000', 'upload'), 10)
+        self.registry.inc('filenest_minio_bytes_total', ('node0:9000', 'upload'), 5)
+        self.registry.observe(
+            'filenest_minio_request_duration_seconds', ('node0:9000', 'stat'), 0.02
+        )
+        text = render(*self.registry.collect())
+        self.assertIn('filenest_minio_bytes_total{node="node0:9000",op="upload"} 15', text)
+        labels = 'node="node0:9000",op="stat"'
+        self.assertIn(
+            f'filenest_minio_request_duration_seconds_bucket{{{labels},le="0.01"}} 0', text
+        )
+        self.assertIn(
+            f'filenest_minio_request_duration_seconds_bucket{{{labels},le="0.025"}} 1', text
+        )
+        self.assertIn(f'filenest_minio_request_duration_seconds_count{{{labels}}} 1', text)
+
+    def test_gauges_and_label_escaping(self):
+        text = render({}, {}, [('up', 'Up.', ('node',), {('a"b',): 1})])
+        self.assertIn('# TYPE up gauge', text)
+        self.assertIn('up{node="a\\"b"} 1', text)
+
+    def test_disabled_registry_records_nothing(self):
+        registry = MetricsRegistry(dict(self.registry.options, enabled=False))
+        registry.inc('filenest_minio_bytes_total', ('node0:9000', 'upload'))
+        self.assertEqual(registry.collect(), ({}, {}))
+
+    def test_host_totals_keep_exited_workers(self):
+        key = ('filenest_health_probes_total', ('node0:9000', 'up'))
+        dead = next(pid for pid in range(4_000_000, 4_100_000) if not pid_alive(pid))
+        _dump(os.path.join(self.dir, f'{dead}-1.json'), {key: 3}, {})
+        _dump(os.path.join(self.dir, f'{os.getpid()}-1.json'), {key: 2}, {})
+        self.registry.inc(*key)
+
+        counters, _ = self.registry.collect_host()
+        self.assertEqual(counters[key], 6)
+        self.assertNotIn(f'{dead}-1.json', os.listdir(self.dir))
+        self.assertIn(ARCHIVE, os.listdir(self.dir))
+        # The archived totals are still counted on the next scrape
+        counters, _ = self.registry.collect_host()
+        self.assertEqual(counters[key], 6)
+
+
+@override_settings(MINIO_METRICS={'token': 'secret'})
+class MetricsViewTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('monitoring.views.node_manager.get_all_nodes', return_value=[])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(
+            storage_metrics.registry, 'collect_host', return_value=({}, {})
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_scrapers_need_the_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn(b'# TYPE filenest_node_up gauge', response.content)
+
+    def test_staff_can_read_metrics(self):
+        self.client.force_login(User.objects.create(username='admin', is_staff=True))
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+        self.client.force_login(User.objects.create(username='user'))
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+
+@tracing.traced('work')
+def work():
+    with tracing.span('inner', size=1):
+        pass
+
+
+class TracingTests(SimpleTestCase):
+    def test_spans_outside_a_trace_do_nothing(self):
+        self.assertFalse(tracing.active())
+        with tracing.span('nothing') as span:
+            span.set(ignored=True)
+        work()
+
+    def test_spans_nest_and_sum_into_server_timing(self):
+        token = tracing.start('GET /x', {'max_spans': 10})
+        work()
+        work()
+        trace = tracing.finish(token)
+        self.assertFalse(tracing.active())
+
+        data = trace.as_dict(0.5)
+        names = [(span['name'], span['parent']) for span in data['spans']]
+        self.assertEqual(names, [('inner', 1), ('work', None), ('inner', 3), ('work', None)])
+        self.assertEqual(data['spans'][0]['attrs'], {'size': 1})
+        header = trace.server_timing(0.5, 15)
+        self.assertTrue(header.startswith('work;dur='))
+        self.assertIn('desc="2x"', header)
+        self.assertTrue(header.endswith('total;dur=500.0'))
+
+    def test_spans_past_the_limit_are_only_counted(self):
+        token = tracing.start('GET /x', {'max_spans': 1})
+        work()
+        trace = tracing.finish(token)
+        self.assertEqual(len(trace.spans), 1)
+        self.assertEqual(trace.dropped, 1)
+        self.assertEqual(trace.totals['work'][0], 1)
+
+    def test_bound_functions_record_from_other_threads(self):
+        token = tracing.start('GET /x', {'max_spans': 10})
+        thread = threading.Thread(target=tracing.bind(work))
+        thread.start()
+        thread.join()
+        trace = tracing.finish(token)
+        self.assertEqual(set(trace.totals), {'work', 'inner'})
+
+    def test_failed_spans_record_the_error(self):
+        token = tracing.start('GET /x', {'max_spans': 10})
+        with self.assertRaises(KeyError):
+            with tracing.span('lookup'):
+                raise KeyError('x')
+        trace = tracing.finish(token)
+        self.assertEqual(trace.spans[0].attrs, {'error': 'KeyError'})
+
+    def test_slow_requests_are_dumped(self):
+        directory = temp_dir(self)
+        options = {'enabled': True, 'dump_threshold': 0, 'dump_dir': directory}
+        with override_settings(TRACING=options):
+            middleware = TracingMiddleware(lambda request: work() or HttpResponse('ok'))
+        response = middleware(RequestFactory().get('/files/'))
+        self.assertIn('work;dur=', response['Server-Timing'])
+        [dump] = os.listdir(directory)
+        with open(os.path.join(directory, dump)) as f:
+            self.assertEqual(json.load(f)['name'], 'GET /files/')
+
+    def test_rotation_keeps_the_newest_files(self):
+        directory = temp_dir(self)
+        for age in range(4):
+            path = os.path.join(directory, f'{age}.json')
+            open(path, 'w').close()
+            os.utime(path, (1000 - age, 1000 - age))
+        tracing.rotate(directory, 2)
+        self.assertEqual(sorted(os.listdir(directory)), ['0.json', '1.json'])
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.options = {
+            'enabled': True,
+            'mode': 'sampling',
+            'sample_rate': 0.0,
+            'slow_threshold': 0,
+            'interval': 0.001,
+            'dir': temp_dir(self),
+            'keep': 2,
+            'top_queries': 5,
+        }
+
+    def profile_request(self, **options):
+        def view(request):
+            User.objects.count()
+            return HttpResponse('ok')
+
+        with override_settings(PROFILING=dict(self.options, **options)):
+            middleware = ProfilingMiddleware(view)
+            middleware(RequestFactory().get('/files/?page=2'))
+
+    def test_slow_requests_are_kept_with_their_queries(self):
+        self.profile_request()
+        [profile] = profiling.list_profiles(self.options)
+        self.assertEqual(profile['path'], '/files/?page=2')
+        self.assertEqual(profile['reason'], 'slow')
+        self.assertEqual(profile['mode'], 'sampling')
+        self.assertEqual(profile['queries']['count'], 1)
+        self.assertTrue(profiling.profile_file(profile['id'], 'meta', self.options))
+        data = profiling.profile_file(profile['id'], 'data', self.options)
+        self.assertTrue(data.endswith('.folded'))
+
+    def test_fast_requests_are_not_kept(self):
+        self.profile_request(slow_threshold=60)
+        self.assertEqual(profiling.list_profiles(self.options), [])
+
+    def test_only_the_newest_profiles_are_kept(self):
+        for _ in range(3):
+            self.profile_request()
+        self.assertEqual(len(profiling.list_profiles(self.options)), 2)
+
+    def test_unknown_profiles_and_kinds(self):
+        self.profile_request()
+        [profile] = profiling.list_profiles(self.options)
+        self.assertIsNone(profiling.profile_file(profile['id'], 'other', self.options))
+        self.assertIsNone(profiling.profile_file('../settings', 'meta', self.options))
+
+    def test_staff_download_profiles(self):
+        self.profile_request()
+        [profile] = profiling.list_profiles(self.options)
+        self.client.force_login(User.objects.create(username='admin', is_staff=True))
+        with override_settings(PROFILING=self.options):
+            url = reverse('monitoring:profile_download', args=[profile['id'], 'meta'])
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(b''.join(response.streaming_content))['id'], profile['id'])
+            url = reverse('monitoring:profile_download', args=[profile['id'], 'other'])
+            self.assertEqual(self.client.get(url).status_code, 404)
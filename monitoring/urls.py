@@ -7,4 +7,10 @@ app_name = 'monitoring'
 urlpatterns = [
     path('logs/', views.log_monitoring, name='logs'),
     path('dashboard/', views.admin_dashboard, name='admin_dashboard'),
+    path('profiles/', views.profiles, name='profiles'),
+    path(
+        'profiles/<str:profile_id>/<str:kind>/',
+        views.profile_download,
+        name='profile_download',
+    ),
 ]
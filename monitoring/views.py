@@ -1,12 +1,22 @@
 """Views for monitoring file access and system activities."""
+import hmac
+
 from django.contrib.admin.views.decorators import staff_member_required
 from django.core.paginator import Paginator
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
 
+from core import profiling, tracing
+from core.erasure import ErasureService
+from core.minio import metrics as storage_metrics
+from core.minio.distribution import object_distribution
 from core.minio.node import node_manager
 from core.models import FileMetadata
+from core.replicas import ReplicaService
 from .models import FileAccessLog
 
+
+@tracing.traced('monitoring.log')
 def log_file_action(user, file_name, action, request):
     """Create a new file access log entry."""
     return FileAccessLog.objects.create(
@@ -16,6 +26,7 @@ def log_file_action(user, file_name, action, request):
         ip_address=request.META.get('REMOTE_ADDR', 'Unknown')
     )
 
+
 @staff_member_required
 def log_monitoring(request):
     """Display paginated file access logs."""
@@ -49,19 +60,108 @@ def log_monitoring(request):
 def admin_dashboard(request):
     """Admin dashboard to monitor node status and file distribution."""
     nodes = node_manager.get_all_nodes()
-    file_list = FileMetadata.objects.all()  # Fetch all files for distribution table - might need pagination later
+
+    # The page's objects are looked up by name on every node at once
+    file_list = (
+        FileMetadata.objects.select_related('blob', 'erasure')
+        .prefetch_related('replicas', 'erasure__shards')
+        .order_by('-uploaded_at', 'id')
+    )
+    paginator = Paginator(file_list, 50)
+    files_page = paginator.get_page(request.GET.get('page', 1))
+    distribution = object_distribution(
+        [
+            (file_metadata.object_name, file_metadata.etag)
+            for file_metadata in files_page
+            if file_metadata.is_single_object
+        ],
+        nodes,
+    )
 
     files_data = []
-    for file_metadata in file_list:
-        node_statuses = [node.check_file_status(file_metadata.file_name) for node in nodes]
+    for file_metadata in files_page:
+        if file_metadata.is_chunked:
+            # Spread across the chunk store rather than held as one object
+            files_data.append({
+                'file_name': file_metadata.file_name,
+                'node_statuses': ['Chunked'] * len(nodes),
+            })
+            continue
+        if file_metadata.is_erasure_coded:
+            labels = ErasureService.shard_labels(file_metadata)
+            files_data.append({
+                'file_name': file_metadata.file_name,
+                'node_statuses': [labels.get(node.endpoint, '-') for node in nodes],
+            })
+            continue
+        node_statuses = distribution[file_metadata.object_name]
         files_data.append({
             'file_name': file_metadata.file_name,
             'node_statuses': node_statuses,
+            'replica_lag': ReplicaService.lag(file_metadata),
         })
 
 
     context = {
         'nodes': nodes,
         'files': files_data,
+        'files_page': files_page,
     }
     return render(request, 'monitoring/admin_dashboard.html', context)
+
+
+@staff_member_required
+def profiles(request):
+    """List the stored request profiles, newest first."""
+    paginator = Paginator(profiling.list_profiles(), 50)
+    context = {
+        'profiles': paginator.get_page(request.GET.get('page', 1)),
+        'options': profiling.profiling_options(),
+    }
+    return render(request, 'monitoring/profiles.html', context)
+
+
+@staff_member_required
+def profile_download(request, profile_id, kind):
+    """Download a profile's metadata (``meta``) or profiler output (``data``)."""
+    path = profiling.profile_file(profile_id, kind)
+    if path is None:
+        raise Http404('Profile not found')
+    return FileResponse(open(path, 'rb'), as_attachment=True)
+
+
+def _may_scrape(request):
+    """Staff users, or scrapers sending the configured bearer token."""
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = storage_metrics.metrics_options()['token']
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+
+
+def metrics(request):
+    """Prometheus metrics for every worker on this host."""
+    if not _may_scrape(request):
+        return HttpResponseForbidden('Forbidden')
+
+    nodes = node_manager.get_all_nodes()
+    scores = {node.endpoint: node.score.snapshot() for node in nodes}
+    gauges = [
+        (
+            'filenest_node_up', 'Whether the node is in the healthy set.', ('node',),
+            {(node.endpoint,): int(node.is_healthy) for node in nodes},
+        ),
+        (
+            'filenest_node_in_flight', 'MinIO requests in flight on the host.', ('node',),
+            {(endpoint,): score['in_flight'] for endpoint, score in scores.items()},
+        ),
+        (
+            'filenest_node_cost_seconds', 'Expected seconds to serve one more request.', ('node',),
+            {(node.endpoint,): node.load for node in nodes},
+        ),
+    ]
+    counters, histograms = storage_metrics.registry.collect_host()
+    return HttpResponse(
+        storage_metrics.render(counters, histograms, gauges),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -4,13 +4,25 @@ from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.http import JsonResponse
 from django.shortcuts import render
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 
+from core.chunks import ChunkStoreService
+from core.erasure import ErasureService
+from core.minio.erasure import NotEnoughNodes
 from core.minio.node import node_manager
+from core.replication import QuorumNotReached
 from core.services import FileService
+from core.upload_handlers import stream_uploads_to_minio
 from monitoring.utils import log_file_action
 
 
+# The upload handler must be installed before CSRF checks read the body; it
+# removes what it stored if the check then rejects the request. The form sends
+# its token in a header, so the check does not depend on the parsed body.
 @login_required(login_url="/login/")
+@csrf_exempt
+@stream_uploads_to_minio()
+@csrf_protect
 def file_upload(request):
     """Handle file uploads and ensure file list updates correctly."""
     if request.method == "POST":
@@ -18,13 +30,30 @@ def file_upload(request):
         errors = []
         uploaded_files = []
 
-        if not files:
+        upload_error = getattr(request, "upload_error", None)
+        if upload_error:
+            errors.append(upload_error)
+
+        if not files and not errors:
             errors.append("Please select at least one file before uploading.")
             return render(request, "upload_resp.html", {"errors": errors})
 
+        # Same storage choices as the API; the upload handler leaves these
+        # files in memory or on disk for the services to split up
+        chunked = request.GET.get("chunked") == "1"
+        erasure = not chunked and ErasureService.requested(request)
         for file_upload in files:
             try:
-                file_metadata, _ = FileService.upload_file(file_upload, request.user)
+                if chunked or erasure:
+                    validation_errors = FileService.validate_file(file_upload)
+                    if validation_errors:
+                        raise ValueError(validation_errors[0])
+                if chunked:
+                    file_metadata = ChunkStoreService.store_file(file_upload, request.user)
+                elif erasure:
+                    file_metadata = ErasureService.store_file(file_upload, request.user)
+                else:
+                    file_metadata, _ = FileService.upload_file(file_upload, request.user)
                 log_file_action(
                     request.user, file_metadata.file_name, "UPLOAD", request
                 )
@@ -34,7 +63,7 @@ def file_upload(request):
                         "file_name": file_metadata.file_name,
                     }
                 )
-            except ValueError as e:
+            except (ValueError, QuorumNotReached, NotEnoughNodes) as e:
                 errors.append(str(e))
 
         if errors:
@@ -47,17 +76,19 @@ def file_upload(request):
 
 @login_required(login_url="/login/")
 def file_detail(request, file_id):
-    """Display file details and chunk information, downloading from least loaded node."""
+    """Display file details and chunk information, downloading from the node holding it."""
     try:
         request_user = request.user
         file_metadata = FileService.get_file_details(file_id, request_user)
         log_file_action(request.user, file_metadata.file_name, "VIEW", request)
 
-        # Get download URL from the least loaded node
+        # Get download URL from the file's first healthy placement node
         download_url = FileService.download_file(file_id, request_user)
 
         # For admin users, show distributed file status
-        preview_urls = FileService.preview_urls(file_id, request_user)
+        preview_urls = (
+            FileService.preview_urls(file_id, request_user) if request_user.is_staff else []
+        )
 
         chunks = file_metadata.chunks.all() if file_metadata.total_chunks > 1 else None
         return render(